@@ -1,152 +1,332 @@
 import { createClient, createServiceRoleClient } from "@/lib/supabase/server"
 import { mcpRuntime } from "@/lib/mcp/runtime"
+import { MCPRpcError, MCPTimeoutError, type MCPTransport } from "@/lib/mcp/transport"
 import { NextResponse } from "next/server"
 import { exec } from "child_process"
 import { promisify } from "util"
 
 const execAsync = promisify(exec)
 
-export async function POST(request: Request) {
-  try {
-    const { server_instance_id, method, params } = await request.json()
-    
-    // #region agent log
-    fetch('http://127.0.0.1:7242/ingest/54f66928-ac43-4802-8101-eb785b4ee966',{method:'POST',headers:{'Content-Type':'application/json'},body:JSON.stringify({location:'call/route.ts:8',message:'MCP call request received',data:{serverInstanceId:server_instance_id,method,hasParams:!!params},timestamp:Date.now(),sessionId:'debug-session',runId:'run1',hypothesisId:'C'})}).catch(()=>{});
-    // #endregion
+// Largest batch accepted in one request (nexus_sdk's MAX_BATCH_SIZE splits larger ones)
+const MAX_BATCH_SIZE = 100
+// Calls of one batch in flight at once
+const BATCH_CONCURRENCY = 8
 
-    if (!server_instance_id || !method) {
-      return NextResponse.json({ error: "server_instance_id and method are required" }, { status: 400 })
-    }
+interface BatchItem {
+  id?: string | number
+  server_instance_id?: string
+  method?: string
+  params?: any
+}
 
-    const supabase = await createClient()
-
-    // Get current user from bearer token or session
-    const authHeader = request.headers.get("authorization")
-    let user = null
-    let userError = null
-    let useServiceRole = false
-
-    if (authHeader?.toLowerCase().startsWith("bearer ")) {
-      const token = authHeader.slice(7).trim()
-      if (token) {
-        // Verify the token and get user
-        const result = await supabase.auth.getUser(token)
-        user = result.data.user
-        userError = result.error
-        useServiceRole = true // Use service role for bearer token auth (RLS doesn't work with bearer tokens)
-        // #region agent log
-        fetch('http://127.0.0.1:7242/ingest/54f66928-ac43-4802-8101-eb785b4ee966',{method:'POST',headers:{'Content-Type':'application/json'},body:JSON.stringify({location:'call/route.ts:26',message:'Bearer token auth result',data:{userId:user?.id,hasError:!!userError,error:userError?.message},timestamp:Date.now(),sessionId:'debug-session',runId:'run1',hypothesisId:'B'})}).catch(()=>{});
-        // #endregion
-      }
-    } else {
-      // Fall back to session-based auth
-      const result = await supabase.auth.getUser()
+/**
+ * Authenticate the caller and resolve a connected transport for the server instance.
+ * Returns either the transport or the error response to send back.
+ */
+async function resolveTransport(request: Request, server_instance_id: string): Promise<MCPTransport | NextResponse> {
+  const supabase = await createClient()
+
+  // Get current user from bearer token or session
+  const authHeader = request.headers.get("authorization")
+  let user = null
+  let userError = null
+  let useServiceRole = false
+
+  if (authHeader?.toLowerCase().startsWith("bearer ")) {
+    const token = authHeader.slice(7).trim()
+    if (token) {
+      // Verify the token and get user
+      const result = await supabase.auth.getUser(token)
       user = result.data.user
       userError = result.error
+      useServiceRole = true // Use service role for bearer token auth (RLS doesn't work with bearer tokens)
       // #region agent log
-      fetch('http://127.0.0.1:7242/ingest/54f66928-ac43-4802-8101-eb785b4ee966',{method:'POST',headers:{'Content-Type':'application/json'},body:JSON.stringify({location:'call/route.ts:34',message:'Session auth result',data:{userId:user?.id,hasError:!!userError},timestamp:Date.now(),sessionId:'debug-session',runId:'run1',hypothesisId:'B'})}).catch(()=>{});
+      fetch('http://127.0.0.1:7242/ingest/54f66928-ac43-4802-8101-eb785b4ee966',{method:'POST',headers:{'Content-Type':'application/json'},body:JSON.stringify({location:'call/route.ts:26',message:'Bearer token auth result',data:{userId:user?.id,hasError:!!userError,error:userError?.message},timestamp:Date.now(),sessionId:'debug-session',runId:'run1',hypothesisId:'B'})}).catch(()=>{});
       // #endregion
     }
+  } else {
+    // Fall back to session-based auth
+    const result = await supabase.auth.getUser()
+    user = result.data.user
+    userError = result.error
+    // #region agent log
+    fetch('http://127.0.0.1:7242/ingest/54f66928-ac43-4802-8101-eb785b4ee966',{method:'POST',headers:{'Content-Type':'application/json'},body:JSON.stringify({location:'call/route.ts:34',message:'Session auth result',data:{userId:user?.id,hasError:!!userError},timestamp:Date.now(),sessionId:'debug-session',runId:'run1',hypothesisId:'B'})}).catch(()=>{});
+    // #endregion
+  }
 
-    if (userError || !user) {
-      return NextResponse.json({ error: "Unauthorized" }, { status: 401 })
+  if (userError || !user) {
+    return NextResponse.json({ error: "Unauthorized" }, { status: 401 })
+  }
+
+  // Use service role client for bearer token auth (bypasses RLS, but we still verify user_id manually)
+  let queryClient
+  try {
+    queryClient = useServiceRole ? createServiceRoleClient() : supabase
+  } catch (error: any) {
+    if (error.message?.includes('SUPABASE_SERVICE_ROLE_KEY')) {
+      console.error("[MCP Call] Service role key not set. Please add SUPABASE_SERVICE_ROLE_KEY to your .env.local file.")
+      return NextResponse.json({ 
+        error: "Server configuration error: SUPABASE_SERVICE_ROLE_KEY is not set. Please add it to your .env.local file. Get it from Supabase Dashboard → Settings → API → service_role key" 
+      }, { status: 500 })
     }
+    throw error
+  }
 
-    // Use service role client for bearer token auth (bypasses RLS, but we still verify user_id manually)
-    let queryClient
+  // Get server instance
+  // #region agent log
+  fetch('http://127.0.0.1:7242/ingest/54f66928-ac43-4802-8101-eb785b4ee966',{method:'POST',headers:{'Content-Type':'application/json'},body:JSON.stringify({location:'call/route.ts:42',message:'Looking up instance in DB',data:{serverInstanceId:server_instance_id,userId:user.id,useServiceRole},timestamp:Date.now(),sessionId:'debug-session',runId:'run1',hypothesisId:'D'})}).catch(()=>{});
+  // #endregion
+  
+  const { data: instance, error: instanceError } = await queryClient
+    .from("mcp_server_instances")
+    .select("id, user_id, server_id, account_id, transport_type, status, process_id")
+    .eq("id", server_instance_id)
+    .eq("user_id", user.id)
+    .maybeSingle()
+    
+  // #region agent log
+  fetch('http://127.0.0.1:7242/ingest/54f66928-ac43-4802-8101-eb785b4ee966',{method:'POST',headers:{'Content-Type':'application/json'},body:JSON.stringify({location:'call/route.ts:49',message:'Instance lookup result',data:{found:!!instance,instanceId:instance?.id,instanceUserId:instance?.user_id,instanceStatus:instance?.status,hasError:!!instanceError,error:instanceError?.message,errorCode:instanceError?.code},timestamp:Date.now(),sessionId:'debug-session',runId:'run1',hypothesisId:'D'})}).catch(()=>{});
+  // #endregion
+
+  if (instanceError) {
+    console.error("[MCP Call] Instance lookup error:", instanceError)
+    console.error("[MCP Call] Looking for instance_id:", server_instance_id)
+    console.error("[MCP Call] User ID:", user.id)
+    return NextResponse.json({ error: `Instance lookup failed: ${instanceError.message}` }, { status: 500 })
+  }
+
+  if (!instance) {
+    console.error("[MCP Call] Instance not found - no matching record")
+    console.error("[MCP Call] Looking for instance_id:", server_instance_id)
+    console.error("[MCP Call] User ID:", user.id)
+    return NextResponse.json({ error: "Instance not found" }, { status: 404 })
+  }
+
+  if (instance.status !== "running") {
+    return NextResponse.json({ error: "Instance is not running" }, { status: 400 })
+  }
+
+  // Get transport with automatic recovery (recovery will handle process verification)
+  const transport = await mcpRuntime.getTransportWithRecovery(
+    instance.id,
+    instance.user_id,
+    instance.server_id,
+    instance.account_id
+  )
+
+  // If recovery returned null, verify process status for better error message
+  if (!transport && instance.process_id && instance.transport_type === "stdio") {
     try {
-      queryClient = useServiceRole ? createServiceRoleClient() : supabase
-    } catch (error: any) {
-      if (error.message?.includes('SUPABASE_SERVICE_ROLE_KEY')) {
-        console.error("[MCP Call] Service role key not set. Please add SUPABASE_SERVICE_ROLE_KEY to your .env.local file.")
-        return NextResponse.json({ 
-          error: "Server configuration error: SUPABASE_SERVICE_ROLE_KEY is not set. Please add it to your .env.local file. Get it from Supabase Dashboard → Settings → API → service_role key" 
-        }, { status: 500 })
+      const platform = process.platform
+      if (platform === "win32") {
+        // Windows: use tasklist to check if process exists
+        await execAsync(`tasklist /FI "PID eq ${instance.process_id}"`)
+        // Process exists but recovery failed - this shouldn't happen, but provide error
+        console.log(`[MCP Call] Process ${instance.process_id} exists but transport recovery failed`)
+      } else {
+        // Unix/Linux/Mac: use kill -0 to check if process exists (doesn't kill, just checks)
+        await execAsync(`kill -0 ${instance.process_id}`)
+        // Process exists but recovery failed - this shouldn't happen, but provide error
+        console.log(`[MCP Call] Process ${instance.process_id} exists but transport recovery failed`)
+      }
+    } catch (processCheckError: any) {
+      // Process doesn't exist - update database status (recovery already tried and failed)
+      console.log(`[MCP Call] Process ${instance.process_id} not found - updating database status to stopped`)
+      try {
+        const serviceRoleClient = createServiceRoleClient()
+        await serviceRoleClient
+          .from("mcp_server_instances")
+          .update({
+            status: "stopped",
+            updated_at: new Date().toISOString(),
+          })
+          .eq("id", instance.id)
+        console.log(`[MCP Call] Database status updated to stopped for instance ${instance.id}`)
+      } catch (updateError) {
+        console.error(`[MCP Call] Failed to update instance status:`, updateError)
       }
-      throw error
     }
+  }
 
-    // Get server instance
-    // #region agent log
-    fetch('http://127.0.0.1:7242/ingest/54f66928-ac43-4802-8101-eb785b4ee966',{method:'POST',headers:{'Content-Type':'application/json'},body:JSON.stringify({location:'call/route.ts:42',message:'Looking up instance in DB',data:{serverInstanceId:server_instance_id,userId:user.id,useServiceRole},timestamp:Date.now(),sessionId:'debug-session',runId:'run1',hypothesisId:'D'})}).catch(()=>{});
-    // #endregion
-    
-    const { data: instance, error: instanceError } = await queryClient
-      .from("mcp_server_instances")
-      .select("id, user_id, server_id, account_id, transport_type, status, process_id")
-      .eq("id", server_instance_id)
-      .eq("user_id", user.id)
-      .maybeSingle()
-      
-    // #region agent log
-    fetch('http://127.0.0.1:7242/ingest/54f66928-ac43-4802-8101-eb785b4ee966',{method:'POST',headers:{'Content-Type':'application/json'},body:JSON.stringify({location:'call/route.ts:49',message:'Instance lookup result',data:{found:!!instance,instanceId:instance?.id,instanceUserId:instance?.user_id,instanceStatus:instance?.status,hasError:!!instanceError,error:instanceError?.message,errorCode:instanceError?.code},timestamp:Date.now(),sessionId:'debug-session',runId:'run1',hypothesisId:'D'})}).catch(()=>{});
-    // #endregion
+  if (!transport || !transport.isConnected()) {
+    // Transport not available and recovery failed
+    return NextResponse.json({ 
+      error: "Transport not available. The server instance may have stopped. Please re-provision the server." 
+    }, { status: 503 })
+  }
 
-    if (instanceError) {
-      console.error("[MCP Call] Instance lookup error:", instanceError)
-      console.error("[MCP Call] Looking for instance_id:", server_instance_id)
-      console.error("[MCP Call] User ID:", user.id)
-      return NextResponse.json({ error: `Instance lookup failed: ${instanceError.message}` }, { status: 500 })
-    }
+  return transport
+}
 
-    if (!instance) {
-      console.error("[MCP Call] Instance not found - no matching record")
-      console.error("[MCP Call] Looking for instance_id:", server_instance_id)
-      console.error("[MCP Call] User ID:", user.id)
-      return NextResponse.json({ error: "Instance not found" }, { status: 404 })
+/**
+ * HTTP status for a failed transport.send. Errors the MCP server answered with
+ * (bad params, unknown method, tool failures) are the caller's problem and map
+ * to 4xx; timeouts and transport failures map to 504/502, the only statuses
+ * the SDK's circuit breaker counts against the server.
+ */
+function errorStatus(error: any): number {
+  if (error instanceof MCPTimeoutError) {
+    return 504
+  }
+  if (error instanceof MCPRpcError) {
+    // Pass through upstream API statuses (e.g. Google's 410 for an expired sync token)
+    const upstream = Number(error.data?.status ?? error.data?.code)
+    if (upstream >= 400 && upstream < 500 && ![401, 403, 407].includes(upstream)) {
+      return upstream
     }
-
-    if (instance.status !== "running") {
-      return NextResponse.json({ error: "Instance is not running" }, { status: 400 })
+    if (error.code === -32601) {
+      return 404
+    }
+    if (error.code === -32600 || error.code === -32602 || error.code === -32700) {
+      return 400
     }
+    return 422
+  }
+  return 502
+}
 
-    // Get transport with automatic recovery (recovery will handle process verification)
-    const transport = await mcpRuntime.getTransportWithRecovery(
-      instance.id,
-      instance.user_id,
-      instance.server_id,
-      instance.account_id
-    )
+/**
+ * Relay a tools/call as server-sent events: a "progress" event per progress
+ * notification while the tool runs, then one "content" event per content item,
+ * then a "result" event with the remaining result fields (or an "error" event).
+ * Content is only sent once transport.send resolves: MCP returns it in the
+ * final result, so progress is the only incremental part.
+ */
+function streamToolCall(transport: MCPTransport, method: string, params: any): Response {
+  const encoder = new TextEncoder()
+  let closed = false
+
+  const stream = new ReadableStream<Uint8Array>({
+    async start(controller) {
+      const write = (text: string) => {
+        if (!closed) {
+          controller.enqueue(encoder.encode(text))
+        }
+      }
+      const emit = (event: string, data: unknown) => write(`event: ${event}\ndata: ${JSON.stringify(data)}\n\n`)
+      // Comment lines keep an idle stream from hitting proxy and client read timeouts
+      const heartbeat = setInterval(() => write(": keep-alive\n\n"), 15000)
 
-    // If recovery returned null, verify process status for better error message
-    if (!transport && instance.process_id && instance.transport_type === "stdio") {
       try {
-        const platform = process.platform
-        if (platform === "win32") {
-          // Windows: use tasklist to check if process exists
-          await execAsync(`tasklist /FI "PID eq ${instance.process_id}"`)
-          // Process exists but recovery failed - this shouldn't happen, but provide error
-          console.log(`[MCP Call] Process ${instance.process_id} exists but transport recovery failed`)
-        } else {
-          // Unix/Linux/Mac: use kill -0 to check if process exists (doesn't kill, just checks)
-          await execAsync(`kill -0 ${instance.process_id}`)
-          // Process exists but recovery failed - this shouldn't happen, but provide error
-          console.log(`[MCP Call] Process ${instance.process_id} exists but transport recovery failed`)
+        const result = await transport.send(method, params, {
+          onProgress: (progress) => emit("progress", progress),
+        })
+        const { content, ...rest } = result ?? {}
+        const items = Array.isArray(content) ? content : content === undefined ? [] : [content]
+        for (const item of items) {
+          emit("content", item)
         }
-      } catch (processCheckError: any) {
-        // Process doesn't exist - update database status (recovery already tried and failed)
-        console.log(`[MCP Call] Process ${instance.process_id} not found - updating database status to stopped`)
-        try {
-          const serviceRoleClient = createServiceRoleClient()
-          await serviceRoleClient
-            .from("mcp_server_instances")
-            .update({
-              status: "stopped",
-              updated_at: new Date().toISOString(),
-            })
-            .eq("id", instance.id)
-          console.log(`[MCP Call] Database status updated to stopped for instance ${instance.id}`)
-        } catch (updateError) {
-          console.error(`[MCP Call] Failed to update instance status:`, updateError)
+        emit("result", rest)
+      } catch (error: any) {
+        console.error("[MCP Call] Streamed call error:", method, error)
+        emit("error", { error: error?.message || error?.toString() || "MCP call failed", status: errorStatus(error) })
+      } finally {
+        clearInterval(heartbeat)
+        if (!closed) {
+          closed = true
+          controller.close()
         }
       }
+    },
+    cancel() {
+      // The client stopped reading; the tool call itself still runs to completion
+      closed = true
+    },
+  })
+
+  return new Response(stream, {
+    headers: {
+      "Content-Type": "text/event-stream",
+      "Cache-Control": "no-cache",
+      Connection: "keep-alive",
+    },
+  })
+}
+
+/** Settle fn for every item with at most `limit` calls pending, in input order */
+async function settleWithLimit<T, R>(items: T[], limit: number, fn: (item: T) => Promise<R>): Promise<PromiseSettledResult<R>[]> {
+  const settled: PromiseSettledResult<R>[] = new Array(items.length)
+  let next = 0
+  const worker = async () => {
+    while (next < items.length) {
+      const index = next++
+      try {
+        settled[index] = { status: "fulfilled", value: await fn(items[index]) }
+      } catch (reason) {
+        settled[index] = { status: "rejected", reason }
+      }
     }
+  }
+  await Promise.all(Array.from({ length: Math.min(limit, items.length) }, worker))
+  return settled
+}
 
-    if (!transport || !transport.isConnected()) {
-      // Transport not available and recovery failed
-      return NextResponse.json({ 
-        error: "Transport not available. The server instance may have stopped. Please re-provision the server." 
-      }, { status: 503 })
+/**
+ * Run a JSON-RPC-style batch: one auth check and instance lookup for the whole
+ * array, then the calls dispatched BATCH_CONCURRENCY at a time. Results and
+ * per-item errors are returned in input order.
+ */
+async function handleBatch(request: Request, items: BatchItem[]) {
+  if (items.length === 0) {
+    return NextResponse.json({ error: "Batch must contain at least one call" }, { status: 400 })
+  }
+  if (items.length > MAX_BATCH_SIZE) {
+    return NextResponse.json({ error: `Batch must contain at most ${MAX_BATCH_SIZE} calls` }, { status: 400 })
+  }
+
+  const server_instance_id = items[0]?.server_instance_id
+  if (!server_instance_id || items.some((item) => !item?.method)) {
+    return NextResponse.json({ error: "server_instance_id and method are required for every batch item" }, { status: 400 })
+  }
+  if (items.some((item) => item.server_instance_id !== server_instance_id)) {
+    return NextResponse.json({ error: "All batch items must use the same server_instance_id" }, { status: 400 })
+  }
+
+  const transport = await resolveTransport(request, server_instance_id)
+  if (transport instanceof NextResponse) {
+    return transport
+  }
+
+  const settled = await settleWithLimit(items, BATCH_CONCURRENCY, (item) => transport.send(item.method!, item.params))
+  const results = settled.map((outcome, index) => {
+    const id = items[index].id ?? index
+    if (outcome.status === "fulfilled") {
+      return { id, result: outcome.value }
+    }
+    const error: any = outcome.reason
+    console.error("[MCP Call] Batch item error:", items[index].method, error)
+    return { id, error: error?.message || error?.toString() || "MCP call failed", status: errorStatus(error) }
+  })
+  return NextResponse.json(results)
+}
+
+export async function POST(request: Request) {
+  try {
+    const body = await request.json()
+
+    if (Array.isArray(body)) {
+      return await handleBatch(request, body)
+    }
+
+    const { server_instance_id, method, params, stream } = body
+    
+    // #region agent log
+    fetch('http://127.0.0.1:7242/ingest/54f66928-ac43-4802-8101-eb785b4ee966',{method:'POST',headers:{'Content-Type':'application/json'},body:JSON.stringify({location:'call/route.ts:8',message:'MCP call request received',data:{serverInstanceId:server_instance_id,method,hasParams:!!params},timestamp:Date.now(),sessionId:'debug-session',runId:'run1',hypothesisId:'C'})}).catch(()=>{});
+    // #endregion
+
+    if (!server_instance_id || !method) {
+      return NextResponse.json({ error: "server_instance_id and method are required" }, { status: 400 })
+    }
+
+    const transport = await resolveTransport(request, server_instance_id)
+    if (transport instanceof NextResponse) {
+      return transport
+    }
+
+    // Streamed tools/call (MCP.call_stream): relay progress and content as server-sent events
+    const acceptsEventStream = request.headers.get("accept")?.includes("text/event-stream")
+    if (method === "tools/call" && (stream === true || acceptsEventStream)) {
+      return streamToolCall(transport, method, params)
     }
 
     // Make MCP call
@@ -158,7 +338,7 @@ export async function POST(request: Request) {
       console.error("[MCP Call] Method:", method)
       console.error("[MCP Call] Params:", JSON.stringify(params, null, 2))
       const errorMessage = error?.message || error?.toString() || "MCP call failed"
-      return NextResponse.json({ error: errorMessage }, { status: 500 })
+      return NextResponse.json({ error: errorMessage }, { status: errorStatus(error) })
     }
   } catch (error: any) {
     console.error("[MCP Call] Error:", error)
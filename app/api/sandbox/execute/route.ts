@@ -1,10 +1,72 @@
 import { createClient } from "@/lib/supabase/server"
-import { executePythonCode } from "@/lib/sandbox"
+import { executePythonCode, type SandboxOutputHandler, type SandboxResult } from "@/lib/sandbox"
 import { NextResponse } from "next/server"
 
+/** A JSON round-trip copy of a result section, safe for JSONB storage; null if it can't be serialized */
+function jsonSection(value: unknown): any {
+  if (value === null || value === undefined) {
+    return null
+  }
+  try {
+    return JSON.parse(JSON.stringify(value))
+  } catch {
+    return null
+  }
+}
+
+/**
+ * Run an execution as server-sent events: "stdout" and "stderr" events with
+ * each chunk of output as the script prints it, then a "result" event with the
+ * stored execution (or an "error" event with the error response body).
+ */
+function streamExecution(run: (onOutput: SandboxOutputHandler) => Promise<NextResponse>): Response {
+  const encoder = new TextEncoder()
+  let closed = false
+
+  const stream = new ReadableStream<Uint8Array>({
+    async start(controller) {
+      const write = (text: string) => {
+        if (!closed) {
+          controller.enqueue(encoder.encode(text))
+        }
+      }
+      const emit = (event: string, data: unknown) => write(`event: ${event}\ndata: ${JSON.stringify(data)}\n\n`)
+      // Comment lines keep a quiet script's stream from hitting proxy and client read timeouts
+      const heartbeat = setInterval(() => write(": keep-alive\n\n"), 15000)
+
+      try {
+        const response = await run((name, data) => emit(name, { data }))
+        emit(response.ok ? "result" : "error", await response.json())
+      } catch (error: any) {
+        console.error("[Sandbox] Streamed execution error:", error)
+        emit("error", { error: error?.message || "Execution failed" })
+      } finally {
+        clearInterval(heartbeat)
+        if (!closed) {
+          closed = true
+          controller.close()
+        }
+      }
+    },
+    cancel() {
+      // The client stopped reading; the execution still runs and is stored
+      closed = true
+    },
+  })
+
+  return new Response(stream, {
+    headers: {
+      "Content-Type": "text/event-stream",
+      "Cache-Control": "no-cache",
+      Connection: "keep-alive",
+    },
+  })
+}
+
 export async function POST(request: Request) {
   try {
-    const { code, tool_id, account_id, server_id } = await request.json()
+    const { code, tool_id, account_id, server_id, session_id, reset_session, close_session, metrics, profile, stream } =
+      await request.json()
 
     if (!code) {
       return NextResponse.json({ error: "Code is required" }, { status: 400 })
@@ -72,10 +134,6 @@ export async function POST(request: Request) {
 
     await supabase.from("sandbox_executions").update({ status: "running" }).eq("id", execution.id)
 
-    const startTime = Date.now()
-    let status: "completed" | "failed" = "completed"
-    let error: string | null = null
-
     // Prepare sandbox options
     const nexus_api_url = process.env.NEXT_PUBLIC_APP_URL || "http://localhost:3000"
     const authToken = session?.access_token ?? null
@@ -90,148 +148,184 @@ export async function POST(request: Request) {
       env.NEXUS_AUTH_TOKEN = authToken
     }
 
-    const sandboxOptions = {
+    const sandboxOptions: Parameters<typeof executePythonCode>[1] = {
       nexus_api_url,
       server_instance_id,
-      nexus_auth_token: authToken,
+      nexus_auth_token: authToken ?? undefined,
+      tenant: user?.id,
       env,
+      metrics: Boolean(metrics),
+      profile: Boolean(profile),
+    }
+    // Session kernels keep globals between executions; scope them to the user so ids can't collide
+    if (session_id && user) {
+      sandboxOptions.session_id = `${user.id}:${session_id}`
+      sandboxOptions.reset_session = Boolean(reset_session)
+      sandboxOptions.close_session = Boolean(close_session)
     }
 
-    let sandboxResult
-    try {
-      sandboxResult = await executePythonCode(code, sandboxOptions)
-    } catch (sandboxError: any) {
-      console.error("[Sandbox] Execution threw error:", sandboxError)
-      sandboxResult = {
-        stdout: "",
-        stderr: sandboxError.message || String(sandboxError),
-        return_value: null,
-        error: sandboxError.message || "Python execution failed",
+    const runExecution = async (onOutput?: SandboxOutputHandler): Promise<NextResponse> => {
+      const startTime = Date.now()
+      let status: "completed" | "failed" = "completed"
+      let error: string | null = null
+
+      let sandboxResult: SandboxResult
+      try {
+        sandboxResult = await executePythonCode(code, { ...sandboxOptions, onOutput })
+      } catch (sandboxError: any) {
+        console.error("[Sandbox] Execution threw error:", sandboxError)
+        sandboxResult = {
+          stdout: "",
+          stderr: sandboxError.message || String(sandboxError),
+          return_value: null,
+          error: sandboxError.message || "Python execution failed",
+        }
       }
-    }
 
-    if (sandboxResult.error) {
-      status = "failed"
-      error = sandboxResult.error
-    }
+      if (sandboxResult.error) {
+        status = "failed"
+        error = sandboxResult.error
+      }
 
-    const executionTime = Date.now() - startTime
+      const executionTime = Date.now() - startTime
 
-    // Ensure output is JSON-serializable and safe for JSONB storage
-    // Always use an object (never null) for JSONB compatibility
-    let outputToStore: any = {
-      stdout: "",
-      stderr: "",
-      return_value: null,
-      error: null,
-    }
-    try {
-      // Create a sanitized version of the result
-      const sanitizedResult: any = {
-        stdout: String(sandboxResult.stdout || ""),
-        stderr: String(sandboxResult.stderr || ""),
+      // Ensure output is JSON-serializable and safe for JSONB storage
+      // Always use an object (never null) for JSONB compatibility
+      let outputToStore: any = {
+        stdout: "",
+        stderr: "",
         return_value: null,
-        error: sandboxResult.error || null,
+        error: null,
       }
+      try {
+        // Create a sanitized version of the result
+        const sanitizedResult: any = {
+          stdout: String(sandboxResult.stdout || ""),
+          stderr: String(sandboxResult.stderr || ""),
+          return_value: null,
+          error: sandboxResult.error || null,
+        }
+        // Set when the error is a resource limit kill (wall/CPU time, memory, output) rather than a user exception
+        if (sandboxResult.limit_exceeded) {
+          sanitizedResult.limit_exceeded = jsonSection(sandboxResult.limit_exceeded)
+        }
+        if (sandboxResult.metrics) {
+          sanitizedResult.metrics = jsonSection(sandboxResult.metrics)
+        }
+        if (sandboxResult.session) {
+          sanitizedResult.session = { ...sandboxResult.session, id: session_id }
+        }
+        // Which paths of return_value were cut to fit the return budget
+        if (sandboxResult.return_value_reduced) {
+          sanitizedResult.return_value_reduced = jsonSection(sandboxResult.return_value_reduced)
+        }
 
-      // Try to serialize return_value if it exists
-      if (sandboxResult.return_value !== null && sandboxResult.return_value !== undefined) {
-        try {
-          // First, try to stringify to check if it's valid JSON
-          const serialized = JSON.stringify(sandboxResult.return_value)
-          // Then parse it back to ensure it's a clean, serializable object
-          sanitizedResult.return_value = JSON.parse(serialized)
-        } catch {
-          // If it can't be serialized, convert to string
-          sanitizedResult.return_value = String(sandboxResult.return_value)
+        // Try to serialize return_value if it exists
+        if (sandboxResult.return_value !== null && sandboxResult.return_value !== undefined) {
+          try {
+            // First, try to stringify to check if it's valid JSON
+            const serialized = JSON.stringify(sandboxResult.return_value)
+            // Then parse it back to ensure it's a clean, serializable object
+            sanitizedResult.return_value = JSON.parse(serialized)
+          } catch {
+            // If it can't be serialized, convert to string
+            sanitizedResult.return_value = String(sandboxResult.return_value)
+          }
         }
-      }
 
-      // Final check: ensure the entire object is JSON-serializable
-      JSON.stringify(sanitizedResult)
-      outputToStore = sanitizedResult
-    } catch (serializeError) {
-      // If serialization fails completely, store a minimal safe version
-      console.error("[Sandbox] Failed to serialize result:", serializeError)
-      outputToStore = {
-        stdout: String(sandboxResult.stdout || ""),
-        stderr: String(sandboxResult.stderr || ""),
-        return_value: null,
-        error: sandboxResult.error || "Output could not be serialized to JSON",
-      }
-    }
-    
-    // Final safety check: ensure outputToStore is always a valid object
-    if (!outputToStore || typeof outputToStore !== 'object' || Array.isArray(outputToStore)) {
-      outputToStore = {
-        stdout: String(sandboxResult.stdout || ""),
-        stderr: String(sandboxResult.stderr || ""),
-        return_value: null,
-        error: sandboxResult.error || "Invalid output format",
+        // Final check: ensure the entire object is JSON-serializable
+        JSON.stringify(sanitizedResult)
+        outputToStore = sanitizedResult
+      } catch (serializeError) {
+        // If serialization fails completely, store a minimal safe version
+        console.error("[Sandbox] Failed to serialize result:", serializeError)
+        outputToStore = {
+          stdout: String(sandboxResult.stdout || ""),
+          stderr: String(sandboxResult.stderr || ""),
+          return_value: null,
+          error: sandboxResult.error || "Output could not be serialized to JSON",
+        }
       }
-    }
-
-    try {
-      console.log("[Sandbox] Updating execution:", execution.id, { status, executionTime, error })
       
-      // First, try the update without SELECT to avoid RLS issues
-      const { error: updateError } = await supabase
-        .from("sandbox_executions")
-        .update({
-          status,
-          output: outputToStore,
-          error,
-          execution_time_ms: executionTime,
-          completed_at: new Date().toISOString(),
-        })
-        .eq("id", execution.id)
-
-      if (updateError) {
-        console.error("[Sandbox] Update error:", updateError)
-        console.error("[Sandbox] Update error details:", JSON.stringify(updateError, null, 2))
-        return NextResponse.json({ error: updateError.message }, { status: 500 })
+      // Final safety check: ensure outputToStore is always a valid object
+      if (!outputToStore || typeof outputToStore !== 'object' || Array.isArray(outputToStore)) {
+        outputToStore = {
+          stdout: String(sandboxResult.stdout || ""),
+          stderr: String(sandboxResult.stderr || ""),
+          return_value: null,
+          error: sandboxResult.error || "Invalid output format",
+        }
       }
 
-      // Now fetch the updated execution separately
-      const { data: finalExecution, error: fetchError } = await supabase
-        .from("sandbox_executions")
-        .select("*")
-        .eq("id", execution.id)
-        .maybeSingle()
-
-      if (fetchError) {
-        console.error("[Sandbox] Fetch error after update:", fetchError)
-        // Even if fetch fails, the update likely succeeded, so return the execution we have
-        return NextResponse.json({
-          ...execution,
-          status,
-          output: outputToStore,
-          error,
-          execution_time_ms: executionTime,
-          completed_at: new Date().toISOString(),
-        })
-      }
+      try {
+        console.log("[Sandbox] Updating execution:", execution.id, { status, executionTime, error })
+        
+        // First, try the update without SELECT to avoid RLS issues
+        const { error: updateError } = await supabase
+          .from("sandbox_executions")
+          .update({
+            status,
+            output: outputToStore,
+            error,
+            execution_time_ms: executionTime,
+            completed_at: new Date().toISOString(),
+          })
+          .eq("id", execution.id)
+
+        if (updateError) {
+          console.error("[Sandbox] Update error:", updateError)
+          console.error("[Sandbox] Update error details:", JSON.stringify(updateError, null, 2))
+          return NextResponse.json({ error: updateError.message }, { status: 500 })
+        }
 
-      if (!finalExecution) {
-        console.error("[Sandbox] No execution returned from fetch - update may have succeeded but RLS blocked SELECT")
-        // Return the execution with updated fields even if we can't fetch it
-        return NextResponse.json({
-          ...execution,
-          status,
-          output: outputToStore,
-          error,
-          execution_time_ms: executionTime,
-          completed_at: new Date().toISOString(),
-        })
+        // Now fetch the updated execution separately
+        const { data: finalExecution, error: fetchError } = await supabase
+          .from("sandbox_executions")
+          .select("*")
+          .eq("id", execution.id)
+          .maybeSingle()
+
+        if (fetchError) {
+          console.error("[Sandbox] Fetch error after update:", fetchError)
+          // Even if fetch fails, the update likely succeeded, so return the execution we have
+          return NextResponse.json({
+            ...execution,
+            status,
+            output: outputToStore,
+            error,
+            execution_time_ms: executionTime,
+            completed_at: new Date().toISOString(),
+          })
+        }
+
+        if (!finalExecution) {
+          console.error("[Sandbox] No execution returned from fetch - update may have succeeded but RLS blocked SELECT")
+          // Return the execution with updated fields even if we can't fetch it
+          return NextResponse.json({
+            ...execution,
+            status,
+            output: outputToStore,
+            error,
+            execution_time_ms: executionTime,
+            completed_at: new Date().toISOString(),
+          })
+        }
+
+        console.log("[Sandbox] Successfully updated execution:", finalExecution.id)
+        return NextResponse.json(finalExecution)
+      } catch (updateException: any) {
+        console.error("[Sandbox] Update exception:", updateException)
+        console.error("[Sandbox] Update exception stack:", updateException.stack)
+        return NextResponse.json({ error: updateException.message || "Failed to update execution" }, { status: 500 })
       }
+    }
 
-      console.log("[Sandbox] Successfully updated execution:", finalExecution.id)
-      return NextResponse.json(finalExecution)
-    } catch (updateException: any) {
-      console.error("[Sandbox] Update exception:", updateException)
-      console.error("[Sandbox] Update exception stack:", updateException.stack)
-      return NextResponse.json({ error: updateException.message || "Failed to update execution" }, { status: 500 })
+    // Streamed execution: relay stdout/stderr as server-sent events while the script runs
+    const acceptsEventStream = request.headers.get("accept")?.includes("text/event-stream")
+    if (stream === true || acceptsEventStream) {
+      return streamExecution(runExecution)
     }
+    return await runExecution()
   } catch (error) {
     console.error("[v0] Execution error:", error)
     return NextResponse.json({ error: "Execution failed" }, { status: 500 })
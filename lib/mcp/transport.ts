@@ -12,11 +12,45 @@ export interface MCPServerInstance {
   url?: string
 }
 
+/**
+ * A notifications/progress update for a request
+ */
+export interface MCPProgress {
+  progress: number
+  total?: number
+  message?: string
+}
+
+export interface SendOptions {
+  /** Called for each progress notification the server sends while the request runs */
+  onProgress?: (progress: MCPProgress) => void
+}
+
+/**
+ * The MCP server answered a request with a JSON-RPC error
+ */
+export class MCPRpcError extends Error {
+  constructor(message: string, public code?: number, public data?: any) {
+    super(message)
+    this.name = "MCPRpcError"
+  }
+}
+
+/**
+ * The MCP server did not answer a request in time
+ */
+export class MCPTimeoutError extends Error {
+  constructor(message = "Request timeout") {
+    super(message)
+    this.name = "MCPTimeoutError"
+  }
+}
+
 /**
  * Base transport interface for MCP communication
  */
 export interface MCPTransport {
-  send(method: string, params?: any): Promise<any>
+  send(method: string, params?: any, options?: SendOptions): Promise<any>
   close(): Promise<void>
   isConnected(): boolean
 }
@@ -27,7 +61,12 @@ export interface MCPTransport {
 export class StdioTransport implements MCPTransport {
   private process: ChildProcess
   private requestId = 0
-  private pendingRequests = new Map<number, { resolve: (value: any) => void; reject: (error: any) => void }>()
+  private pendingRequests = new Map<number, {
+    resolve: (value: any) => void
+    reject: (error: any) => void
+    onProgress?: (progress: MCPProgress) => void
+    resetTimeout: () => void
+  }>()
   private buffer = ""
   private logCallback?: (line: string, level: "stdout" | "stderr") => void
 
@@ -113,51 +152,83 @@ export class StdioTransport implements MCPTransport {
   }
 
   private handleMessage(message: any) {
+    // Progress notifications carry the request id as their progressToken
+    if (message.method === "notifications/progress" && message.params) {
+      const pending = this.pendingRequests.get(message.params.progressToken)
+      if (pending?.onProgress) {
+        pending.resetTimeout()
+        const { progress, total, message: text } = message.params
+        pending.onProgress({ progress, total, message: text })
+      }
+      return
+    }
+
     // Handle JSON-RPC response
     if (message.id !== undefined && this.pendingRequests.has(message.id)) {
       const { resolve, reject } = this.pendingRequests.get(message.id)!
       this.pendingRequests.delete(message.id)
 
       if (message.error) {
-        reject(new Error(message.error.message || "MCP server error"))
+        reject(new MCPRpcError(message.error.message || "MCP server error", message.error.code, message.error.data))
       } else {
         resolve(message.result)
       }
     }
   }
 
-  async send(method: string, params?: any): Promise<any> {
+  async send(method: string, params?: any, options?: SendOptions): Promise<any> {
     if (!this.isConnected()) {
       throw new Error("Transport not connected")
     }
 
     const id = ++this.requestId
+    const onProgress = options?.onProgress
     const request = {
       jsonrpc: "2.0",
       id,
       method,
-      params: params || {},
+      // Ask the server for progress notifications only when someone listens
+      params: onProgress
+        ? { ...(params || {}), _meta: { ...(params?._meta || {}), progressToken: id } }
+        : params || {},
     }
 
     return new Promise((resolve, reject) => {
-      this.pendingRequests.set(id, { resolve, reject })
+      let timeoutId: ReturnType<typeof setTimeout>
+      // Timeout after 30 seconds without a response (or progress notification)
+      const resetTimeout = () => {
+        clearTimeout(timeoutId)
+        timeoutId = setTimeout(() => {
+          if (this.pendingRequests.has(id)) {
+            this.pendingRequests.delete(id)
+            reject(new MCPTimeoutError())
+          }
+        }, 30000)
+      }
+      this.pendingRequests.set(id, {
+        resolve: (value) => {
+          clearTimeout(timeoutId)
+          resolve(value)
+        },
+        reject: (error) => {
+          clearTimeout(timeoutId)
+          reject(error)
+        },
+        onProgress,
+        resetTimeout,
+      })
 
       // Send request to stdin
       const requestJson = JSON.stringify(request) + "\n"
       this.process.stdin?.write(requestJson, (error) => {
         if (error) {
           this.pendingRequests.delete(id)
+          clearTimeout(timeoutId)
           reject(error)
         }
       })
 
-      // Timeout after 30 seconds
-      setTimeout(() => {
-        if (this.pendingRequests.has(id)) {
-          this.pendingRequests.delete(id)
-          reject(new Error("Request timeout"))
-        }
-      }, 30000)
+      resetTimeout()
     })
   }
 
@@ -215,7 +286,9 @@ export class HttpTransport implements MCPTransport {
     this.timeout = timeout
   }
 
-  async send(method: string, params?: any): Promise<any> {
+  // Plain request/response: the server's progress notifications never reach
+  // this transport, so options.onProgress is not called
+  async send(method: string, params?: any, _options?: SendOptions): Promise<any> {
     const request = {
       jsonrpc: "2.0",
       id: Date.now(),
@@ -245,13 +318,13 @@ export class HttpTransport implements MCPTransport {
       const data = await response.json()
 
       if (data.error) {
-        throw new Error(data.error.message || "MCP server error")
+        throw new MCPRpcError(data.error.message || "MCP server error", data.error.code, data.error.data)
       }
 
       return data.result
     } catch (error: any) {
       if (error.name === "AbortError") {
-        throw new Error("Request timeout")
+        throw new MCPTimeoutError()
       }
       throw error
     }
@@ -1,10 +1,404 @@
 import { spawn, ChildProcess } from "child_process"
+import { createHash } from "crypto"
+
+export interface SandboxLimitExceeded {
+  limit: "wall_time" | "cpu_time" | "memory" | "output"
+  value: number
+  wall_s: number
+  cpu_s: number
+  peak_rss_bytes: number
+}
+
+export interface SandboxElision {
+  /** JSONPath of the reduced value, e.g. "$.messages" or "$[3].body" */
+  path: string
+  kind: "list" | "dict" | "string" | "blob" | "nested" | "value"
+  [detail: string]: any
+}
+
+export interface SandboxReturnReduction {
+  original_bytes: number | null
+  returned_bytes: number
+  max_bytes: number
+  max_items: number
+  list_strategy: string
+  /** Per kind: how many values were reduced and how many items, keys, characters or bytes were removed */
+  totals: Record<string, { count: number; elided: number }>
+  /** The first elisions, one entry each (elided_count has the full number) */
+  elided: SandboxElision[]
+  elided_count: number
+}
+
+export interface SandboxSession {
+  id: string
+  /** True when the job started from an empty namespace (first job, reset, or the old kernel expired or was evicted) */
+  new: boolean
+  jobs: number
+  /** Estimated memory held by the session's globals */
+  size_bytes: number
+  closed: boolean
+  /** The session went over the worker's session memory cap and was discarded after this job */
+  evicted: boolean
+}
+
+export interface SandboxMetrics {
+  /** Wall time per phase (compile, sdk_import, setup, exec, main, serialize), "total" and, on a cold worker, "interpreter_startup" */
+  phases_ms: Record<string, number>
+  /** The job ran in a worker that had already run jobs */
+  warm: boolean
+  peak_rss_bytes: number
+  /** "memory" or "compiled" */
+  code_cache?: string
+  tool_calls: Record<string, any>[]
+  tool_calls_dropped: number
+  tool_call_count: number
+  tool_time_ms: number
+  coalesced_calls: number
+  /** Top functions by cumulative time, when a profile was requested */
+  profile?: { function: string; calls: number; total_ms: number; cumulative_ms: number }[]
+}
 
 export interface SandboxResult {
   stdout: string
   stderr: string
   return_value: any
   error: string | null
+  /** Set when python_sandbox.py stopped the job at a resource limit; stdout/stderr hold the partial output */
+  limit_exceeded?: SandboxLimitExceeded
+  /** Set when return_value was over its byte/item budget and was reduced */
+  return_value_reduced?: SandboxReturnReduction
+  /** Set for jobs that ran in a session kernel */
+  session?: SandboxSession
+  /** Set when metrics or a profile were requested */
+  metrics?: SandboxMetrics
+}
+
+const EXECUTION_TIMEOUT_MS = 30000
+// How long a job may wait for a free worker before it fails
+const QUEUE_TIMEOUT_MS = 30000
+
+export type SandboxOutputHandler = (stream: "stdout" | "stderr", data: string) => void
+
+/**
+ * Consumes the sandbox streaming protocol: NDJSON `stdout`/`stderr` events
+ * followed by a final `result` event. Streamed output is forwarded to the
+ * handler and folded back into the result, since Python does not repeat it.
+ */
+class StreamingOutputCollector {
+  private stdout = ''
+  private stderr = ''
+
+  constructor(private onOutput?: SandboxOutputHandler) {}
+
+  /** Returns the parsed final result once it arrives, otherwise undefined */
+  handleLine(line: string): Record<string, any> | undefined {
+    const message = JSON.parse(line)
+    if (message.event === "stdout" || message.event === "stderr") {
+      if (message.event === "stdout") {
+        this.stdout += message.data
+      } else {
+        this.stderr += message.data
+      }
+      this.onOutput?.(message.event, message.data)
+      return undefined
+    }
+    const { event, ...result } = message
+    result.stdout = this.stdout + (result.stdout || "")
+    result.stderr = this.stderr + (result.stderr || "")
+    return result
+  }
+}
+
+// Determine Python command (Windows uses 'py', Unix uses 'python3')
+// On Windows, use full path to py.exe to avoid PATH issues
+function getPythonCommand(): string {
+  if (process.platform === 'win32') {
+    // Use full path to Python launcher (usually in C:\WINDOWS\py.exe)
+    return process.env.WINDIR ? `${process.env.WINDIR}\\py.exe` : 'C:\\WINDOWS\\py.exe'
+  }
+  return 'python3'
+}
+
+interface PendingJob {
+  resolve: (result: SandboxResult) => void
+  reject: (error: Error) => void
+  timeout: NodeJS.Timeout
+  collector: StreamingOutputCollector
+}
+
+/**
+ * A long-lived `python_sandbox.py --worker` process.
+ * Jobs are written as NDJSON lines; the worker answers each with one JSON line.
+ */
+class SandboxWorker {
+  private child: ChildProcess
+  private buffer = ''
+  private pending: PendingJob | null = null
+  private nextJobId = 1
+  reserved = false
+  retiring = false
+  exited = false
+  /** Tenant of the first job; a worker never runs jobs of another tenant */
+  tenant?: string
+  /** Session kernels alive in this worker, as last reported by it */
+  sessions = new Set<string>()
+
+  constructor(private onExit: (worker: SandboxWorker) => void) {
+    this.child = spawn(getPythonCommand(), ['scripts/python_sandbox.py', '--worker'], {
+      env: process.env,
+      cwd: process.cwd(),
+      stdio: ['pipe', 'pipe', 'pipe'],
+    })
+
+    // Decode as a stream: a multi-byte character may be split across chunks
+    this.child.stdout?.setEncoding('utf8')
+    this.child.stderr?.setEncoding('utf8')
+    this.child.stdout?.on('data', (data: string) => this.handleData(data))
+    this.child.stderr?.on('data', (data: string) => {
+      console.error("[Sandbox] Worker stderr:", data)
+    })
+    this.child.on('error', (error) => this.handleExit(error))
+    this.child.on('exit', (code) => this.handleExit(new Error(`Sandbox worker exited with code ${code}`)))
+    // Writing to a worker that died emits EPIPE here; unhandled it would crash the host
+    this.child.stdin?.on('error', (error) => {
+      this.kill()
+      this.handleExit(error)
+    })
+  }
+
+  run(inputData: Record<string, any>, onOutput?: SandboxOutputHandler): Promise<SandboxResult> {
+    return new Promise<SandboxResult>((resolve, reject) => {
+      const timeout = setTimeout(() => {
+        // A stuck worker cannot be trusted with another job
+        this.pending = null
+        this.kill()
+        reject(new Error('Execution timeout after 30 seconds'))
+      }, EXECUTION_TIMEOUT_MS)
+
+      this.pending = { resolve, reject, timeout, collector: new StreamingOutputCollector(onOutput) }
+      this.child.stdin?.write(JSON.stringify({ ...inputData, id: this.nextJobId++ }) + '\n')
+    })
+  }
+
+  kill() {
+    this.retiring = true
+    this.child.kill()
+  }
+
+  private handleData(chunk: string) {
+    this.buffer += chunk
+    let newline = this.buffer.indexOf('\n')
+    while (newline !== -1) {
+      const line = this.buffer.slice(0, newline).trim()
+      this.buffer = this.buffer.slice(newline + 1)
+      if (line) {
+        this.handleLine(line)
+      }
+      newline = this.buffer.indexOf('\n')
+    }
+  }
+
+  private handleLine(line: string) {
+    const job = this.pending
+    if (!job) {
+      return
+    }
+    try {
+      const message = job.collector.handleLine(line)
+      if (!message) {
+        return
+      }
+      this.pending = null
+      clearTimeout(job.timeout)
+      const { worker, id, ...result } = message
+      if (worker?.retiring) {
+        this.retiring = true
+      }
+      if (worker?.sessions) {
+        this.sessions = new Set(worker.sessions)
+      }
+      job.resolve(result as SandboxResult)
+    } catch {
+      this.pending = null
+      clearTimeout(job.timeout)
+      job.resolve({
+        stdout: line,
+        stderr: "",
+        return_value: null,
+        error: "Failed to parse sandbox output",
+      })
+    }
+  }
+
+  private handleExit(error: Error) {
+    if (this.exited) {
+      return
+    }
+    this.exited = true
+    this.retiring = true
+    const job = this.pending
+    this.pending = null
+    if (job) {
+      clearTimeout(job.timeout)
+      job.reject(error)
+    }
+    this.onExit(this)
+  }
+}
+
+interface WaitingJob {
+  tenant: string
+  sessionId?: string
+  resolve: (worker: SandboxWorker) => void
+  reject: (error: Error) => void
+  timeout: NodeJS.Timeout
+  /** An idle worker of another tenant was already recycled for this job */
+  recycled?: boolean
+}
+
+/**
+ * Pool of pre-forked sandbox workers so executions skip interpreter startup
+ * and SDK imports. Workers recycle themselves after a number of jobs or too
+ * much RSS growth; the pool replaces them as they exit. Without `prefork`
+ * workers are only spawned when a job finds none it may use, up to `size`.
+ * Modules and SDK classes outlive each job, so a worker is bound to the tenant
+ * of its first job; when the pool is full and only other tenants' workers are
+ * idle, one of them is recycled for a fresh interpreter. Jobs of a session
+ * wait for the worker holding its kernel; once that worker is gone the next
+ * job starts the session afresh on any worker. Jobs that wait longer than
+ * QUEUE_TIMEOUT_MS fail.
+ */
+class SandboxWorkerPool {
+  private workers: SandboxWorker[] = []
+  private waiting: WaitingJob[] = []
+
+  constructor(private size: number, private prefork = true) {
+    for (let i = 0; prefork && i < size; i++) {
+      this.spawnWorker()
+    }
+  }
+
+  async execute(inputData: Record<string, any>, onOutput?: SandboxOutputHandler): Promise<SandboxResult> {
+    const worker = await this.acquire(inputData.tenant, inputData.session_id)
+    try {
+      return await worker.run(inputData, onOutput)
+    } finally {
+      this.release(worker)
+    }
+  }
+
+  private spawnWorker() {
+    this.workers.push(new SandboxWorker((worker) => this.handleWorkerExit(worker)))
+  }
+
+  private handleWorkerExit(worker: SandboxWorker) {
+    this.workers = this.workers.filter((w) => w !== worker)
+    if (this.prefork && this.workers.length < this.size) {
+      this.spawnWorker()
+    }
+    this.dispatch()
+  }
+
+  private sessionOwner(tenant: string, sessionId?: string): SandboxWorker | undefined {
+    if (sessionId === undefined) {
+      return undefined
+    }
+    return this.workers.find((w) => !w.retiring && w.tenant === tenant && w.sessions.has(sessionId))
+  }
+
+  private findIdleWorker(tenant: string, sessionId?: string): SandboxWorker | undefined {
+    if (sessionId !== undefined) {
+      const owner = this.sessionOwner(tenant, sessionId)
+      if (owner) {
+        return owner.reserved ? undefined : owner
+      }
+    }
+    // Prefer workers without kernels so session memory stays available to its owners
+    const idle = this.workers.filter((w) => !w.reserved && !w.retiring)
+    const own = idle.filter((w) => w.tenant === tenant)
+    return own.find((w) => w.sessions.size === 0) ?? own[0] ?? idle.find((w) => w.tenant === undefined)
+  }
+
+  /** Recycle an idle worker bound to another tenant; its replacement picks up waiting jobs */
+  private recycleIdleWorker(tenant: string): boolean {
+    const idle = this.workers.filter((w) => !w.reserved && !w.retiring && w.tenant !== tenant)
+    const victim = idle.find((w) => w.sessions.size === 0) ?? idle[0]
+    victim?.kill()
+    return victim !== undefined
+  }
+
+  private reserve(worker: SandboxWorker, tenant: string) {
+    worker.reserved = true
+    worker.tenant ??= tenant
+  }
+
+  private acquire(tenant: string, sessionId?: string): Promise<SandboxWorker> {
+    const worker = this.findIdleWorker(tenant, sessionId)
+    if (worker) {
+      // Reserve synchronously so concurrent callers never share a worker
+      this.reserve(worker, tenant)
+      return Promise.resolve(worker)
+    }
+    return new Promise((resolve, reject) => {
+      const timeout = setTimeout(() => {
+        this.waiting = this.waiting.filter((job) => job.timeout !== timeout)
+        reject(new Error(`Sandbox busy: no worker became available within ${QUEUE_TIMEOUT_MS / 1000} seconds`))
+      }, QUEUE_TIMEOUT_MS)
+      this.waiting.push({ tenant, sessionId, resolve, reject, timeout })
+      this.dispatch()
+    })
+  }
+
+  private release(worker: SandboxWorker) {
+    worker.reserved = false
+    // Retiring workers exit on their own after their final result and are replaced on exit
+    this.dispatch()
+  }
+
+  private dispatch() {
+    // A session job waiting for its busy worker must not hold up jobs behind it
+    for (let i = 0; i < this.waiting.length; ) {
+      const job = this.waiting[i]
+      let worker = this.findIdleWorker(job.tenant, job.sessionId)
+      // A job waiting for its session's busy worker needs no new or recycled worker
+      const waitsForOwner = !worker && this.sessionOwner(job.tenant, job.sessionId) !== undefined
+      if (!worker && !waitsForOwner && this.workers.length < this.size) {
+        this.spawnWorker()
+        worker = this.findIdleWorker(job.tenant, job.sessionId)
+      }
+      if (!worker) {
+        if (!job.recycled && !waitsForOwner) {
+          job.recycled = this.recycleIdleWorker(job.tenant)
+        }
+        i++
+        continue
+      }
+      this.reserve(worker, job.tenant)
+      this.waiting.splice(i, 1)
+      clearTimeout(job.timeout)
+      job.resolve(worker)
+    }
+  }
+}
+
+let workerPool: SandboxWorkerPool | null = null
+let sessionWorkerPool: SandboxWorkerPool | null = null
+
+// Pooled execution is opt-in: set SANDBOX_POOL_SIZE to the number of warm workers.
+// Session jobs need a long-lived worker, so without a pool they get workers spawned
+// on demand, one per tenant, at most SANDBOX_SESSION_WORKERS (default 4) at a time.
+function getWorkerPool(forSession = false): SandboxWorkerPool | null {
+  const size = parseInt(process.env.SANDBOX_POOL_SIZE || "0", 10)
+  if (size >= 1) {
+    workerPool ??= new SandboxWorkerPool(size)
+    return workerPool
+  }
+  if (!forSession) {
+    return null
+  }
+  const sessionWorkers = parseInt(process.env.SANDBOX_SESSION_WORKERS || "4", 10)
+  sessionWorkerPool ??= new SandboxWorkerPool(sessionWorkers >= 1 ? sessionWorkers : 1, false)
+  return sessionWorkerPool
 }
 
 export async function executePythonCode(
@@ -13,7 +407,25 @@ export async function executePythonCode(
     nexus_api_url?: string
     server_instance_id?: string
     nexus_auth_token?: string
+    // Identity warm workers are bound to (the user id); defaults to the auth token, then the server instance
+    tenant?: string
     env?: Record<string, string>
+    // Receives stdout/stderr chunks while the script runs (enables the streaming protocol)
+    onOutput?: SandboxOutputHandler
+    // Return value budget (0 disables a limit); see python_sandbox.py for the defaults
+    max_return_bytes?: number
+    max_return_items?: number
+    return_list_strategy?: "head" | "sample" | `topk:${string}`
+    // Run in a session kernel whose globals and SDK clients persist between executions
+    session_id?: string
+    // Start the session from an empty namespace
+    reset_session?: boolean
+    // Discard the session after this execution
+    close_session?: boolean
+    // Report phase timings, tool calls and peak memory in result.metrics
+    metrics?: boolean
+    // Also profile the user code (implies metrics)
+    profile?: boolean
   }
 ): Promise<SandboxResult> {
   try {
@@ -28,6 +440,30 @@ export async function executePythonCode(
     if (options?.nexus_auth_token) {
       inputData.nexus_auth_token = options.nexus_auth_token
     }
+    if (options?.onOutput) {
+      inputData.stream = true
+    }
+    // Same fallbacks as _job_tenant in python_sandbox.py
+    const token = options?.nexus_auth_token ?? options?.env?.NEXUS_AUTH_TOKEN
+    inputData.tenant = options?.tenant
+      ?? (token ? `token:${createHash("sha256").update(token).digest("hex")}` : `instance:${options?.server_instance_id ?? ""}`)
+    for (const key of [
+      "max_return_bytes", "max_return_items", "return_list_strategy", "session_id", "reset_session", "close_session",
+      "metrics", "profile",
+    ] as const) {
+      if (options?.[key] !== undefined) {
+        inputData[key] = options[key]
+      }
+    }
+
+    const pool = getWorkerPool(options?.session_id !== undefined)
+    if (pool) {
+      // Workers share one process environment, so per-execution env travels with the job
+      if (options?.env) {
+        inputData.env = options.env
+      }
+      return await pool.execute(inputData, options?.onOutput)
+    }
 
     const input = JSON.stringify(inputData)
 
@@ -36,15 +472,11 @@ export async function executePythonCode(
       ...options?.env,
     }
 
-    // Determine Python command (Windows uses 'py', Unix uses 'python3')
-    // On Windows, use full path to py.exe to avoid PATH issues
-    let pythonCmd: string
-    if (process.platform === 'win32') {
-      // Use full path to Python launcher (usually in C:\WINDOWS\py.exe)
-      pythonCmd = process.env.WINDIR ? `${process.env.WINDIR}\\py.exe` : 'C:\\WINDOWS\\py.exe'
-    } else {
-      pythonCmd = 'python3'
-    }
+    const pythonCmd = getPythonCommand()
+
+    // In streaming mode stdout carries NDJSON events that are consumed line by line
+    const collector = options?.onOutput ? new StreamingOutputCollector(options.onOutput) : null
+    let streamedResult: Record<string, any> | undefined
 
     // Execute Python sandbox script using spawn (supports stdin/stdout pipes)
     const { stdout, stderr } = await new Promise<{ stdout: string; stderr: string }>((resolve, reject) => {
@@ -57,12 +489,31 @@ export async function executePythonCode(
       let stdoutData = ''
       let stderrData = ''
 
-      child.stdout?.on('data', (data: Buffer) => {
-        stdoutData += data.toString()
+      // Decode as a stream: a multi-byte character may be split across chunks
+      child.stdout?.setEncoding('utf8')
+      child.stderr?.setEncoding('utf8')
+      child.stdout?.on('data', (data: string) => {
+        stdoutData += data
+        if (!collector) {
+          return
+        }
+        let newline = stdoutData.indexOf('\n')
+        while (newline !== -1) {
+          const line = stdoutData.slice(0, newline).trim()
+          stdoutData = stdoutData.slice(newline + 1)
+          if (line) {
+            try {
+              streamedResult = collector.handleLine(line) ?? streamedResult
+            } catch {
+              // Not a protocol line; ignore it
+            }
+          }
+          newline = stdoutData.indexOf('\n')
+        }
       })
 
-      child.stderr?.on('data', (data: Buffer) => {
-        stderrData += data.toString()
+      child.stderr?.on('data', (data: string) => {
+        stderrData += data
       })
 
       child.on('error', (error) => {
@@ -74,7 +525,7 @@ export async function executePythonCode(
       const timeout = setTimeout(() => {
         child.kill()
         reject(new Error('Execution timeout after 30 seconds'))
-      }, 30000)
+      }, EXECUTION_TIMEOUT_MS)
 
       child.on('exit', (code) => {
         clearTimeout(timeout)
@@ -94,6 +545,10 @@ export async function executePythonCode(
       }
     })
 
+    if (streamedResult) {
+      return streamedResult as SandboxResult
+    }
+
     // Parse the JSON result from Python script
     try {
       const result = JSON.parse(stdout)
@@ -0,0 +1,431 @@
+"""
+Latency and throughput benchmarks for the Python sandbox and nexus_sdk
+
+Starts a local stand-in for the Nexus `/api/mcp/call` endpoint (with
+configurable latency and payload size) and measures:
+
+- cold (one process per job) vs warm (--worker) execution latency
+- MCP.call throughput, sequential and concurrent
+- large-response decode cost
+- Gmail search / get fan-out
+
+Results are printed as JSON: p50/p95/p99 latencies and RSS per scenario.
+
+Usage:
+    python scripts/benchmark_sandbox.py [--latency-ms 5] [--payload-bytes 1024] [--output bench.json]
+    python scripts/benchmark_sandbox.py --scenarios cold,warm --cold-runs 5
+"""
+
+import argparse
+import json
+import math
+import os
+import platform
+import socket
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+SANDBOX = os.path.join(SCRIPTS_DIR, "python_sandbox.py")
+
+SCENARIOS = ("cold", "warm", "mcp", "decode", "gmail")
+
+SERVER_INSTANCE_ID = "benchmark-instance"
+
+
+class FakeNexusServer:
+    """
+    Local stand-in for the Nexus MCP proxy
+
+    Answers tools/call requests (tool "echo" returns `payload_bytes` of
+    text, tool "large" returns a JSON document of arguments["bytes"]) and the
+    Google methods used by GoogleSDK (gmail_search, gmail_get_message).
+    Batch requests (JSON arrays) are answered item by item. Every HTTP
+    request is delayed by `latency_s`.
+    """
+
+    def __init__(self, latency_s=0.0, payload_bytes=1024):
+        self.latency_s = latency_s
+        self.payload_bytes = payload_bytes
+        self.requests = 0
+        self._payloads = {}
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def setup(self):
+                super().setup()
+                # Headers and body are separate writes; without this, Nagle's algorithm
+                # plus delayed ACKs add ~40 ms to every response
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                with server._lock:
+                    server.requests += 1
+                if server.latency_s:
+                    time.sleep(server.latency_s)
+                if isinstance(body, list):
+                    reply = [dict(server.handle(item), id=item.get("id", index)) for index, item in enumerate(body)]
+                else:
+                    reply = server.handle(body)
+                data = json.dumps(reply).encode()
+                self.send_response(500 if isinstance(reply, dict) and "error" in reply else 200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self._httpd.server_port}"
+
+    def start(self):
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def _payload(self, kind, size):
+        key = (kind, size)
+        if key not in self._payloads:
+            if kind == "json":
+                record = {"id": "0000000000", "title": "benchmark record", "score": 0.5, "tags": ["a", "b"]}
+                count = max(1, size // len(json.dumps(record)))
+                self._payloads[key] = json.dumps([dict(record, id=f"{i:010d}") for i in range(count)])
+            else:
+                self._payloads[key] = "x" * size
+        return self._payloads[key]
+
+    def handle(self, body):
+        method = body.get("method")
+        params = body.get("params") or {}
+        if method == "tools/call":
+            arguments = params.get("arguments") or {}
+            if params.get("name") == "large":
+                text = self._payload("json", int(arguments.get("bytes", self.payload_bytes)))
+            else:
+                text = self._payload("text", self.payload_bytes)
+            return {"result": {"content": [{"type": "text", "text": text}]}}
+        if method == "gmail_search":
+            count = int(params.get("max_results", 10))
+            return {"result": {"messages": [
+                {"id": f"m{i}", "snippet": "benchmark snippet", "from": f"sender{i}@example.com"}
+                for i in range(count)
+            ]}}
+        if method == "gmail_get_message":
+            message_id = params.get("message_id", "")
+            return {"result": {
+                "id": message_id,
+                "threadId": f"t{message_id}",
+                "snippet": "benchmark snippet",
+                "labelIds": ["INBOX"],
+                "payload": {"headers": [
+                    {"name": "From", "value": f"sender@{message_id}.example.com"},
+                    {"name": "Subject", "value": f"Subject {message_id}"},
+                    {"name": "Date", "value": "Mon, 6 May 2024 09:00:00 +0000"},
+                ]},
+                "body": self._payload("text", self.payload_bytes),
+            }}
+        return {"error": f"Unknown method {method}"}
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an ascending list"""
+    if not sorted_values:
+        return None
+    rank = max(0, math.ceil(q / 100 * len(sorted_values)) - 1)
+    return sorted_values[rank]
+
+
+def summarize(latencies_s, elapsed_s=None, errors=0, **extra):
+    """Latency summary (milliseconds) of one scenario"""
+    values = sorted(latencies_s)
+    summary = {"runs": len(values), "errors": errors}
+    if values:
+        summary.update({
+            "p50_ms": round(percentile(values, 50) * 1000, 3),
+            "p95_ms": round(percentile(values, 95) * 1000, 3),
+            "p99_ms": round(percentile(values, 99) * 1000, 3),
+            "mean_ms": round(sum(values) / len(values) * 1000, 3),
+            "min_ms": round(values[0] * 1000, 3),
+            "max_ms": round(values[-1] * 1000, 3),
+        })
+    if elapsed_s:
+        summary["throughput_per_s"] = round(len(values) / elapsed_s, 1)
+    summary.update(extra)
+    return summary
+
+
+def process_memory(pid="self"):
+    """Current and peak RSS of a process in bytes, from /proc (empty where unavailable)"""
+    fields = {"VmRSS:": "rss_bytes", "VmHWM:": "peak_rss_bytes"}
+    memory = {}
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                parts = line.split()
+                if parts and parts[0] in fields:
+                    memory[fields[parts[0]]] = int(parts[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    if not memory and pid == "self":
+        try:
+            import resource
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            memory["peak_rss_bytes"] = peak if sys.platform == "darwin" else peak * 1024
+        except ImportError:
+            pass
+    return memory
+
+
+def _job(server, code):
+    return {
+        "code": code,
+        "nexus_api_url": server.url,
+        "server_instance_id": SERVER_INSTANCE_ID,
+    }
+
+
+# One MCP round trip, so sandbox latency includes SDK setup and a real call
+SANDBOX_CODE = "def main():\n    return len(mcp.call('echo', {'n': 1}))\n"
+
+
+def bench_cold(server, args, env):
+    """One `python_sandbox.py` process per job (interpreter start, imports, call)"""
+    line = json.dumps(_job(server, SANDBOX_CODE)).encode()
+    latencies, errors = [], 0
+    for _ in range(args.cold_runs):
+        started = time.perf_counter()
+        completed = subprocess.run([sys.executable, SANDBOX], input=line, capture_output=True, env=env)
+        latencies.append(time.perf_counter() - started)
+        try:
+            errors += bool(completed.returncode or json.loads(completed.stdout).get("error"))
+        except ValueError:
+            errors += 1
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+        peak = peak if sys.platform == "darwin" else peak * 1024
+    except ImportError:
+        peak = None
+    return summarize(latencies, errors=errors, child_peak_rss_bytes=peak)
+
+
+def bench_warm(server, args, env):
+    """Jobs sent one at a time to a long-lived `python_sandbox.py --worker`"""
+    worker = subprocess.Popen(
+        [sys.executable, SANDBOX, "--worker", "--max-jobs", "0", "--max-rss-mb", "0"],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, env=env,
+    )
+    line = json.dumps(_job(server, SANDBOX_CODE)).encode() + b"\n"
+    latencies, errors, first_job = [], 0, None
+    try:
+        for run in range(args.warm_runs + 1):
+            started = time.perf_counter()
+            worker.stdin.write(line)
+            worker.stdin.flush()
+            reply = worker.stdout.readline()
+            elapsed = time.perf_counter() - started
+            try:
+                errors += bool(json.loads(reply).get("error"))
+            except ValueError:
+                errors += 1
+                break
+            if run == 0:
+                # The first job pays for lazy SDK setup; report it on its own
+                first_job = round(elapsed * 1000, 3)
+            else:
+                latencies.append(elapsed)
+        memory = process_memory(worker.pid)
+    finally:
+        worker.stdin.close()
+        worker.wait(timeout=10)
+    return summarize(latencies, errors=errors, first_job_ms=first_job,
+                     worker_rss_bytes=memory.get("rss_bytes"), worker_peak_rss_bytes=memory.get("peak_rss_bytes"))
+
+
+def bench_mcp(server, args, sdk):
+    """MCP.call latency and throughput, sequential and concurrent"""
+    mcp = sdk.MCP(base_url=server.url, server_instance_id=SERVER_INSTANCE_ID)
+    mcp.call("echo", {"warmup": True})
+
+    latencies = []
+    started = time.perf_counter()
+    for i in range(args.iterations):
+        call_started = time.perf_counter()
+        mcp.call("echo", {"i": i})
+        latencies.append(time.perf_counter() - call_started)
+    sequential = summarize(latencies, time.perf_counter() - started)
+
+    concurrent_latencies = []
+
+    def timed_call(i):
+        call_started = time.perf_counter()
+        # Distinct arguments, so concurrent calls aren't coalesced into one request
+        mcp.call("echo", {"i": i})
+        concurrent_latencies.append(time.perf_counter() - call_started)
+
+    started = time.perf_counter()
+    results = sdk.parallel_map(timed_call, range(args.iterations), max_workers=args.concurrency,
+                               return_exceptions=True)
+    concurrent = summarize(concurrent_latencies, time.perf_counter() - started,
+                           errors=sum(isinstance(r, Exception) for r in results), concurrency=args.concurrency)
+    return {"sequential": sequential, "concurrent": concurrent}
+
+
+def bench_decode(server, args, sdk):
+    """Cost of decoding a large tools/call response, with and without the network"""
+    from nexus_sdk import codec
+    from nexus_sdk.transport import get_transport
+
+    mcp = sdk.MCP(base_url=server.url, server_instance_id=SERVER_INSTANCE_ID)
+    arguments = {"bytes": args.large_bytes}
+    runs = max(3, args.iterations // 20)
+
+    body = get_transport().post(f"{server.url}/api/mcp/call", mcp._build_payload("large", arguments))
+    latencies = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        codec.loads(body)
+        latencies.append(time.perf_counter() - started)
+    decode_only = summarize(latencies, response_bytes=len(body), codec=codec.backend())
+
+    results = {"codec_loads": decode_only}
+    for name, raw in (("mcp_call", False), ("mcp_call_raw", True)):
+        latencies = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            result = mcp.call("large", arguments, raw=raw)
+            if raw:
+                # Touch the text the way a script would
+                result.text
+                result.close()
+            latencies.append(time.perf_counter() - started)
+        results[name] = summarize(latencies, response_bytes=len(body))
+    return results
+
+
+def bench_gmail(server, args, sdk):
+    """Gmail search followed by a per-message fetch, three ways"""
+    google = sdk.GoogleSDK(base_url=server.url, server_instance_id=SERVER_INSTANCE_ID)
+    runs = max(3, args.iterations // max(1, args.fanout))
+
+    def search_ids():
+        return [message["id"] for message in google.gmail.search("benchmark", limit=args.fanout)]
+
+    strategies = {
+        "sequential": lambda ids: [google.gmail.get_message(message_id) for message_id in ids],
+        "parallel_map": lambda ids: sdk.parallel_map(google.gmail.get_message, ids, max_workers=args.concurrency),
+        "get_messages": lambda ids: google.gmail.get_messages(ids),
+    }
+
+    results = {}
+    for name, fetch in strategies.items():
+        latencies = []
+        requests_before = server.requests
+        for _ in range(runs):
+            started = time.perf_counter()
+            fetch(search_ids())
+            latencies.append(time.perf_counter() - started)
+        results[name] = summarize(
+            latencies,
+            messages_per_run=args.fanout,
+            http_requests_per_run=round((server.requests - requests_before) / runs, 1),
+        )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark python_sandbox.py and nexus_sdk against a local fake MCP proxy")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        help=f"comma-separated subset of: {', '.join(SCENARIOS)}")
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="fake server latency per HTTP request")
+    parser.add_argument("--payload-bytes", type=int, default=1024, help="size of ordinary tool responses")
+    parser.add_argument("--large-bytes", type=int, default=4 * 1024 * 1024, help="size of the large-response payload")
+    parser.add_argument("--iterations", type=int, default=200, help="MCP calls per throughput scenario")
+    parser.add_argument("--concurrency", type=int, default=8, help="worker threads for concurrent scenarios")
+    parser.add_argument("--cold-runs", type=int, default=10, help="cold sandbox executions")
+    parser.add_argument("--warm-runs", type=int, default=50, help="warm sandbox executions")
+    parser.add_argument("--fanout", type=int, default=50, help="messages per Gmail fan-out run")
+    parser.add_argument("--output", help="write the JSON report to this file instead of stdout")
+    args = parser.parse_args()
+
+    selected = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = sorted(set(selected) - set(SCENARIOS))
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)}")
+
+    server = FakeNexusServer(args.latency_ms / 1000, args.payload_bytes).start()
+    # Caching would turn repeated calls into no-ops
+    os.environ.update({
+        "NEXUS_API_URL": server.url,
+        "NEXUS_SERVER_INSTANCE_ID": SERVER_INSTANCE_ID,
+        "NEXUS_CACHE": "0",
+    })
+    child_env = dict(os.environ)
+    if SCRIPTS_DIR not in sys.path:
+        sys.path.insert(0, SCRIPTS_DIR)
+    import nexus_sdk
+    from nexus_sdk import codec, transport
+
+    report = {
+        "environment": {
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "json_codec": codec.backend(),
+            "http_backend": "requests" if transport.HAS_REQUESTS else "http.client",
+        },
+        "config": {
+            "latency_ms": args.latency_ms,
+            "payload_bytes": args.payload_bytes,
+            "large_bytes": args.large_bytes,
+            "iterations": args.iterations,
+            "concurrency": args.concurrency,
+            "cold_runs": args.cold_runs,
+            "warm_runs": args.warm_runs,
+            "fanout": args.fanout,
+        },
+        "scenarios": {},
+    }
+    try:
+        for name in selected:
+            started = time.perf_counter()
+            if name == "cold":
+                result = bench_cold(server, args, child_env)
+            elif name == "warm":
+                result = bench_warm(server, args, child_env)
+            elif name == "mcp":
+                result = bench_mcp(server, args, nexus_sdk)
+            elif name == "decode":
+                result = bench_decode(server, args, nexus_sdk)
+            else:
+                result = bench_gmail(server, args, nexus_sdk)
+            result["duration_s"] = round(time.perf_counter() - started, 3)
+            result.update(process_memory())
+            report["scenarios"][name] = result
+    finally:
+        server.stop()
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Import-time budget check for the Python sandbox and nexus_sdk
+
+Runs `python -X importtime` on each module in a fresh interpreter and fails
+if the cumulative import time is over budget, or if an import pulls in a
+heavy module that should only be loaded on first use.
+
+Usage:
+    python scripts/check_import_time.py [--runs 5]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+# Published budgets (cumulative import time in milliseconds, best of N runs)
+IMPORT_BUDGETS_MS = {
+    "nexus_sdk": 5.0,
+    "python_sandbox": 20.0,
+}
+
+# Modules that must not be imported eagerly by `import <module>`
+LAZY_MODULES = ("requests", "asyncio", "sqlite3", "http.client", "concurrent.futures", "tempfile")
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def measure_import_ms(module):
+    """Return the cumulative import time of `module` in a fresh interpreter"""
+    output = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=SCRIPTS_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stderr
+    for line in output.splitlines():
+        # Format: "import time: self [us] | cumulative | imported package"
+        parts = line.split("|")
+        if len(parts) == 3 and parts[2].strip() == module:
+            return int(parts[1]) / 1000
+    raise RuntimeError(f"No importtime entry for {module}")
+
+
+def eager_lazy_modules(module):
+    """Return the lazy-only modules that `import module` loads"""
+    code = (
+        f"import sys, {module}; "
+        f"print(','.join(m for m in {LAZY_MODULES!r} if m in sys.modules))"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=SCRIPTS_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout.strip()
+    return [name for name in output.split(",") if name]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check nexus_sdk / sandbox import-time budgets")
+    parser.add_argument("--runs", type=int, default=5, help="measurements per module (best is used)")
+    args = parser.parse_args()
+
+    failed = False
+    for module, budget in IMPORT_BUDGETS_MS.items():
+        best = min(measure_import_ms(module) for _ in range(args.runs))
+        eager = eager_lazy_modules(module)
+        ok = best <= budget and not eager
+        failed = failed or not ok
+        status = "ok" if ok else "FAIL"
+        print(f"{status:4} {module:16} {best:7.2f} ms (budget {budget:.1f} ms)")
+        if eager:
+            print(f"     {module} eagerly imports: {', '.join(eager)}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
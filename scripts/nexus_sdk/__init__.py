@@ -1,34 +1,113 @@
 """
 Nexus SDK - Python wrapper for Project Nexus MCP integration
+
+Submodules and the HTTP backend are imported lazily on first attribute
+access (PEP 562), so `import nexus_sdk` stays cheap for scripts that never
+make a call. Run scripts/check_import_time.py to check the import budget.
 """
 
-from .google import GoogleSDK, GoogleWorkspace
-from .mcp import MCP, get_mcp, call as mcp_call
+import importlib
+
+__all__ = [
+    'GoogleSDK', 'GoogleWorkspace', 'google', 'MCP', 'get_mcp', 'mcp_call', 'AsyncMCP', 'parallel_map', 'MCPResult',
+    'MCPStream', 'ProgressUpdate',
+    'NexusAPIError', 'MCPCallError', 'MCPTimeoutError', 'MCPAuthError', 'MCPUpstreamError', 'CircuitOpenError',
+    'MCPCancelledError', 'MCPValidationError', 'Frame', 'to_frame',
+]
+
+# Public name -> (submodule, attribute), resolved on first access
+_LAZY_ATTRIBUTES = {
+    'GoogleSDK': ('google', 'GoogleSDK'),
+    'GoogleWorkspace': ('google', 'GoogleWorkspace'),
+    'MCP': ('mcp', 'MCP'),
+    'get_mcp': ('mcp', 'get_mcp'),
+    'mcp_call': ('mcp', 'call'),
+    'AsyncMCP': ('concurrency', 'AsyncMCP'),
+    'parallel_map': ('concurrency', 'parallel_map'),
+    'MCPResult': ('result', 'MCPResult'),
+    'MCPStream': ('result', 'MCPStream'),
+    'ProgressUpdate': ('result', 'ProgressUpdate'),
+    'NexusAPIError': ('errors', 'NexusAPIError'),
+    'MCPCallError': ('errors', 'MCPCallError'),
+    'MCPTimeoutError': ('errors', 'MCPTimeoutError'),
+    'MCPAuthError': ('errors', 'MCPAuthError'),
+    'MCPUpstreamError': ('errors', 'MCPUpstreamError'),
+    'CircuitOpenError': ('errors', 'CircuitOpenError'),
+    'MCPCancelledError': ('errors', 'MCPCancelledError'),
+    'MCPValidationError': ('errors', 'MCPValidationError'),
+    'Frame': ('frame', 'Frame'),
+    'to_frame': ('frame', 'to_frame'),
+}
 
-__all__ = ['GoogleSDK', 'GoogleWorkspace', 'google', 'MCP', 'get_mcp', 'mcp_call']
+# Submodules that may be reached as attributes without shadowing package names
+_LAZY_SUBMODULES = (
+    'cache', 'calendar_index', 'catalog', 'codec', 'concurrency', 'errors', 'frame', 'metrics', 'resilience', 'tracing',
+    'transport',
+)
 
 # Create singleton instances (lazy initialization to avoid requiring server_instance_id at import time)
 _google_instance = None
 mcp = None
 
+def _import_submodule(name):
+    # Importing a submodule binds it as a package attribute, which would shadow
+    # the `google` proxy and the `mcp` singleton slot; restore them afterwards
+    shadowed = {key: globals()[key] for key in ('google', 'mcp')}
+    module = importlib.import_module(f'.{name}', __name__)
+    globals().update(shadowed)
+    return module
+
+def __getattr__(name):
+    if name in _LAZY_ATTRIBUTES:
+        module_name, attribute = _LAZY_ATTRIBUTES[name]
+        value = getattr(_import_submodule(module_name), attribute)
+        globals()[name] = value
+        return value
+    if name in _LAZY_SUBMODULES:
+        return _import_submodule(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_ATTRIBUTES) | set(_LAZY_SUBMODULES))
+
+def preload():
+    """Import every submodule and the HTTP backend up front (for long-lived workers)"""
+    for name in _LAZY_ATTRIBUTES:
+        __getattr__(name)
+    _import_submodule('transport').load_backend()
+    _import_submodule('frame').numpy_module()
+
 def get_google_instance():
     """Get or create the GoogleSDK singleton instance (lazy initialization)"""
-    global _google_instance
+    global _google_instance, google
     if _google_instance is None:
-        _google_instance = GoogleSDK()
+        _google_instance = __getattr__('GoogleSDK')()
+        # Later `nexus_sdk.google` lookups get the instance itself, not the proxy
+        google = _google_instance
     return _google_instance
 
+def bind_google_instance(instance):
+    """
+    Install a GoogleSDK instance as the `google` singleton (None restores lazy creation)
+
+    Used by the sandbox to hand each job a pre-built client bound to its tenant.
+    """
+    global _google_instance, google
+    _google_instance = instance
+    google = instance if instance is not None else _google_proxy
+
 # Create a property-like accessor for backward compatibility
 class _GoogleProxy:
-    """Proxy class to provide lazy access to GoogleSDK instance"""
+    """Proxy class to provide lazy access to GoogleSDK instance (for names bound before it exists)"""
     def __getattr__(self, name):
         return getattr(get_google_instance(), name)
 
-google = _GoogleProxy()
+_google_proxy = _GoogleProxy()
+google = _google_proxy
 
 def get_mcp_instance():
     """Get or create the MCP singleton instance"""
     global mcp
     if mcp is None:
-        mcp = get_mcp()
+        mcp = __getattr__('get_mcp')()
     return mcp
@@ -0,0 +1,285 @@
+"""
+Result cache for idempotent MCP tool calls
+Keeps recent tool results in memory and in a small on-disk sqlite store so
+short-lived sandbox processes can reuse each other's results
+"""
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from . import codec
+
+# hashlib, sqlite3 and tempfile are imported on first use to keep SDK import cheap
+
+DEFAULT_MAX_ENTRIES = 1000
+DEFAULT_TTL = 60
+
+# Per-tool TTLs in seconds; tools not listed use the cache default TTL
+DEFAULT_TOOL_TTLS = {
+    "gmail_search": 60,
+    "gmail_list_messages": 60,
+    "gmail_get_message": 300,
+    "calendar_list_events": 60,
+    "calendar_get_event": 120,
+    "brave_web_search": 300,
+}
+
+# Tool name fragments that mark a call as a write; writes are never cached
+WRITE_TOOL_MARKERS = (
+    "create", "update", "delete", "remove", "send", "insert", "modify",
+    "patch", "move", "trash", "upload", "write", "set_", "add_",
+)
+
+
+def make_key(server_instance_id, tool_name, params, scope="mcp", auth_token=None):
+    """
+    Build the cache key for a call from its instance, credentials, tool and canonicalized arguments
+
+    `scope` separates clients that return differently shaped results for the same tool.
+    Lookups happen before any request is authorized, so the auth token is part
+    of the key: knowing a server instance id is not enough to read its results.
+    """
+    import hashlib
+    canonical = json.dumps(params or {}, sort_keys=True, separators=(",", ":"), default=str)
+    digest = hashlib.sha256(
+        f"{scope}\0{server_instance_id}\0{auth_token or ''}\0{tool_name}\0{canonical}".encode("utf-8")
+    )
+    return digest.hexdigest()
+
+
+def create_private_file(path):
+    """Create a file readable by its owner only (and tighten an existing one we own)"""
+    try:
+        os.close(os.open(path, os.O_CREAT | os.O_RDWR, 0o600))
+        if hasattr(os, "getuid") and os.stat(path).st_uid == os.getuid():
+            os.chmod(path, 0o600)
+    except OSError:
+        # Opening the file afterwards reports an unusable path
+        pass
+
+
+def is_write_tool(tool_name):
+    """Return True if the tool name looks like it changes state"""
+    name = tool_name.lower()
+    return any(marker in name for marker in WRITE_TOOL_MARKERS)
+
+
+class ResultCache:
+    """
+    TTL + LRU cache for MCP tool results
+
+    Entries live in an in-memory LRU and in a sqlite file shared between
+    sandbox processes. Write tools bypass the cache and invalidate the
+    entries of their server instance.
+
+    Usage:
+        from nexus_sdk.cache import ResultCache
+
+        mcp = MCP(cache=ResultCache(ttls={"brave_web_search": 600}))
+        mcp.call("brave_web_search", {"query": "Python"})
+        print(mcp.cache.stats())
+    """
+
+    def __init__(self, path=None, max_entries=None, default_ttl=None, ttls=None):
+        """
+        Initialize result cache
+
+        Args:
+            path: sqlite file path (defaults to NEXUS_CACHE_PATH or a file in the temp dir);
+                pass ":memory:" to keep the cache in-process only
+            max_entries: LRU size bound (defaults to NEXUS_CACHE_MAX_ENTRIES or 1000)
+            default_ttl: TTL in seconds for tools without a per-tool TTL
+                (defaults to NEXUS_CACHE_TTL or 60)
+            ttls: Per-tool TTL overrides in seconds; a TTL of 0 disables caching for that tool
+        """
+        import sqlite3
+        import tempfile
+        
+        self.path = path or os.environ.get(
+            "NEXUS_CACHE_PATH", os.path.join(tempfile.gettempdir(), "nexus_sdk_cache.sqlite3")
+        )
+        self.max_entries = max_entries or int(os.environ.get("NEXUS_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES))
+        self.default_ttl = default_ttl if default_ttl is not None else float(
+            os.environ.get("NEXUS_CACHE_TTL", DEFAULT_TTL)
+        )
+        self.ttls = dict(DEFAULT_TOOL_TTLS)
+        if ttls:
+            self.ttls.update(ttls)
+
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self._db_error = sqlite3.Error
+        try:
+            if self.path != ":memory:":
+                create_private_file(self.path)
+            self._db = sqlite3.connect(self.path, timeout=5, check_same_thread=False, isolation_level=None)
+            if self.path != ":memory:":
+                self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                " key TEXT PRIMARY KEY,"
+                " server_instance_id TEXT,"
+                " value TEXT NOT NULL,"
+                " expires_at REAL NOT NULL,"
+                " accessed_at REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed_at)")
+        except sqlite3.Error:
+            # An unusable disk store degrades to a memory-only cache
+            self._db = None
+
+    def ttl_for(self, tool_name):
+        """Return the TTL in seconds for a tool"""
+        return self.ttls.get(tool_name, self.default_ttl)
+
+    def is_cacheable(self, tool_name):
+        """Return True if results of this tool may be cached"""
+        return not is_write_tool(tool_name) and self.ttl_for(tool_name) > 0
+
+    def get(self, key):
+        """
+        Look up a cached result
+
+        Returns:
+            (hit, value) tuple
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                expires_at, encoded = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    # Entries are stored encoded so callers can't mutate the cached copy
+                    return True, codec.loads(encoded)
+                del self._memory[key]
+
+            if self._db is not None:
+                try:
+                    row = self._db.execute(
+                        "SELECT value, expires_at FROM results WHERE key = ?", (key,)
+                    ).fetchone()
+                    if row is not None and row[1] > now:
+                        self._db.execute("UPDATE results SET accessed_at = ? WHERE key = ?", (now, key))
+                        value = codec.loads(row[0])
+                        self._remember(key, row[1], row[0])
+                        self.hits += 1
+                        return True, value
+                except (self._db_error, ValueError):
+                    pass
+
+            self.misses += 1
+            return False, None
+
+    def set(self, key, tool_name, value, server_instance_id=None):
+        """Store a result for the tool's TTL"""
+        ttl = self.ttl_for(tool_name)
+        if ttl <= 0:
+            return
+        try:
+            encoded = codec.dumps(value)
+        except (TypeError, ValueError):
+            # Only JSON-serializable results are cached
+            return
+        now = time.time()
+        expires_at = now + ttl
+        with self._lock:
+            self._remember(key, expires_at, encoded)
+            if self._db is None:
+                return
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO results (key, server_instance_id, value, expires_at, accessed_at)"
+                    " VALUES (?, ?, ?, ?, ?)",
+                    (key, server_instance_id, encoded, expires_at, now),
+                )
+                self._evict(now)
+            except self._db_error:
+                pass
+
+    def record_bypass(self):
+        """Count a call that skipped the cache"""
+        with self._lock:
+            self.bypassed += 1
+
+    def invalidate(self, server_instance_id=None):
+        """Drop cached entries for a server instance, or everything if no instance is given"""
+        with self._lock:
+            self._memory.clear()
+            if self._db is None:
+                return
+            try:
+                if server_instance_id is None:
+                    self._db.execute("DELETE FROM results")
+                else:
+                    self._db.execute("DELETE FROM results WHERE server_instance_id = ?", (server_instance_id,))
+            except self._db_error:
+                pass
+
+    def clear(self):
+        """Drop every cached entry"""
+        self.invalidate()
+
+    def stats(self):
+        """Return hit/miss counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "bypassed": self.bypassed,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._memory),
+            }
+
+    def _remember(self, key, expires_at, encoded):
+        self._memory[key] = (expires_at, encoded)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _evict(self, now):
+        self._db.execute("DELETE FROM results WHERE expires_at <= ?", (now,))
+        self._db.execute(
+            "DELETE FROM results WHERE key IN ("
+            " SELECT key FROM results ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+
+_result_cache = None
+_result_cache_lock = threading.Lock()
+
+def get_result_cache():
+    """Get or create the shared ResultCache instance"""
+    global _result_cache
+    if _result_cache is None:
+        with _result_cache_lock:
+            if _result_cache is None:
+                _result_cache = ResultCache()
+    return _result_cache
+
+
+def resolve_cache(cache):
+    """
+    Resolve a client's cache argument
+
+    None follows the NEXUS_CACHE environment variable, True uses the shared
+    cache, False disables caching and a ResultCache instance is used as-is.
+    """
+    if cache is None:
+        cache = os.environ.get("NEXUS_CACHE", "").lower() in ("1", "true", "yes", "on")
+    if cache is True:
+        return get_result_cache()
+    if cache is False:
+        return None
+    return cache
@@ -0,0 +1,269 @@
+"""
+Local calendar event index for incremental Google Calendar sync
+Stores a compact copy of each calendar's events and its sync token in a
+small sqlite file, so scheduling scripts can query ranges and free/busy
+locally and only fetch what changed since the last sync
+"""
+
+import os
+import threading
+from collections import namedtuple
+from datetime import datetime, timezone
+
+from .cache import create_private_file
+
+# hashlib, sqlite3 and tempfile are imported on first use to keep SDK import cheap
+
+CalendarEvent = namedtuple(
+    "CalendarEvent",
+    ["id", "summary", "start", "end", "all_day", "status", "transparency", "location", "updated"],
+)
+CalendarEvent.__doc__ = """Compact indexed event; start and end are timezone-aware datetimes"""
+
+
+def parse_time(value):
+    """
+    Parse an ISO timestamp, date or Calendar API time object into an aware datetime
+
+    Dates ("2024-05-01" or {"date": ...}) are midnight UTC; naive
+    timestamps are taken as UTC.
+    """
+    if isinstance(value, dict):
+        value = value.get("dateTime") or value.get("date")
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        parsed = value
+    else:
+        text = str(value).strip()
+        if text.endswith("Z"):
+            text = text[:-1] + "+00:00"
+        parsed = datetime.fromisoformat(text)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+def index_scope(server_instance_id, auth_token=None):
+    """
+    Return the index key for a client's events: its server instance plus a hash of its auth token
+
+    Reads need no request, so the token has to be part of the key; a tenant
+    that only knows another tenant's instance id finds nothing. A rotated
+    token starts a new scope, whose first sync is a full sync.
+    """
+    if not auth_token:
+        return str(server_instance_id)
+    import hashlib
+    return f"{server_instance_id}:{hashlib.sha256(auth_token.encode('utf-8')).hexdigest()}"
+
+
+def _timestamp(value):
+    parsed = parse_time(value)
+    return parsed.timestamp() if parsed is not None else None
+
+
+def _from_timestamp(seconds):
+    return datetime.fromtimestamp(seconds, tz=timezone.utc)
+
+
+class CalendarIndex:
+    """
+    sqlite-backed event index and sync-token store
+
+    Events are keyed by (scope, calendar, event id), where the scope (the
+    "instance" argument) comes from index_scope(), so several tenants can
+    share one file. The file is created readable by its owner only.
+
+    Usage:
+        index = CalendarIndex()
+        index.apply("inst", "primary", changed_events, next_sync_token)
+        index.events_between("inst", "primary", "2024-05-01", "2024-05-08")
+    """
+
+    def __init__(self, path=None):
+        """
+        Initialize calendar index
+
+        Args:
+            path: sqlite file path (defaults to NEXUS_CALENDAR_INDEX_PATH or a file
+                in the temp dir); pass ":memory:" to keep the index in-process only
+        """
+        import sqlite3
+        import tempfile
+
+        self.path = path or os.environ.get(
+            "NEXUS_CALENDAR_INDEX_PATH", os.path.join(tempfile.gettempdir(), "nexus_calendar_index.sqlite3")
+        )
+        self._lock = threading.Lock()
+        if self.path != ":memory:":
+            create_private_file(self.path)
+        self._db = sqlite3.connect(self.path, timeout=5, check_same_thread=False, isolation_level=None)
+        if self.path != ":memory:":
+            self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS calendars ("
+            " instance TEXT NOT NULL,"
+            " calendar_id TEXT NOT NULL,"
+            " sync_token TEXT,"
+            " synced_at REAL,"
+            " PRIMARY KEY (instance, calendar_id))"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS events ("
+            " instance TEXT NOT NULL,"
+            " calendar_id TEXT NOT NULL,"
+            " event_id TEXT NOT NULL,"
+            " summary TEXT,"
+            " start_ts REAL,"
+            " end_ts REAL,"
+            " all_day INTEGER NOT NULL DEFAULT 0,"
+            " status TEXT,"
+            " transparency TEXT,"
+            " location TEXT,"
+            " updated TEXT,"
+            " PRIMARY KEY (instance, calendar_id, event_id))"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS events_start ON events (instance, calendar_id, start_ts)")
+
+    def sync_token(self, instance, calendar_id):
+        """Return the stored sync token, or None if the calendar was never synced"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT sync_token FROM calendars WHERE instance = ? AND calendar_id = ?", (instance, calendar_id)
+            ).fetchone()
+        return row[0] if row else None
+
+    def apply(self, instance, calendar_id, events, sync_token, full=False):
+        """
+        Apply a sync response to the index in one transaction
+
+        Args:
+            instance: Index scope (see index_scope)
+            calendar_id: Calendar id
+            events: Changed events as returned by the Calendar API; cancelled
+                events are removed from the index
+            sync_token: The nextSyncToken to store
+            full: True for a full sync, which replaces the calendar's events
+
+        Returns:
+            Dict with "updated" and "deleted" counts
+        """
+        upserts, deletes = [], []
+        for event in events:
+            if not isinstance(event, dict) or not event.get("id"):
+                continue
+            if event.get("status") == "cancelled":
+                deletes.append((instance, calendar_id, event["id"]))
+                continue
+            start, end = event.get("start") or {}, event.get("end") or {}
+            upserts.append((
+                instance, calendar_id, event["id"], event.get("summary"),
+                _timestamp(start), _timestamp(end), 1 if isinstance(start, dict) and "date" in start else 0,
+                event.get("status"), event.get("transparency", "opaque"), event.get("location"),
+                event.get("updated"),
+            ))
+
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                if full:
+                    self._db.execute(
+                        "DELETE FROM events WHERE instance = ? AND calendar_id = ?", (instance, calendar_id)
+                    )
+                self._db.executemany(
+                    "DELETE FROM events WHERE instance = ? AND calendar_id = ? AND event_id = ?", deletes
+                )
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO events (instance, calendar_id, event_id, summary, start_ts, end_ts,"
+                    " all_day, status, transparency, location, updated) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    upserts,
+                )
+                self._db.execute(
+                    "INSERT OR REPLACE INTO calendars (instance, calendar_id, sync_token, synced_at)"
+                    " VALUES (?, ?, ?, strftime('%s', 'now'))",
+                    (instance, calendar_id, sync_token),
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return {"updated": len(upserts), "deleted": len(deletes)}
+
+    def reset(self, instance, calendar_id):
+        """Forget a calendar's events and sync token (the next sync is a full sync)"""
+        with self._lock:
+            self._db.execute("DELETE FROM events WHERE instance = ? AND calendar_id = ?", (instance, calendar_id))
+            self._db.execute("DELETE FROM calendars WHERE instance = ? AND calendar_id = ?", (instance, calendar_id))
+
+    def events_between(self, instance, calendar_id, time_min, time_max):
+        """
+        Return indexed events overlapping [time_min, time_max), ordered by start
+
+        Args:
+            time_min: Range start (datetime, ISO string or date string)
+            time_max: Range end
+
+        Returns:
+            List of CalendarEvent records
+        """
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT event_id, summary, start_ts, end_ts, all_day, status, transparency, location, updated"
+                " FROM events WHERE instance = ? AND calendar_id = ? AND start_ts < ? AND end_ts > ?"
+                " ORDER BY start_ts",
+                (instance, calendar_id, _timestamp(time_max), _timestamp(time_min)),
+            ).fetchall()
+        return [
+            CalendarEvent(row[0], row[1], _from_timestamp(row[2]), _from_timestamp(row[3]), bool(row[4]),
+                          row[5], row[6], row[7], row[8])
+            for row in rows
+        ]
+
+    def free_busy(self, instance, calendar_id, time_min, time_max):
+        """
+        Compute busy and free intervals in [time_min, time_max) from the index
+
+        Transparent ("show as available") events don't count as busy.
+
+        Returns:
+            Dict with "busy" and "free" lists of (start, end) ISO string pairs
+        """
+        range_start, range_end = _timestamp(time_min), _timestamp(time_max)
+        busy = []
+        for event in self.events_between(instance, calendar_id, time_min, time_max):
+            if event.transparency == "transparent":
+                continue
+            start = max(event.start.timestamp(), range_start)
+            end = min(event.end.timestamp(), range_end)
+            if busy and start <= busy[-1][1]:
+                busy[-1][1] = max(busy[-1][1], end)
+            else:
+                busy.append([start, end])
+
+        free, cursor = [], range_start
+        for start, end in busy:
+            if start > cursor:
+                free.append((cursor, start))
+            cursor = max(cursor, end)
+        if cursor < range_end:
+            free.append((cursor, range_end))
+
+        def iso(intervals):
+            return [(_from_timestamp(start).isoformat(), _from_timestamp(end).isoformat()) for start, end in intervals]
+
+        return {"busy": iso(busy), "free": iso(free)}
+
+
+_calendar_index = None
+_calendar_index_lock = threading.Lock()
+
+def get_calendar_index():
+    """Get or create the shared CalendarIndex instance"""
+    global _calendar_index
+    if _calendar_index is None:
+        with _calendar_index_lock:
+            if _calendar_index is None:
+                _calendar_index = CalendarIndex()
+    return _calendar_index
+
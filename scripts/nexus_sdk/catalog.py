@@ -0,0 +1,534 @@
+"""
+Tool catalog for MCP clients
+Fetches a server instance's tools/list once, keeps it in memory and on disk
+for a TTL, validates call arguments against the tools' input schemas before
+any network I/O and exposes the tools as bound methods (mcp.tools.<name>(...))
+"""
+
+import hashlib
+import keyword
+import os
+import threading
+import time
+
+from . import codec
+from .cache import create_private_file
+from .errors import MCPCallError, MCPValidationError
+
+DEFAULT_CATALOG_TTL = 3600
+
+# A call to a tool missing from a catalog at least this old (seconds)
+# refetches the catalog once before failing
+UNKNOWN_TOOL_REFRESH_AGE = 60
+
+# How long a missing catalog file is remembered before the disk is checked again
+MISSING_RECHECK_INTERVAL = 30
+
+# Validation modes (NEXUS_TOOL_VALIDATION): "cached" validates against a catalog
+# already in memory or on disk, "fetch" also fetches a missing catalog first,
+# "off" disables validation
+VALIDATION_MODES = ("cached", "fetch", "off")
+
+_JSON_TYPES = {
+    "object": (dict,),
+    "array": (list, tuple),
+    "string": (str,),
+    "number": (int, float),
+    "integer": (int,),
+    "boolean": (bool,),
+    "null": (type(None),),
+}
+
+
+def _type_check(type_name):
+    types = _JSON_TYPES.get(type_name)
+    if types is None:
+        return lambda value: True
+    if type_name in ("number", "integer"):
+        # bool is an int subclass but not a JSON number
+        if type_name == "integer":
+            return lambda value: (isinstance(value, int) and not isinstance(value, bool)) or (
+                isinstance(value, float) and value.is_integer()
+            )
+        return lambda value: isinstance(value, types) and not isinstance(value, bool)
+    return lambda value: isinstance(value, types)
+
+
+def compile_schema(schema, root=None):
+    """
+    Compile a JSON Schema into a validator function
+
+    Supports the keywords MCP tool schemas use: type, enum, const,
+    properties, required, additionalProperties, items, min/maxItems,
+    min/maxLength, pattern, minimum/maximum (and the exclusive forms),
+    anyOf, oneOf, allOf, not and local $ref. Other keywords are ignored.
+
+    Returns:
+        validate(value, path="$") returning a list of error strings (empty when valid)
+    """
+    if root is None:
+        root = schema
+    if schema is False:
+        return lambda value, path="$": [f"{path}: no value is allowed"]
+    if not isinstance(schema, dict):
+        return lambda value, path="$": []
+
+    checks = []
+
+    if "$ref" in schema:
+        ref = schema["$ref"]
+        resolved = {}
+
+        def check_ref(value, path):
+            # Resolved on first use, so recursive schemas don't recurse at compile time
+            if "validate" not in resolved:
+                target = _resolve_ref(root, ref)
+                resolved["validate"] = compile_schema(target, root) if target is not None else (lambda v, p: [])
+            return resolved["validate"](value, path)
+        checks.append(check_ref)
+
+    type_names = schema.get("type")
+    if type_names is not None:
+        if isinstance(type_names, str):
+            type_names = [type_names]
+        type_checks = [_type_check(name) for name in type_names]
+        expected = " or ".join(type_names)
+
+        def check_type(value, path):
+            if not any(check(value) for check in type_checks):
+                return [f"{path}: expected {expected}, got {_json_type_name(value)}"]
+            return []
+        checks.append(check_type)
+
+    if "enum" in schema:
+        allowed = schema["enum"]
+
+        def check_enum(value, path):
+            if value not in allowed:
+                return [f"{path}: {value!r} is not one of {allowed!r}"]
+            return []
+        checks.append(check_enum)
+
+    if "const" in schema:
+        const = schema["const"]
+        checks.append(lambda value, path: [] if value == const else [f"{path}: expected {const!r}"])
+
+    properties = {
+        name: compile_schema(subschema, root) for name, subschema in (schema.get("properties") or {}).items()
+    }
+    required = list(schema.get("required") or [])
+    additional = schema.get("additionalProperties", True)
+    additional_check = None if additional is True else compile_schema(additional, root)
+    if properties or required or additional_check is not None:
+        def check_object(value, path):
+            if not isinstance(value, dict):
+                return []
+            errors = [f"{path}: missing required property {name!r}" for name in required if name not in value]
+            for name, item in value.items():
+                child = f"{path}.{name}"
+                if name in properties:
+                    errors.extend(properties[name](item, child))
+                elif additional is False:
+                    errors.append(f"{child}: unexpected property")
+                elif additional_check is not None:
+                    errors.extend(additional_check(item, child))
+            return errors
+        checks.append(check_object)
+
+    if isinstance(schema.get("items"), dict):
+        item_check = compile_schema(schema["items"], root)
+
+        def check_items(value, path):
+            if not isinstance(value, (list, tuple)):
+                return []
+            errors = []
+            for index, item in enumerate(value):
+                errors.extend(item_check(item, f"{path}[{index}]"))
+            return errors
+        checks.append(check_items)
+
+    for keyword_name, kinds, compare, message in (
+        ("minItems", (list, tuple), lambda n, bound: n >= bound, "at least {} items"),
+        ("maxItems", (list, tuple), lambda n, bound: n <= bound, "at most {} items"),
+        ("minLength", (str,), lambda n, bound: n >= bound, "at least {} characters"),
+        ("maxLength", (str,), lambda n, bound: n <= bound, "at most {} characters"),
+    ):
+        if keyword_name in schema:
+            checks.append(_size_check(schema[keyword_name], kinds, compare, message))
+
+    for keyword_name, compare, message in (
+        ("minimum", lambda value, bound: value >= bound, ">= {}"),
+        ("maximum", lambda value, bound: value <= bound, "<= {}"),
+        ("exclusiveMinimum", lambda value, bound: value > bound, "> {}"),
+        ("exclusiveMaximum", lambda value, bound: value < bound, "< {}"),
+    ):
+        bound = schema.get(keyword_name)
+        # Draft 4 used booleans for the exclusive forms; those are ignored
+        if isinstance(bound, (int, float)) and not isinstance(bound, bool):
+            checks.append(_bound_check(bound, compare, message))
+
+    if isinstance(schema.get("pattern"), str):
+        import re
+        try:
+            pattern = re.compile(schema["pattern"])
+        except re.error:
+            # Schema patterns are ECMA-262 regexes (e.g. \p{L}); ones Python can't compile go unchecked
+            pattern = None
+
+        def check_pattern(value, path):
+            if isinstance(value, str) and not pattern.search(value):
+                return [f"{path}: {value!r} does not match {pattern.pattern!r}"]
+            return []
+        if pattern is not None:
+            checks.append(check_pattern)
+
+    for combinator in ("anyOf", "oneOf", "allOf"):
+        if isinstance(schema.get(combinator), list):
+            checks.append(_combinator_check(combinator, [compile_schema(s, root) for s in schema[combinator]]))
+
+    if "not" in schema:
+        negated = compile_schema(schema["not"], root)
+        checks.append(lambda value, path: [f"{path}: must not match schema"] if not negated(value, path) else [])
+
+    def validate(value, path="$"):
+        errors = []
+        for check in checks:
+            errors.extend(check(value, path))
+        return errors
+
+    return validate
+
+
+def _size_check(bound, kinds, compare, message):
+    def check(value, path):
+        if isinstance(value, kinds) and not compare(len(value), bound):
+            return [f"{path}: expected {message.format(bound)}"]
+        return []
+    return check
+
+
+def _bound_check(bound, compare, message):
+    def check(value, path):
+        if isinstance(value, (int, float)) and not isinstance(value, bool) and not compare(value, bound):
+            return [f"{path}: expected {message.format(bound)}, got {value!r}"]
+        return []
+    return check
+
+
+def _combinator_check(combinator, validators):
+    def check(value, path):
+        results = [validator(value, path) for validator in validators]
+        matched = sum(1 for errors in results if not errors)
+        if combinator == "allOf":
+            return [error for errors in results for error in errors]
+        if combinator == "anyOf" and matched == 0:
+            return [f"{path}: does not match any allowed schema"]
+        if combinator == "oneOf" and matched != 1:
+            return [f"{path}: must match exactly one schema, matched {matched}"]
+        return []
+    return check
+
+
+def _resolve_ref(root, ref):
+    if not ref.startswith("#"):
+        return None
+    target = root
+    for part in ref.lstrip("#").split("/"):
+        if not part:
+            continue
+        part = part.replace("~1", "/").replace("~0", "~")
+        if not isinstance(target, dict) or part not in target:
+            return None
+        target = target[part]
+    return target
+
+
+def _json_type_name(value):
+    if value is None:
+        return "null"
+    if isinstance(value, bool):
+        return "boolean"
+    if isinstance(value, int):
+        return "integer"
+    if isinstance(value, float):
+        return "number"
+    if isinstance(value, str):
+        return "string"
+    if isinstance(value, (list, tuple)):
+        return "array"
+    if isinstance(value, dict):
+        return "object"
+    return type(value).__name__
+
+
+def _attribute_name(tool_name):
+    """Turn a tool name into an attribute name ("web-search" -> "web_search")"""
+    name = "".join(c if c.isalnum() or c == "_" else "_" for c in tool_name)
+    if not name or name[0].isdigit():
+        name = "t_" + name
+    return name + "_" if keyword.iskeyword(name) else name
+
+
+class _Catalog:
+    """One server instance's tools with their compiled validators"""
+
+    def __init__(self, tools, fetched_at):
+        self.tools = [tool for tool in tools if isinstance(tool, dict) and tool.get("name")]
+        self.fetched_at = fetched_at
+        self.by_name = {tool["name"]: tool for tool in self.tools}
+        self.by_attribute = {_attribute_name(name): name for name in self.by_name}
+        self._validators = {}
+
+    def validator(self, tool_name):
+        # Compiled on first use; most scripts touch a handful of tools
+        validate = self._validators.get(tool_name)
+        if validate is None:
+            schema = self.by_name[tool_name].get("inputSchema") or self.by_name[tool_name].get("input_schema")
+            validate = self._validators[tool_name] = compile_schema(schema or {})
+        return validate
+
+
+class ToolCatalogStore:
+    """
+    Process-wide catalog store, keyed by (base URL, server instance, auth token hash)
+
+    Catalogs live in memory and as JSON files in a private (0700) directory
+    shared between sandbox processes; both expire after `ttl` seconds. The
+    token hash keeps one tenant from reading or replacing the schemas
+    another tenant's calls are validated against.
+    """
+
+    def __init__(self, directory=None, ttl=None):
+        """
+        Initialize catalog store
+
+        Args:
+            directory: Directory for persisted catalogs (defaults to NEXUS_TOOL_CATALOG_DIR
+                or a directory in the temp dir)
+            ttl: Seconds a catalog stays fresh (defaults to NEXUS_TOOL_CATALOG_TTL or 3600)
+        """
+        import tempfile
+
+        self.directory = directory or os.environ.get(
+            "NEXUS_TOOL_CATALOG_DIR", os.path.join(tempfile.gettempdir(), "nexus_tool_catalog")
+        )
+        self.ttl = ttl if ttl is not None else float(os.environ.get("NEXUS_TOOL_CATALOG_TTL", DEFAULT_CATALOG_TTL))
+        self._catalogs = {}
+        # key -> when the disk was last found to have no fresh catalog for it
+        self._missing = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the fresh catalog for key from memory or disk, or None"""
+        now = time.time()
+        with self._lock:
+            catalog = self._catalogs.get(key)
+            if catalog is not None and now - catalog.fetched_at < self.ttl:
+                return catalog
+            # Calls check for a catalog every time; don't hit the disk for each one
+            if now - self._missing.get(key, float("-inf")) < MISSING_RECHECK_INTERVAL:
+                return None
+        catalog = self._load(key)
+        with self._lock:
+            if catalog is not None:
+                self._catalogs[key] = catalog
+                self._missing.pop(key, None)
+            else:
+                self._missing[key] = now
+        return catalog
+
+    def put(self, key, tools):
+        """Store freshly fetched tools for key and return the catalog"""
+        catalog = _Catalog(tools, time.time())
+        with self._lock:
+            self._catalogs[key] = catalog
+            self._missing.pop(key, None)
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            self._make_directory()
+            create_private_file(tmp_path)
+            with open(tmp_path, "wb") as f:
+                f.write(codec.dumpb({"fetched_at": catalog.fetched_at, "tools": catalog.tools}))
+            os.replace(tmp_path, path)
+        except (OSError, TypeError, ValueError):
+            # Persisting is best effort; the in-memory catalog still works
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+        return catalog
+
+    def clear(self):
+        """Forget in-memory catalogs (persisted ones expire by TTL)"""
+        with self._lock:
+            self._catalogs.clear()
+            self._missing.clear()
+
+    def _make_directory(self):
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        if hasattr(os, "getuid") and os.stat(self.directory).st_uid == os.getuid():
+            os.chmod(self.directory, 0o700)
+
+    def _path(self, key):
+        digest = hashlib.sha256("\0".join(key).encode("utf-8")).hexdigest()[:32]
+        return os.path.join(self.directory, f"{digest}.json")
+
+    def _load(self, key):
+        try:
+            with open(self._path(key), "rb") as f:
+                data = codec.loads(f.read())
+            fetched_at = float(data["fetched_at"])
+            tools = data["tools"]
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        if time.time() - fetched_at >= self.ttl or not isinstance(tools, list):
+            return None
+        return _Catalog(tools, fetched_at)
+
+
+class ToolCatalog:
+    """
+    Tool catalog of one MCP client
+
+    Calling it returns the tool list (fetched with tools/list on first use);
+    attributes are bound methods that call the tool with keyword arguments.
+
+    Usage:
+        for tool in mcp.tools():
+            print(tool["name"], tool.get("description"))
+
+        results = mcp.tools.brave_web_search(query="Python tutorials")
+    """
+
+    def __init__(self, client):
+        self._client = client
+
+    def __call__(self, refresh=False):
+        """
+        Return the tools of the client's server instance
+
+        Args:
+            refresh: Fetch tools/list even if a fresh catalog is cached
+
+        Returns:
+            List of tool dicts (name, description, inputSchema)
+        """
+        return list(self._catalog(fetch=True, refresh=refresh).tools)
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        catalog = self._catalog(fetch=True)
+        tool_name = name if name in catalog.by_name else catalog.by_attribute.get(name)
+        if tool_name is None:
+            raise AttributeError(f"Server instance has no tool {name!r}{_suggestion(name, catalog)}")
+        return self._bind(catalog.by_name[tool_name])
+
+    def __dir__(self):
+        catalog = self._catalog(fetch=False)
+        return sorted(catalog.by_attribute) if catalog is not None else []
+
+    def __contains__(self, tool_name):
+        return tool_name in self._catalog(fetch=True).by_name
+
+    def validate(self, tool_name, params, fetch=False):
+        """
+        Check a call against the catalog without any network I/O (unless fetch is set)
+
+        Does nothing when no catalog is available.
+
+        Raises:
+            MCPValidationError: If the tool is unknown or the arguments don't match its schema
+        """
+        try:
+            catalog = self._catalog(fetch=fetch)
+            if catalog is not None and tool_name not in catalog.by_name:
+                # The server may have gained the tool since the catalog was fetched
+                if time.time() - catalog.fetched_at >= UNKNOWN_TOOL_REFRESH_AGE:
+                    catalog = self._catalog(fetch=True, refresh=True)
+        except MCPCallError:
+            # Without a catalog the call goes ahead unchecked and the server decides
+            return
+        if catalog is None:
+            return
+        if tool_name not in catalog.by_name:
+            raise MCPValidationError(
+                f"Unknown tool {tool_name!r}{_suggestion(tool_name, catalog)}", tool_name, []
+            )
+        errors = catalog.validator(tool_name)(params if params is not None else {})
+        if errors:
+            raise MCPValidationError(
+                f"Invalid arguments for {tool_name}: " + "; ".join(errors[:5])
+                + (f" (and {len(errors) - 5} more)" if len(errors) > 5 else ""),
+                tool_name,
+                errors,
+            )
+
+    def _key(self):
+        # Same scoping as cached results: catalogs are never shared between auth tokens
+        token = getattr(self._client, "auth_token", None) or ""
+        token_hash = hashlib.sha256(token.encode("utf-8")).hexdigest() if token else ""
+        return (self._client.base_url, self._client.server_instance_id, token_hash)
+
+    def _catalog(self, fetch, refresh=False):
+        store = get_tool_catalog_store()
+        key = self._key()
+        catalog = None if refresh else store.get(key)
+        if catalog is None and fetch:
+            catalog = store.put(key, self._client._list_tools())
+        return catalog
+
+    def _bind(self, tool):
+        client = self._client
+        tool_name = tool["name"]
+
+        def call_tool(**arguments):
+            return client.call(tool_name, arguments)
+
+        call_tool.__name__ = _attribute_name(tool_name)
+        call_tool.__qualname__ = f"tools.{call_tool.__name__}"
+        call_tool.__doc__ = _tool_doc(tool)
+        return call_tool
+
+
+def _suggestion(name, catalog):
+    import difflib
+    matches = difflib.get_close_matches(name, list(catalog.by_name) + list(catalog.by_attribute), n=1)
+    return f"; did you mean {matches[0]!r}?" if matches else ""
+
+
+def _tool_doc(tool):
+    lines = [tool.get("description") or tool["name"]]
+    schema = tool.get("inputSchema") or tool.get("input_schema") or {}
+    properties = schema.get("properties") or {}
+    if properties:
+        required = set(schema.get("required") or [])
+        lines.append("")
+        lines.append("Args:")
+        for name, prop in properties.items():
+            prop = prop if isinstance(prop, dict) else {}
+            kind = prop.get("type", "any")
+            flag = "" if name in required else ", optional"
+            description = prop.get("description", "")
+            lines.append(f"    {name} ({kind}{flag}): {description}".rstrip(": "))
+    return "\n".join(lines)
+
+
+def validation_mode():
+    """Current NEXUS_TOOL_VALIDATION mode ("cached" by default)"""
+    mode = os.environ.get("NEXUS_TOOL_VALIDATION", "cached").lower()
+    return mode if mode in VALIDATION_MODES else "cached"
+
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_tool_catalog_store():
+    """Get or create the shared ToolCatalogStore"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ToolCatalogStore()
+    return _store
@@ -0,0 +1,161 @@
+"""
+JSON codec for Project Nexus SDK clients and the Python sandbox
+Uses orjson or msgspec when installed and the standard library json module
+otherwise; NEXUS_JSON_CODEC=orjson|msgspec|json forces a backend
+"""
+
+import json
+import os
+
+BACKENDS = ("orjson", "msgspec", "json")
+
+# Bound on first use so importing the codec never imports a backend
+_backend = None
+_dumpb = None
+_loads = None
+
+
+def _stdlib_dumpb(obj):
+    return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+
+def _stdlib_loads(data):
+    if isinstance(data, memoryview):
+        data = data.tobytes()
+    return json.loads(data)
+
+
+def _load_backend():
+    """Bind the fastest available backend (or the one NEXUS_JSON_CODEC names)"""
+    global _backend, _dumpb, _loads
+    requested = os.environ.get("NEXUS_JSON_CODEC", "").strip().lower()
+    candidates = (requested,) if requested in BACKENDS else BACKENDS
+
+    for name in candidates:
+        if name == "orjson":
+            try:
+                import orjson
+            except ImportError:
+                continue
+            option = orjson.OPT_NON_STR_KEYS
+
+            def dumpb(obj, _dumps=orjson.dumps, _option=option):
+                return _dumps(obj, option=_option)
+
+            _backend, _dumpb, _loads = name, dumpb, orjson.loads
+            return
+        if name == "msgspec":
+            try:
+                import msgspec
+            except ImportError:
+                continue
+            encoder = msgspec.json.Encoder()
+            decoder = msgspec.json.Decoder()
+
+            def loads(data, _decode=decoder.decode, _error=msgspec.DecodeError):
+                try:
+                    return _decode(data)
+                except _error as e:
+                    # Match json/orjson, whose decode errors are ValueErrors
+                    raise ValueError(str(e)) from None
+
+            _backend, _dumpb, _loads = name, encoder.encode, loads
+            return
+
+    _backend, _dumpb, _loads = "json", _stdlib_dumpb, _stdlib_loads
+
+
+def backend():
+    """Return the name of the active backend ("orjson", "msgspec" or "json")"""
+    if _backend is None:
+        _load_backend()
+    return _backend
+
+
+def dumpb(obj):
+    """
+    Encode a value as compact UTF-8 JSON bytes
+
+    Raises:
+        TypeError: If the value is not JSON-serializable
+    """
+    if _dumpb is None:
+        _load_backend()
+    try:
+        return _dumpb(obj)
+    except (TypeError, ValueError, OverflowError):
+        if _backend == "json":
+            raise
+        # Fast backends reject a few values the stdlib accepts (e.g. ints over 64 bits)
+        return _stdlib_dumpb(obj)
+
+
+def dumps(obj):
+    """Encode a value as a JSON string"""
+    return dumpb(obj).decode("utf-8")
+
+
+def loads(data):
+    """
+    Decode JSON from bytes, bytearray, memoryview or str without an intermediate text copy
+
+    Raises:
+        ValueError: If the data is not valid JSON
+    """
+    if _loads is None:
+        _load_backend()
+    return _loads(data)
+
+
+def try_dumpb(obj):
+    """
+    Encode a value, or return None if it is not JSON-serializable
+
+    Serializability is checked by the same pass that produces the encoding.
+    """
+    try:
+        return dumpb(obj)
+    except (TypeError, ValueError, OverflowError, RecursionError):
+        return None
+
+
+class Encoded:
+    """
+    A value that has already been encoded to JSON
+
+    dumpb_object() splices it into the enclosing object instead of encoding
+    the value a second time.
+    """
+
+    __slots__ = ("data",)
+
+    def __init__(self, data):
+        self.data = data
+
+    def decode(self):
+        """Return the decoded value"""
+        return loads(self.data)
+
+    def __repr__(self):
+        return f"Encoded({self.data[:60]!r}{'...' if len(self.data) > 60 else ''})"
+
+
+def dumpb_object(mapping):
+    """
+    Encode a dict whose top-level values may be Encoded fragments
+
+    Usage:
+        result = {"stdout": "", "return_value": Encoded(try_dumpb(value))}
+        sys.stdout.buffer.write(dumpb_object(result) + b"\\n")
+    """
+    fragments = {key: value for key, value in mapping.items() if isinstance(value, Encoded)}
+    if not fragments:
+        return dumpb(mapping)
+    plain = {key: value for key, value in mapping.items() if key not in fragments}
+    parts = [dumpb(plain)[:-1]]
+    separator = b"," if plain else b""
+    for key, value in fragments.items():
+        parts.append(separator + dumpb(str(key)) + b":" + value.data)
+        separator = b","
+    parts.append(b"}")
+    return b"".join(parts)
@@ -0,0 +1,189 @@
+"""
+Concurrent fan-out helpers for Project Nexus sandbox scripts
+Run I/O-bound MCP calls side by side so a batch of calls takes roughly as
+long as the slowest call instead of the sum of all calls
+"""
+
+import time
+
+from .cache import is_write_tool, make_key
+from .metrics import record_coalesced
+from .singleflight import copy_result
+
+# asyncio and concurrent.futures are imported on first use to keep `import nexus_sdk` cheap
+
+DEFAULT_MAX_WORKERS = 8
+
+
+def parallel_map(fn, items, max_workers=DEFAULT_MAX_WORKERS, timeout=None, return_exceptions=False):
+    """
+    Apply fn to every item using a bounded thread pool
+
+    Args:
+        fn: Callable taking one item
+        items: Iterable of items
+        max_workers: Maximum number of calls running at once
+        timeout: Optional per-call timeout in seconds, measured from when the call starts
+        return_exceptions: If True, failed or timed-out calls are returned in place as
+            exception instances instead of raising the first failure
+
+    Returns:
+        List of results in the same order as `items`
+
+    Usage:
+        messages = nexus_sdk.parallel_map(google.gmail.get_message, ids, max_workers=8)
+
+    A timed-out call is abandoned, not interrupted: its thread finishes in the
+    background and its result is discarded.
+    """
+    from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+    items = list(items)
+    results = [None] * len(items)
+    if not items:
+        return results
+
+    started = {}
+
+    def run(index, item):
+        started[index] = time.monotonic()
+        return fn(item)
+
+    executor = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(items))))
+    try:
+        futures = {executor.submit(run, index, item): index for index, item in enumerate(items)}
+        pending = set(futures)
+        while pending:
+            wait_for = None
+            if timeout is not None:
+                now = time.monotonic()
+                for future in list(pending):
+                    index = futures[future]
+                    if index in started and not future.done() and now - started[index] >= timeout:
+                        results[index] = TimeoutError(f"Call for item {index} timed out after {timeout}s")
+                        pending.discard(future)
+                deadlines = [started[futures[f]] + timeout for f in pending if futures[f] in started]
+                wait_for = max(0.0, min(deadlines) - now) if deadlines else timeout
+            if not pending:
+                break
+
+            done, pending = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = futures[future]
+                try:
+                    results[index] = future.result()
+                except Exception as e:
+                    results[index] = e
+    finally:
+        for future in futures:
+            future.cancel()
+        executor.shutdown(wait=False)
+
+    if not return_exceptions:
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+    return results
+
+
+class AsyncMCP:
+    """
+    asyncio wrapper around an MCP client
+
+    Calls run on a bounded thread pool so many awaits can be in flight at once.
+    Identical idempotent calls awaited concurrently share one request instead
+    of each taking a pool thread.
+
+    Usage:
+        amcp = AsyncMCP(mcp, max_concurrency=8)
+
+        async def main():
+            return await amcp.acall_many([("gmail_get_message", {"message_id": i}) for i in ids])
+    """
+
+    def __init__(self, mcp=None, max_concurrency=DEFAULT_MAX_WORKERS, timeout=None):
+        """
+        Initialize AsyncMCP client
+
+        Args:
+            mcp: MCP client to wrap (defaults to the MCP singleton)
+            max_concurrency: Maximum number of calls running at once
+            timeout: Default per-call timeout in seconds
+        """
+        if mcp is None:
+            from . import get_mcp
+            mcp = get_mcp()
+        self.mcp = mcp
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self._executor = None
+        # flight key -> [future, number of awaiting callers]
+        self._in_flight = {}
+
+    async def acall(self, tool_name, params=None, timeout=None):
+        """
+        Call an MCP tool without blocking the event loop
+
+        Args:
+            tool_name: Name of the MCP tool to call
+            params: Tool parameters (dict)
+            timeout: Per-call timeout in seconds (defaults to the client timeout)
+
+        Returns:
+            Result from the tool call
+        """
+        import asyncio
+        if self._executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+            self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency)
+        loop = asyncio.get_running_loop()
+        timeout = timeout if timeout is not None else self.timeout
+        
+        if is_write_tool(tool_name):
+            future = loop.run_in_executor(self._executor, self.mcp.call, tool_name, params)
+            return await asyncio.wait_for(future, timeout)
+        
+        key = (loop, make_key(getattr(self.mcp, "server_instance_id", None), tool_name, params,
+                                auth_token=getattr(self.mcp, "auth_token", None)))
+        flight = self._in_flight.get(key)
+        if flight is None:
+            future = loop.run_in_executor(self._executor, self.mcp.call, tool_name, params)
+            flight = self._in_flight[key] = [future, 1]
+            future.add_done_callback(lambda _, key=key, flight=flight: self._end_flight(key, flight))
+        else:
+            flight[1] += 1
+            record_coalesced()
+        
+        # shield() keeps one caller's timeout or cancellation from cancelling the shared call
+        result = await asyncio.wait_for(asyncio.shield(flight[0]), timeout)
+        self._end_flight(key, flight)
+        return copy_result(result) if flight[1] > 1 else result
+    
+    def _end_flight(self, key, flight):
+        """Stop new callers from joining a finished call"""
+        if self._in_flight.get(key) is flight:
+            del self._in_flight[key]
+
+    async def acall_many(self, calls, timeout=None, return_exceptions=False):
+        """
+        Run several MCP calls concurrently
+
+        Args:
+            calls: Iterable of (tool_name, params) tuples
+            timeout: Per-call timeout in seconds
+            return_exceptions: If True, failures are returned in place instead of raised
+
+        Returns:
+            List of results in the same order as `calls`
+        """
+        import asyncio
+        return await asyncio.gather(
+            *(self.acall(tool_name, params, timeout) for tool_name, params in calls),
+            return_exceptions=return_exceptions,
+        )
+
+    def close(self):
+        """Shut down the worker threads"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
@@ -0,0 +1,104 @@
+"""
+Exceptions raised by Project Nexus SDK clients
+MCP failures are raised as typed subclasses of MCPCallError so scripts can
+tell timeouts, auth problems and upstream outages apart
+"""
+
+from .transport import TransportError
+
+# HTTP statuses worth retrying: the proxy or the upstream MCP server is
+# overloaded or restarting (503 is returned while a stdio transport recovers)
+RETRYABLE_STATUSES = (429, 502, 503, 504)
+
+
+class NexusAPIError(Exception):
+    """Base exception for Nexus API errors"""
+    pass
+
+
+class MCPCallError(NexusAPIError):
+    """
+    Exception raised when MCP call fails
+
+    Attributes:
+        status: HTTP status of the failed request, if one was received
+        retryable: True if repeating an idempotent call may succeed
+    """
+
+    def __init__(self, message, status=None, retryable=False):
+        super().__init__(message)
+        self.status = status
+        self.retryable = retryable
+
+
+class MCPTimeoutError(MCPCallError):
+    """The call timed out or the execution time budget ran out"""
+
+    def __init__(self, message, status=None, retryable=True):
+        super().__init__(message, status, retryable)
+
+
+class MCPAuthError(MCPCallError):
+    """The Nexus API rejected the credentials (HTTP 401/403)"""
+    pass
+
+
+class MCPUpstreamError(MCPCallError):
+    """The Nexus API or the MCP server behind it is unavailable or failing"""
+    pass
+
+
+class CircuitOpenError(MCPUpstreamError):
+    """The tool failed repeatedly and calls are being short-circuited"""
+    pass
+
+
+class MCPValidationError(MCPCallError):
+    """
+    The call was rejected locally: unknown tool or arguments that don't match its schema
+    
+    Attributes:
+        tool_name: The tool that was called
+        errors: Schema violations, one string per problem
+    """
+
+    def __init__(self, message, tool_name=None, errors=None):
+        super().__init__(message)
+        self.tool_name = tool_name
+        self.errors = list(errors or [])
+
+
+class MCPCancelledError(MCPCallError):
+    """The call was cancelled because the sandbox stopped the execution"""
+    pass
+
+
+def classify(error, prefix):
+    """
+    Convert a transport failure into a typed MCPCallError
+
+    Args:
+        error: Exception raised while calling the Nexus API
+        prefix: Message prefix, e.g. "Failed to call MCP tool"
+
+    Returns:
+        An MCPCallError subclass instance (MCPCallErrors are returned as-is)
+    """
+    if isinstance(error, MCPCallError):
+        return error
+    message = f"{prefix}: {error}"
+    if not isinstance(error, TransportError):
+        return MCPCallError(message)
+    status = error.status
+    if error.timeout:
+        return MCPTimeoutError(message)
+    if status in (401, 403):
+        return MCPAuthError(message, status)
+    if status is None:
+        # No response at all: connection refused or reset
+        return MCPUpstreamError(message, retryable=True)
+    if status in RETRYABLE_STATUSES:
+        return MCPUpstreamError(message, status, retryable=True)
+    if status >= 500:
+        return MCPUpstreamError(message, status)
+    return MCPCallError(message, status)
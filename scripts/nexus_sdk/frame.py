@@ -0,0 +1,682 @@
+"""
+Columnar tables for processing MCP results locally in the sandbox
+Frame turns tool results (Gmail messages, calendar events, search hits)
+into one column per field, so filters, sorts, group-bys and top-k run over
+flat arrays instead of loops over lists of dicts. Numeric columns are NumPy
+arrays when NumPy is installed (array.array otherwise); other columns are
+plain lists.
+"""
+
+import array
+import heapq
+import itertools
+import operator
+import os
+import re
+
+from . import codec
+
+# numpy is imported on first use (it is optional and slow to import)
+_numpy = None
+
+_INT64_MIN, _INT64_MAX = -(2 ** 63), 2 ** 63 - 1
+
+_COMPARISONS = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+}
+
+OPERATORS = tuple(_COMPARISONS) + ("in", "contains")
+
+AGGREGATIONS = ("count", "sum", "mean", "min", "max", "first", "last", "nunique", "list")
+
+# Dict fields that carry the item list of a tool result page
+_LIST_FIELDS = ("messages", "items", "results", "events", "files", "tools", "data")
+
+
+def numpy_module():
+    """Return numpy if it is installed and enabled (NEXUS_FRAME_NUMPY), else None"""
+    global _numpy
+    if _numpy is None:
+        _numpy = False
+        if os.environ.get("NEXUS_FRAME_NUMPY", "1").lower() not in ("0", "false", "no", "off"):
+            try:
+                import numpy
+            except ImportError:
+                pass
+            else:
+                _numpy = numpy
+    return _numpy or None
+
+
+def _is_ndarray(values):
+    np = numpy_module()
+    return np is not None and isinstance(values, np.ndarray)
+
+
+def _numeric_kind(values):
+    """Return "bool", "int" or "float" if every value is one, else None"""
+    if not values:
+        return None
+    kinds = set(map(type, values))
+    if kinds == {bool}:
+        return "bool"
+    if kinds == {int}:
+        return "int" if _INT64_MIN <= min(values) and max(values) <= _INT64_MAX else None
+    if kinds <= {int, float}:
+        return "float"
+    return None
+
+
+def _make_column(values):
+    """Store a column's values in the most compact representation available"""
+    if _is_ndarray(values) or isinstance(values, array.array):
+        return values
+    values = values if isinstance(values, list) else list(values)
+    kind = _numeric_kind(values)
+    if kind is None:
+        return values
+    np = numpy_module()
+    if np is not None:
+        return np.array(values, dtype={"bool": np.bool_, "int": np.int64, "float": np.float64}[kind])
+    if kind == "bool":
+        # array.array has no boolean type
+        return values
+    return array.array("q" if kind == "int" else "d", values)
+
+
+def _to_list(values):
+    """Column values as a list of plain Python objects"""
+    return values.tolist() if hasattr(values, "tolist") else values
+
+
+def _take(values, indices):
+    """Select rows of one column by position"""
+    if _is_ndarray(values):
+        return values[indices]
+    if isinstance(values, array.array):
+        return array.array(values.typecode, map(values.__getitem__, indices))
+    return list(map(values.__getitem__, indices))
+
+
+def _freeze(value):
+    """Hashable stand-in for a value (lists and dicts become tuples)"""
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted((str(key), _freeze(item)) for key, item in value.items()))
+    if isinstance(value, set):
+        return tuple(sorted(map(repr, value)))
+    return value
+
+
+def _text(value):
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (list, tuple)):
+        return " ".join(map(str, value))
+    return str(value)
+
+
+def _record_dict(record):
+    """Normalize one record (dict, namedtuple, MessageRecord) to a dict"""
+    if isinstance(record, dict):
+        return record
+    as_dict = getattr(record, "as_dict", None) or getattr(record, "_asdict", None)
+    if as_dict is not None:
+        return as_dict()
+    return {"value": record}
+
+
+def _getter(path):
+    """Return a function reading a field, a dotted path ("start.dateTime") or a callable from a record"""
+    if callable(path):
+        return path
+    parts = path.split(".")
+
+    def get(record):
+        if path in record:
+            return record[path]
+        value = record
+        for part in parts:
+            if isinstance(value, dict):
+                value = value.get(part)
+            elif isinstance(value, (list, tuple)) and part.isdigit() and int(part) < len(value):
+                value = value[int(part)]
+            else:
+                return None
+        return value
+    return get
+
+
+class Frame:
+    """
+    Immutable columnar table; every operation returns a new Frame
+
+    Usage:
+        messages = to_frame(google.gmail.get_messages(ids, fields=["id", "from", "subject", "sizeEstimate"]))
+        big = messages.where("sizeEstimate", ">", 100_000).sort("sizeEstimate", descending=True)
+        senders = messages.groupby("from").agg(count="count", total=("sizeEstimate", "sum"))
+        print(senders.topk("count", 5))
+    """
+
+    __slots__ = ("_columns", "_length")
+
+    def __init__(self, columns=None):
+        """
+        Initialize frame
+
+        Args:
+            columns: Mapping of column name -> sequence of values; all
+                columns must have the same length
+        """
+        self._columns = {}
+        self._length = None
+        for name, values in (columns or {}).items():
+            column = _make_column(values)
+            if self._length is None:
+                self._length = len(column)
+            elif len(column) != self._length:
+                raise ValueError(f"Column {name!r} has {len(column)} values, expected {self._length}")
+            self._columns[str(name)] = column
+        if self._length is None:
+            self._length = 0
+
+    @classmethod
+    def from_records(cls, records, columns=None):
+        """
+        Build a frame from a list of records
+
+        Args:
+            records: Dicts, namedtuples or SDK records (anything with as_dict/_asdict)
+            columns: Column names to keep (default: every key, in first-seen order),
+                or a mapping of column name -> field, dotted path or callable
+
+        Usage:
+            events = Frame.from_records(items, {"summary": "summary", "start": "start.dateTime"})
+        """
+        rows = [_record_dict(record) for record in records]
+        if columns is None:
+            columns = list(dict.fromkeys(key for row in rows for key in row))
+        if not isinstance(columns, dict):
+            columns = {name: name for name in columns}
+        return cls({name: list(map(_getter(path), rows)) for name, path in columns.items()})
+
+    @property
+    def columns(self):
+        """Column names, in order"""
+        return list(self._columns)
+
+    @property
+    def shape(self):
+        """(rows, columns)"""
+        return (self._length, len(self._columns))
+
+    def __len__(self):
+        return self._length
+
+    def __contains__(self, name):
+        return name in self._columns
+
+    def __getitem__(self, key):
+        """
+        frame["col"] -> the stored column (NumPy array, array.array or list);
+        frame[["a", "b"]] -> selected columns; frame[2:5] -> rows;
+        frame[mask] -> rows where mask is true
+        """
+        if isinstance(key, str):
+            return self._column(key)
+        if isinstance(key, slice):
+            return self.take(range(*key.indices(self._length)))
+        if isinstance(key, (list, tuple)) and key and all(isinstance(name, str) for name in key):
+            return self.select(*key)
+        return self.filter(key)
+
+    def __iter__(self):
+        return self.rows()
+
+    def __repr__(self):
+        return self.to_string()
+
+    def _column(self, name):
+        try:
+            return self._columns[name]
+        except KeyError:
+            raise KeyError(f"No column {name!r}; columns are {self.columns}") from None
+
+    def column(self, name):
+        """Return a column's values as a list of plain Python objects"""
+        return _to_list(self._column(name))
+
+    def rows(self):
+        """Iterate over rows as dicts"""
+        names = list(self._columns)
+        for values in zip(*(_to_list(column) for column in self._columns.values())):
+            yield dict(zip(names, values))
+
+    def to_records(self):
+        """Return the rows as a list of dicts (JSON-serializable if the values are)"""
+        return list(self.rows())
+
+    def to_dict(self):
+        """Return the table as a column name -> list of values dict"""
+        return {name: _to_list(column) for name, column in self._columns.items()}
+
+    def to_string(self, limit=10, width=30):
+        """Render up to `limit` rows as an aligned text table"""
+        head = self.head(limit)
+        cells = [list(self._columns)]
+        for row in head.rows():
+            cells.append([
+                (text if len(text) <= width else text[:width - 3] + "...")
+                for text in (str(value) for value in row.values())
+            ])
+        widths = [max(len(row[index]) for row in cells) for index in range(len(self._columns))]
+        lines = ["  ".join(cell.ljust(size) for cell, size in zip(row, widths)).rstrip() for row in cells]
+        if self._length > limit:
+            lines.append(f"... {self._length - limit} more rows")
+        lines.append(f"[{self._length} rows x {len(self._columns)} columns]")
+        return "\n".join(lines)
+
+    def take(self, indices):
+        """Return the rows at the given positions, in that order"""
+        if _is_ndarray(indices):
+            positions = indices.tolist()
+        else:
+            positions = indices if isinstance(indices, list) else list(indices)
+        np = numpy_module()
+        array_positions = np.asarray(positions, dtype=np.intp) if np is not None else None
+        frame = Frame.__new__(Frame)
+        frame._columns = {
+            name: _take(column, array_positions if _is_ndarray(column) else positions)
+            for name, column in self._columns.items()
+        }
+        frame._length = len(positions)
+        return frame
+
+    def head(self, n=5):
+        """Return the first n rows"""
+        return self.take(range(min(n, self._length)))
+
+    def select(self, *names):
+        """Return a frame with only the given columns"""
+        return Frame({name: self._column(name) for name in names})
+
+    def assign(self, **columns):
+        """
+        Return a frame with columns added or replaced
+
+        Values are sequences, or callables taking the frame and returning one.
+
+        Usage:
+            frame.assign(domain=lambda f: [sender.split("@")[-1] for sender in f.column("from")])
+        """
+        merged = dict(self._columns)
+        for name, values in columns.items():
+            merged[name] = values(self) if callable(values) else values
+        return Frame(merged)
+
+    def mask(self, column, op, value):
+        """
+        Return a boolean mask (NumPy array or list) of rows where `column op value` holds
+
+        Operators are ==, !=, <, <=, >, >=, "in" (value is a collection) and
+        "contains" (substring of a text value, or member of a list value).
+        Rows whose value can't be compared (None, other types) don't match.
+        """
+        values = self._column(column)
+        if op in _COMPARISONS:
+            compare = _COMPARISONS[op]
+            if _is_ndarray(values) and isinstance(value, (int, float)):
+                return compare(values, value)
+            if op in ("==", "!="):
+                return [bool(compare(item, value)) for item in values]
+
+            def test(item):
+                try:
+                    return item is not None and bool(compare(item, value))
+                except TypeError:
+                    return False
+            return [test(item) for item in values]
+        if op == "in":
+            choices = list(value)
+            if _is_ndarray(values):
+                return numpy_module().isin(values, choices)
+            try:
+                lookup = set(choices)
+            except TypeError:
+                lookup = choices
+            return [_freeze(item) in lookup if isinstance(item, (list, dict)) else item in lookup
+                    for item in values]
+        if op == "contains":
+            return [
+                (value in item) if isinstance(item, (str, list, tuple, set, dict)) else False
+                for item in values
+            ]
+        raise ValueError(f"Unknown operator {op!r}; expected one of {', '.join(OPERATORS)}")
+
+    def filter(self, predicate):
+        """
+        Return the rows where predicate holds
+
+        Args:
+            predicate: A boolean mask (sequence or NumPy array, one entry per
+                row) or a callable taking a row dict (slower)
+        """
+        if callable(predicate):
+            predicate = [bool(predicate(row)) for row in self.rows()]
+        if len(predicate) != self._length:
+            raise ValueError(f"Mask has {len(predicate)} entries, expected {self._length}")
+        if _is_ndarray(predicate):
+            return self.take(numpy_module().flatnonzero(predicate))
+        return self.take(list(itertools.compress(range(self._length), predicate)))
+
+    def where(self, column=None, op=None, value=None, **equals):
+        """
+        Return the rows matching a condition and/or column == value keywords
+
+        Usage:
+            frame.where("size", ">", 1024)
+            frame.where(status="confirmed", organizer="me@example.com")
+        """
+        frame = self
+        if column is not None:
+            frame = frame.filter(frame.mask(column, op, value))
+        for name, expected in equals.items():
+            frame = frame.filter(frame.mask(name, "==", expected))
+        return frame
+
+    def match(self, pattern, columns=None, regex=False, case=False):
+        """
+        Return the rows where any of `columns` contains pattern
+
+        Args:
+            pattern: Text to find (a regular expression if regex is set)
+            columns: Column name or names to search (default: every text column)
+            regex: Treat pattern as a regular expression
+            case: Match case-sensitively
+        """
+        search = re.compile(pattern if regex else re.escape(pattern), 0 if case else re.IGNORECASE).search
+        if columns is None:
+            names = [name for name, column in self._columns.items()
+                     if isinstance(column, list) and any(isinstance(item, str) for item in column[:100])]
+        else:
+            names = [columns] if isinstance(columns, str) else list(columns)
+        hits = [False] * self._length
+        for name in names:
+            hits = [
+                hit or (item is not None and search(_text(item)) is not None)
+                for hit, item in zip(hits, _to_list(self._column(name)))
+            ]
+        return self.filter(hits)
+
+    def sort(self, by, descending=False):
+        """
+        Return the rows sorted by one or more columns (stable; None sorts last)
+
+        Args:
+            by: Column name or list of names
+            descending: Bool, or one bool per column
+        """
+        names = [by] if isinstance(by, str) else list(by)
+        flags = [descending] * len(names) if isinstance(descending, bool) else list(descending)
+        if len(flags) != len(names):
+            raise ValueError("descending needs one flag per sort column")
+        order = list(range(self._length))
+        # Stable sorts from the last key to the first give a multi-key sort
+        for name, reverse in reversed(list(zip(names, flags))):
+            order = _sorted_order(self._column(name), order, reverse)
+        return self.take(order)
+
+    def topk(self, column, k, largest=True):
+        """Return the k rows with the largest (or smallest) values of column, in order"""
+        values = self._column(column)
+        k = max(0, min(k, self._length))
+        if _is_ndarray(values) and values.dtype.kind in "iuf":
+            np = numpy_module()
+            keys = -values.astype(np.float64) if largest else values
+            if k < self._length:
+                candidates = np.argpartition(keys, k - 1)[:k] if k else np.empty(0, dtype=np.intp)
+            else:
+                candidates = np.arange(self._length)
+            # Sort the k candidates by value, ties by position
+            candidates = np.sort(candidates)
+            return self.take(candidates[np.argsort(keys[candidates], kind="stable")])
+        values = _to_list(values)
+        candidates = [index for index, item in enumerate(values) if item is not None]
+        pick = heapq.nlargest if largest else heapq.nsmallest
+        return self.take(pick(k, candidates, key=values.__getitem__))
+
+    def dedupe(self, columns=None, keep="first"):
+        """
+        Return the frame without duplicate rows
+
+        Args:
+            columns: Column name or names that identify a row (default: all)
+            keep: "first" or "last" occurrence to keep; rows stay in order
+        """
+        if keep not in ("first", "last"):
+            raise ValueError('keep must be "first" or "last"')
+        names = list(self._columns) if columns is None else [columns] if isinstance(columns, str) else list(columns)
+        keys = _row_keys([_to_list(self._column(name)) for name in names], self._length)
+        positions = range(self._length) if keep == "first" else range(self._length - 1, -1, -1)
+        seen, kept = set(), []
+        for index in positions:
+            key = keys[index]
+            try:
+                if key in seen:
+                    continue
+            except TypeError:
+                key = _freeze(key)
+                if key in seen:
+                    continue
+            seen.add(key)
+            kept.append(index)
+        if keep == "last":
+            kept.reverse()
+        return self.take(kept)
+
+    def groupby(self, by):
+        """
+        Group rows by one or more columns
+
+        Usage:
+            frame.groupby("from").agg(count="count", latest=("date", "max"))
+        """
+        return GroupBy(self, [by] if isinstance(by, str) else list(by))
+
+
+def _sorted_order(values, order, reverse):
+    """Stable-sort row positions by one column"""
+    if _is_ndarray(values) and values.dtype.kind in "biuf":
+        np = numpy_module()
+        keys = values[order]
+        if keys.dtype.kind in "bu":
+            keys = keys.astype(np.int64)
+        perm = np.argsort(-keys if reverse else keys, kind="stable")
+        return np.asarray(order, dtype=np.intp)[perm].tolist()
+    values = _to_list(values)
+    # None sorts last in both directions
+    if reverse:
+        def key(index):
+            return (values[index] is not None, values[index])
+    else:
+        def key(index):
+            return (values[index] is None, values[index])
+    try:
+        return sorted(order, key=key, reverse=reverse)
+    except TypeError:
+        # Mixed types: fall back to comparing text
+        def text_key(index):
+            item = values[index]
+            return ((item is not None) == reverse, "" if item is None else _text(item))
+        return sorted(order, key=text_key, reverse=reverse)
+
+
+def _row_keys(columns, length):
+    """One key per row: the value itself for a single column, else a tuple"""
+    if not columns:
+        return [()] * length
+    if len(columns) == 1:
+        return columns[0]
+    return list(zip(*columns))
+
+
+class GroupBy:
+    """Rows of a Frame grouped by key columns, in order of each key's first appearance"""
+
+    def __init__(self, frame, by):
+        self._frame = frame
+        self._by = by
+        self._codes = []
+        groups = {}
+        for key in _row_keys([frame.column(name) for name in by], len(frame)):
+            try:
+                code = groups.setdefault(key, len(groups))
+            except TypeError:
+                code = groups.setdefault(_freeze(key), len(groups))
+            self._codes.append(code)
+        self._keys = list(groups)
+        self._members = None
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __iter__(self):
+        """Iterate over (key, sub-frame) pairs"""
+        for key, members in zip(self._keys, self._group_members()):
+            yield key, self._frame.take(members)
+
+    def _group_members(self):
+        if self._members is None:
+            members = [[] for _ in self._keys]
+            for index, code in enumerate(self._codes):
+                members[code].append(index)
+            self._members = members
+        return self._members
+
+    def size(self):
+        """Return a frame of the group keys with a "count" column"""
+        return self.agg(count="count")
+
+    def agg(self, **aggregations):
+        """
+        Aggregate each group into one row
+
+        Args:
+            **aggregations: Output column -> "count" (rows per group), or a
+                (column, function) pair where function is one of count, sum,
+                mean, min, max, first, last, nunique, list, or a callable
+                taking the group's list of values
+
+        Returns:
+            Frame with the key columns followed by the aggregated columns
+        """
+        if len(self._by) == 1:
+            columns = {self._by[0]: list(self._keys)}
+        else:
+            columns = {name: [key[position] for key in self._keys] for position, name in enumerate(self._by)}
+        for name, spec in aggregations.items():
+            column, function = (None, spec) if isinstance(spec, str) else spec
+            columns[name] = self._aggregate(column, function)
+        return Frame(columns)
+
+    def _aggregate(self, column, function):
+        if column is None:
+            if function != "count":
+                raise ValueError(f"Aggregation {function!r} needs a (column, function) pair")
+            return [len(members) for members in self._group_members()]
+        values = self._frame[column]
+        if not callable(function) and function not in AGGREGATIONS:
+            raise ValueError(f"Unknown aggregation {function!r}; expected one of {', '.join(AGGREGATIONS)}")
+        if function in ("count", "sum", "mean", "min", "max") and _is_ndarray(values) and values.dtype.kind in "biuf":
+            return self._aggregate_numpy(values, function)
+
+        values = _to_list(values)
+        out = []
+        for members in self._group_members():
+            group = [values[index] for index in members]
+            present = [item for item in group if item is not None]
+            if callable(function):
+                out.append(function(group))
+            elif function == "count":
+                out.append(len(present))
+            elif function == "sum":
+                out.append(sum(present))
+            elif function == "mean":
+                out.append(sum(present) / len(present) if present else None)
+            elif function == "min":
+                out.append(min(present) if present else None)
+            elif function == "max":
+                out.append(max(present) if present else None)
+            elif function == "first":
+                out.append(group[0])
+            elif function == "last":
+                out.append(group[-1])
+            elif function == "nunique":
+                out.append(len({_freeze(item) for item in present}))
+            else:
+                out.append(group)
+        return out
+
+    def _aggregate_numpy(self, values, function):
+        """count/sum/mean/min/max of a numeric column in single vectorized passes"""
+        np = numpy_module()
+        codes = np.asarray(self._codes, dtype=np.intp)
+        groups = len(self._keys)
+        if values.dtype.kind == "b":
+            values = values.astype(np.int64)
+        counts = np.bincount(codes, minlength=groups)
+        if function == "count":
+            return counts
+        if function in ("sum", "mean"):
+            sums = np.bincount(codes, weights=values, minlength=groups)
+            if function == "mean":
+                return sums / counts
+            return sums.astype(np.int64) if values.dtype.kind in "iu" else sums
+        if values.dtype.kind == "f":
+            initial = np.inf if function == "min" else -np.inf
+        else:
+            limits = np.iinfo(values.dtype)
+            initial = limits.max if function == "min" else limits.min
+        out = np.full(groups, initial, dtype=values.dtype)
+        (np.minimum if function == "min" else np.maximum).at(out, codes, values)
+        return out
+
+
+def to_frame(value, columns=None):
+    """
+    Build a Frame from a tool result
+
+    Accepts a Frame, a list of records, a result page dict carrying its items
+    under "messages", "items", "results", "events", "files" or "tools", a
+    tools/call result whose text content is JSON, or an MCPResult.
+
+    Args:
+        value: Tool result
+        columns: Passed to Frame.from_records
+
+    Usage:
+        hits = to_frame(mcp.call("brave_web_search", {"query": "nexus"}), ["title", "url"])
+    """
+    if isinstance(value, Frame):
+        return value.select(*columns) if columns is not None else value
+    if hasattr(value, "value") and hasattr(value, "buffer"):
+        value = value.value()
+    if isinstance(value, (str, bytes, bytearray)):
+        value = codec.loads(value)
+    if isinstance(value, dict) and isinstance(value.get("content"), list):
+        text = "".join(item.get("text", "") for item in value["content"] if isinstance(item, dict))
+        value = codec.loads(text)
+    if isinstance(value, dict):
+        for field in _LIST_FIELDS:
+            if isinstance(value.get(field), list):
+                value = value[field]
+                break
+        else:
+            value = [value]
+    return Frame.from_records(value, columns)
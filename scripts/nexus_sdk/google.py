@@ -6,32 +6,126 @@ This SDK wraps MCP calls and handles data processing locally in the sandbox,
 following the "Nexus way" of keeping heavy data processing away from the LLM context.
 """
 
-import json
+import functools
+import keyword
 import os
-import sys
+from collections import namedtuple
 
-# Try to import requests, fallback to urllib if not available
-try:
-    import requests
-    HAS_REQUESTS = True
-except ImportError:
-    HAS_REQUESTS = False
-    try:
-        import urllib.request
-        import urllib.parse
-        import urllib.error
-    except ImportError:
-        raise ImportError("Either 'requests' or urllib is required for nexus_sdk")
+from . import codec
+from .cache import is_write_tool, make_key, resolve_cache
+# NexusAPIError and MCPCallError used to be defined here; they stay importable from nexus_sdk.google
+from .errors import MCPCallError, NexusAPIError  # noqa: F401
+from .resilience import call_with_resilience
+from .singleflight import get_single_flight
+from .transport import MAX_BATCH_SIZE, get_transport
 
 
-class NexusAPIError(Exception):
-    """Base exception for Nexus API errors"""
-    pass
+def _unpack_page(raw_results):
+    """
+    Split an MCP list response into (items, next_page_token).
+    
+    Accepts a plain list, or a dict carrying the items under "messages",
+    "items" or "results" next to a "nextPageToken"/"next_page_token".
+    """
+    if not raw_results:
+        return [], None
+    if isinstance(raw_results, list):
+        return raw_results, None
+    if isinstance(raw_results, dict):
+        token = raw_results.get("nextPageToken") or raw_results.get("next_page_token")
+        for field in ("messages", "items", "results"):
+            if isinstance(raw_results.get(field), list):
+                return raw_results[field], token
+    # Ensure we have a list
+    return [raw_results], None
+
+
+# Top-level fields of a Gmail message resource; any other field is read from the headers
+GMAIL_MESSAGE_FIELDS = ("id", "threadId", "labelIds", "snippet", "historyId", "internalDate", "sizeEstimate")
+
+DEFAULT_MESSAGE_FIELDS = ("id", "threadId", "snippet", "from", "to", "subject", "date", "labelIds")
+
+# Ids per batch request and batch requests in flight for Gmail.get_messages
+DEFAULT_MESSAGE_CHUNK_SIZE = 25
+DEFAULT_MESSAGE_WORKERS = 4
+
+# Events per page requested while syncing a calendar (the Calendar API maximum)
+CALENDAR_SYNC_PAGE_SIZE = 2500
+
+
+def _attribute_name(field):
+    """Turn a field name into a record attribute ("from" -> "from_", "X-Mailer" -> "x_mailer")"""
+    name = "".join(c if c.isalnum() or c == "_" else "_" for c in field)
+    if field not in GMAIL_MESSAGE_FIELDS:
+        name = name.lower()
+    if not name or name[0].isdigit():
+        name = "f_" + name
+    return name + "_" if keyword.iskeyword(name) else name
+
+
+@functools.lru_cache(maxsize=32)
+def message_record_type(fields):
+    """
+    Return the compact record type for a tuple of message fields
+    
+    Records are namedtuples (no per-record dict). Attributes use the
+    sanitized field names ("from" -> record.from_); as_dict() maps back to
+    the requested names.
+    """
+    base = namedtuple("MessageRecord", [_attribute_name(field) for field in fields])
+    
+    class MessageRecord(base):
+        __slots__ = ()
+        source_fields = fields
+        
+        def as_dict(self):
+            """Return the record as a dict keyed by the requested field names"""
+            return dict(zip(self.source_fields, self))
+    
+    return MessageRecord
+
+
+def _result_dict(raw):
+    """Normalize a tool result (e.g. a gmail_get_message message) into a dict"""
+    if isinstance(raw, dict) and isinstance(raw.get("content"), list):
+        # tools/call envelope: the result is the JSON text of the content items
+        texts = [item.get("text", "") for item in raw["content"] if isinstance(item, dict)]
+        text = "".join(texts)
+        try:
+            raw = codec.loads(text)
+        except ValueError:
+            return {"body": text}
+    return raw if isinstance(raw, dict) else {}
+
+
+def _message_headers(message):
+    """Return the message headers as a lower-cased name -> value dict"""
+    headers = message.get("headers")
+    if headers is None and isinstance(message.get("payload"), dict):
+        headers = message["payload"].get("headers")
+    if isinstance(headers, dict):
+        return {str(name).lower(): value for name, value in headers.items()}
+    if isinstance(headers, list):
+        return {
+            str(header.get("name", "")).lower(): header.get("value")
+            for header in headers if isinstance(header, dict)
+        }
+    return {}
 
 
-class MCPCallError(NexusAPIError):
-    """Exception raised when MCP call fails"""
-    pass
+def _project_message(record_type, raw):
+    """Project the requested fields of a message into a record"""
+    message = _result_dict(raw)
+    headers = None
+    values = []
+    for field in record_type.source_fields:
+        if field in message:
+            values.append(message[field])
+            continue
+        if headers is None:
+            headers = _message_headers(message)
+        values.append(headers.get(field.lower()))
+    return record_type(*values)
 
 
 class Gmail:
@@ -55,43 +149,45 @@ class Gmail:
         
         Args:
             query: Gmail search query string
-            limit: Maximum number of results to return (processed locally)
+            limit: Maximum number of results to return (also sent to the MCP tool
+                so the server doesn't return more than we keep)
             
         Returns:
             List of message objects with id, snippet, and from fields
         """
-        # The MCP call happens here
-        raw_results = self._parent._call_mcp("gmail_search", {"query": query})
-        
-        # Logic is handled LOCALLY in the sandbox
-        # We can pre-process/summarize here before the LLM sees it
-        if not raw_results:
-            return []
+        return list(self.iter_search(query, page_size=limit or 50, limit=limit))
+    
+    def iter_search(self, query: str, page_size: int = 50, limit: int = None):
+        """
+        Lazily iterate over Gmail search results, one page per MCP call.
         
-        # Ensure we have a list
-        if not isinstance(raw_results, list):
-            raw_results = [raw_results]
+        Pages are only fetched as the caller consumes results, so breaking
+        out of the loop early stops further MCP calls.
         
-        # Process and limit results locally (saves tokens)
-        processed = []
-        for m in raw_results[:limit]:
+        Args:
+            query: Gmail search query string
+            page_size: Number of results requested per MCP call
+            limit: Optional maximum number of results to yield
+            
+        Yields:
+            Message objects with id, snippet, and from fields
+        """
+        for m in self._iter_pages("gmail_search", {"query": query}, page_size, limit):
             # Extract relevant fields - processing happens in sandbox, not LLM context
-            msg = {
+            yield {
                 "id": m.get("id", ""),
                 "snippet": m.get("snippet", ""),
                 "from": m.get("from", "")
             }
-            processed.append(msg)
-        
-        return processed
     
-    def list_messages(self, query=None, max_results=50):
+    def list_messages(self, query=None, max_results=50, page_token=None):
         """
         List Gmail messages
         
         Args:
             query: Gmail search query (optional)
             max_results: Maximum number of results
+            page_token: Page token from a previous response (optional)
             
         Returns:
             List of message objects
@@ -99,8 +195,49 @@ class Gmail:
         params = {"max_results": max_results}
         if query:
             params["query"] = query
+        if page_token:
+            params["page_token"] = page_token
         return self._parent._call_mcp("gmail_list_messages", params)
     
+    def iter_messages(self, query=None, page_size=50, limit=None):
+        """
+        Lazily iterate over Gmail messages, one page per MCP call.
+        
+        Args:
+            query: Gmail search query (optional)
+            page_size: Number of messages requested per MCP call
+            limit: Optional maximum number of messages to yield
+            
+        Yields:
+            Message objects
+        """
+        params = {}
+        if query:
+            params["query"] = query
+        return self._iter_pages("gmail_list_messages", params, page_size, limit)
+    
+    def _iter_pages(self, method, params, page_size, limit):
+        """Yield items from successive result pages until exhausted or `limit` is reached"""
+        if limit is not None and limit <= 0:
+            return
+        yielded = 0
+        page_token = None
+        while True:
+            page_params = dict(params)
+            page_params["max_results"] = page_size if limit is None else min(page_size, limit - yielded)
+            if page_token:
+                page_params["page_token"] = page_token
+            
+            items, page_token = _unpack_page(self._parent._call_mcp(method, page_params))
+            for item in items:
+                yield item
+                yielded += 1
+                if limit is not None and yielded >= limit:
+                    return
+            
+            if not page_token or not items:
+                return
+    
     def get_message(self, message_id):
         """
         Get message by ID
@@ -114,6 +251,71 @@ class Gmail:
         return self._parent._call_mcp("gmail_get_message", {
             "message_id": message_id
         })
+    
+    def get_messages(self, ids, fields=DEFAULT_MESSAGE_FIELDS, format="metadata",
+                     chunk_size=DEFAULT_MESSAGE_CHUNK_SIZE, max_workers=DEFAULT_MESSAGE_WORKERS,
+                     return_exceptions=False):
+        """
+        Fetch many messages and project them into compact records
+        
+        Ids are fetched in batch requests of `chunk_size`, with up to
+        `max_workers` batches in flight. The format (and, for "metadata", the
+        header names among `fields`) is passed to the MCP tool so message
+        bodies aren't transferred when only headers are needed.
+        
+        Args:
+            ids: Message ids (duplicates are fetched once)
+            fields: Fields to keep: message fields such as "id", "threadId",
+                "snippet", "labelIds", or header names such as "from", "subject"
+            format: Gmail format hint - "metadata", "minimal", "full" or "raw"
+            chunk_size: Message ids per batch request
+            max_workers: Batch requests in flight at once
+            return_exceptions: If True, failed messages are returned in place as
+                MCPCallError instances instead of raising the first failure
+            
+        Returns:
+            List of MessageRecord namedtuples in the order of `ids`
+        
+        Usage:
+            ids = [m["id"] for m in google.gmail.search("invoice", limit=100)]
+            for msg in google.gmail.get_messages(ids, fields=["id", "from", "subject"]):
+                print(msg.from_, msg.subject)
+        """
+        from .concurrency import parallel_map
+        
+        fields = tuple(fields)
+        record_type = message_record_type(fields)
+        ids = list(ids)
+        unique_ids = list(dict.fromkeys(ids))
+        
+        base_params = {"format": format}
+        if format == "metadata":
+            header_names = [field for field in fields if field not in GMAIL_MESSAGE_FIELDS]
+            if header_names:
+                base_params["metadata_headers"] = [name.title() for name in header_names]
+        
+        def fetch_chunk(chunk):
+            params_list = [dict(base_params, message_id=message_id) for message_id in chunk]
+            return self._parent._call_mcp_many("gmail_get_message", params_list)
+        
+        chunk_size = max(1, chunk_size)
+        chunks = [unique_ids[start:start + chunk_size] for start in range(0, len(unique_ids), chunk_size)]
+        by_id = {}
+        for chunk, results in zip(chunks, parallel_map(fetch_chunk, chunks, max_workers=max_workers)):
+            for message_id, raw in zip(chunk, results):
+                by_id[message_id] = raw if isinstance(raw, MCPCallError) else _project_message(record_type, raw)
+        
+        records = [by_id[message_id] for message_id in ids]
+        if not return_exceptions:
+            for record in records:
+                if isinstance(record, MCPCallError):
+                    raise record
+        return records
+
+
+def _sync_token_expired(error):
+    """True if a calendar sync failed because the server no longer accepts the sync token (HTTP 410 Gone)"""
+    return getattr(error, "status", None) == 410
 
 
 class Calendar:
@@ -126,13 +328,20 @@ class Calendar:
     def __init__(self, parent):
         self._parent = parent
     
-    def list_events(self, calendar_id="primary", time_min=None):
+    def list_events(self, calendar_id="primary", time_min=None, time_max=None, sync_token=None, page_token=None,
+                    max_results=None, show_deleted=False):
         """
         List calendar events
         
         Args:
             calendar_id: Calendar ID (defaults to "primary")
             time_min: Minimum time for events (ISO format string)
+            time_max: Maximum time for events (ISO format string)
+            sync_token: Return only events changed since the sync that produced this token
+                (can't be combined with time_min/time_max)
+            page_token: Token of the page to fetch
+            max_results: Maximum events per page
+            show_deleted: Include cancelled events
             
         Returns:
             List of event objects
@@ -142,9 +351,115 @@ class Calendar:
         }
         if time_min:
             params["timeMin"] = time_min
+        if time_max:
+            params["timeMax"] = time_max
+        if sync_token:
+            params["syncToken"] = sync_token
+        if page_token:
+            params["pageToken"] = page_token
+        if max_results:
+            params["maxResults"] = max_results
+        if show_deleted:
+            params["showDeleted"] = True
         
         return self._parent._call_mcp("calendar_list_events", params)
     
+    def sync(self, calendar_id="primary", index=None):
+        """
+        Bring the local event index for a calendar up to date
+        
+        The first sync downloads every event; later syncs send the stored
+        sync token and fetch only events changed or deleted since then. If
+        the server has expired the token, the calendar is fully resynced; the
+        indexed events are only replaced once that full sync succeeds.
+        
+        Args:
+            calendar_id: Calendar ID (defaults to "primary")
+            index: CalendarIndex to update (defaults to the shared on-disk index)
+            
+        Returns:
+            Dict with "full" (True for a full sync), "updated", "deleted" and "requests"
+        
+        Usage:
+            google.calendar.sync()
+            free = google.calendar.free_busy("2024-05-06T09:00:00Z", "2024-05-06T17:00:00Z")["free"]
+        """
+        index = index or self._index()
+        token = index.sync_token(self._scope(), calendar_id)
+        if token:
+            try:
+                return self._sync_pages(index, calendar_id, token)
+            except MCPCallError as e:
+                if not _sync_token_expired(e):
+                    raise
+        return self._sync_pages(index, calendar_id, None)
+    
+    def events_between(self, time_min, time_max, calendar_id="primary", index=None):
+        """
+        Query the local event index (run sync() first to refresh it)
+        
+        Args:
+            time_min: Range start (datetime or ISO string)
+            time_max: Range end (datetime or ISO string)
+            calendar_id: Calendar ID (defaults to "primary")
+            index: CalendarIndex to query (defaults to the shared on-disk index)
+            
+        Returns:
+            List of CalendarEvent records overlapping the range, ordered by start
+        """
+        index = index or self._index()
+        return index.events_between(self._scope(), calendar_id, time_min, time_max)
+    
+    def free_busy(self, time_min, time_max, calendar_id="primary", index=None):
+        """
+        Compute free and busy intervals from the local event index
+        
+        Args:
+            time_min: Range start (datetime or ISO string)
+            time_max: Range end (datetime or ISO string)
+            calendar_id: Calendar ID (defaults to "primary")
+            index: CalendarIndex to query (defaults to the shared on-disk index)
+            
+        Returns:
+            Dict with "busy" and "free" lists of (start, end) ISO string pairs
+        """
+        index = index or self._index()
+        return index.free_busy(self._scope(), calendar_id, time_min, time_max)
+    
+    def _index(self):
+        from .calendar_index import get_calendar_index
+        return get_calendar_index()
+    
+    def _scope(self):
+        from .calendar_index import index_scope
+        return index_scope(self._parent.server_instance_id, self._parent.auth_token)
+    
+    def _sync_pages(self, index, calendar_id, sync_token):
+        events = []
+        page_token = None
+        requests_made = 0
+        while True:
+            params = {"calendarId": calendar_id, "maxResults": CALENDAR_SYNC_PAGE_SIZE, "singleEvents": True}
+            if sync_token:
+                params["syncToken"] = sync_token
+            if page_token:
+                params["pageToken"] = page_token
+            # Sync responses depend on server-side state, so they bypass the result cache
+            raw = self._parent._call_mcp_uncached("calendar_list_events", params)
+            requests_made += 1
+            page = raw if isinstance(raw, list) else _result_dict(raw)
+            items, page_token = _unpack_page(page)
+            events.extend(items)
+            if not page_token:
+                break
+        
+        next_token = None
+        if isinstance(page, dict):
+            next_token = page.get("nextSyncToken") or page.get("next_sync_token")
+        counts = index.apply(self._scope(), calendar_id, events, next_token,
+                             full=sync_token is None)
+        return dict(counts, full=sync_token is None, requests=requests_made)
+    
     def get_event(self, event_id, calendar_id="primary"):
         """
         Get event by ID
@@ -208,16 +523,28 @@ class GoogleSDK:
         events = google.calendar.list_events(calendar_id="primary", time_min="2024-01-01T00:00:00Z")
     """
     
-    def __init__(self, base_url=None, server_instance_id=None):
+    def __init__(self, base_url=None, server_instance_id=None, auth_token=None, transport=None, cache=None,
+                 timeout=None):
         """
         Initialize Google Workspace SDK client
         
         Args:
             base_url: Base URL for Nexus API (defaults to environment variable or localhost)
             server_instance_id: MCP server instance ID (defaults to environment variable)
+            auth_token: Optional bearer token for authenticating Nexus requests
+            transport: Optional Transport (defaults to the shared pooled transport)
+            cache: Result cache for idempotent calls - True for the shared ResultCache,
+                a ResultCache instance, or None to follow the NEXUS_CACHE environment variable
+            timeout: Per-call timeout in seconds (defaults to the transport timeout);
+                always clamped to what is left of the sandbox execution budget
         """
         self.base_url = base_url or os.environ.get('NEXUS_API_URL', 'http://localhost:3000')
         self.server_instance_id = server_instance_id or os.environ.get('NEXUS_SERVER_INSTANCE_ID')
+        self.auth_token = auth_token or os.environ.get('NEXUS_AUTH_TOKEN')
+        # The shared transport (and the HTTP backend import) is created on first use
+        self._transport = transport
+        self.cache = resolve_cache(cache)
+        self.timeout = timeout
         
         if not self.server_instance_id:
             raise ValueError(
@@ -228,6 +555,33 @@ class GoogleSDK:
         self.gmail = Gmail(self)
         self.calendar = Calendar(self)
     
+    @property
+    def transport(self):
+        """Transport used for Nexus API requests (the shared pooled transport by default)"""
+        if self._transport is None:
+            self._transport = get_transport()
+        return self._transport
+    
+    def rebind(self, base_url=None, server_instance_id=None, auth_token=None):
+        """
+        Point this client at another tenant, keeping its transport, cache and service clients
+        
+        Arguments left as None are resolved from the environment exactly as
+        in __init__, so a long-lived client can be reused across jobs.
+        
+        Returns:
+            self
+        """
+        server_instance_id = server_instance_id or os.environ.get('NEXUS_SERVER_INSTANCE_ID')
+        if not server_instance_id:
+            raise ValueError(
+                "server_instance_id must be provided or set in NEXUS_SERVER_INSTANCE_ID environment variable"
+            )
+        self.base_url = base_url or os.environ.get('NEXUS_API_URL', 'http://localhost:3000')
+        self.server_instance_id = server_instance_id
+        self.auth_token = auth_token or os.environ.get('NEXUS_AUTH_TOKEN')
+        return self
+    
     def _call_mcp(self, method, params=None):
         """
         Make an MCP call through the Nexus proxy
@@ -239,6 +593,111 @@ class GoogleSDK:
         Returns:
             Result from MCP call
         """
+        cache_key = None
+        if self.cache is not None:
+            if self.cache.is_cacheable(method):
+                cache_key = make_key(self.server_instance_id, method, params, scope="google", auth_token=self.auth_token)
+                hit, value = self.cache.get(cache_key)
+                if hit:
+                    return value
+            else:
+                self.cache.record_bypass()
+        
+        def fetch():
+            result = self._call_mcp_uncached(method, params)
+            if self.cache is not None:
+                if cache_key is not None:
+                    self.cache.set(cache_key, method, result, self.server_instance_id)
+                elif is_write_tool(method):
+                    self.cache.invalidate(self.server_instance_id)
+            return result
+        
+        if is_write_tool(method):
+            return fetch()
+        # Identical reads already in flight share one request
+        flight_key = cache_key or make_key(self.server_instance_id, method, params, scope="google", auth_token=self.auth_token)
+        return get_single_flight().do(flight_key, fetch)
+    
+    def _call_mcp_many(self, method, params_list):
+        """
+        Make several calls to one MCP method in batch requests of up to MAX_BATCH_SIZE calls
+        
+        Args:
+            method: MCP method name
+            params_list: Parameters of each call
+            
+        Returns:
+            List of results in input order; failed calls are MCPCallError instances
+        """
+        params_list = list(params_list)
+        results = [None] * len(params_list)
+        cache_keys = [None] * len(params_list)
+        missing = []
+        for index, params in enumerate(params_list):
+            if self.cache is not None and self.cache.is_cacheable(method):
+                cache_keys[index] = make_key(self.server_instance_id, method, params, scope="google", auth_token=self.auth_token)
+                hit, value = self.cache.get(cache_keys[index])
+                if hit:
+                    results[index] = value
+                    continue
+            missing.append(index)
+        
+        if missing:
+            fetched = self._call_mcp_many_uncached(method, [params_list[index] for index in missing])
+            for index, result in zip(missing, fetched):
+                results[index] = result
+                if cache_keys[index] is not None and not isinstance(result, MCPCallError):
+                    self.cache.set(cache_keys[index], method, result, self.server_instance_id)
+            if self.cache is not None and is_write_tool(method):
+                self.cache.invalidate(self.server_instance_id)
+        return results
+    
+    def _call_mcp_many_uncached(self, method, params_list):
+        results = []
+        for start in range(0, len(params_list), MAX_BATCH_SIZE):
+            results.extend(self._call_mcp_batch(method, params_list[start:start + MAX_BATCH_SIZE]))
+        return results
+    
+    def _call_mcp_batch(self, method, params_list):
+        url = f"{self.base_url}/api/mcp/call"
+        batch = [
+            {"id": index, "server_instance_id": self.server_instance_id, "method": method, "params": params or {}}
+            for index, params in enumerate(params_list)
+        ]
+        
+        headers = {}
+        if self.auth_token:
+            headers["Authorization"] = f"Bearer {self.auth_token}"
+        
+        def send(timeout):
+            return self.transport.post_json(url, batch, headers=headers, timeout=timeout, label=f"{method}[{len(batch)}]")
+        
+        data = call_with_resilience(
+            send,
+            (self.server_instance_id, method),
+            self.timeout or self.transport.timeout,
+            not is_write_tool(method),
+            "Failed to call MCP",
+        )
+        if isinstance(data, dict) and 'error' in data:
+            raise MCPCallError(f"MCP batch call failed: {data['error']}")
+        if not isinstance(data, list) or len(data) != len(batch):
+            raise MCPCallError("MCP batch call failed: malformed batch response")
+        
+        results = [None] * len(batch)
+        for position, item in enumerate(data):
+            index = item.get('id', position) if isinstance(item, dict) else position
+            if not isinstance(index, int) or not 0 <= index < len(batch):
+                index = position
+            if not isinstance(item, dict):
+                results[index] = MCPCallError(f"MCP call to {method} failed: malformed batch item")
+            elif 'error' in item:
+                results[index] = MCPCallError(f"MCP call to {method} failed: {item['error']}", item.get('status'))
+            else:
+                results[index] = item.get('result')
+        return results
+    
+    def _call_mcp_uncached(self, method, params):
         url = f"{self.base_url}/api/mcp/call"
         payload = {
             "server_instance_id": self.server_instance_id,
@@ -246,26 +705,25 @@ class GoogleSDK:
             "params": params or {}
         }
         
-        try:
-            if HAS_REQUESTS:
-                response = requests.post(url, json=payload, timeout=30)
-                response.raise_for_status()
-                data = response.json()
-            else:
-                # Fallback to urllib
-                req_data = json.dumps(payload).encode('utf-8')
-                req = urllib.request.Request(url, data=req_data, headers={'Content-Type': 'application/json'})
-                with urllib.request.urlopen(req, timeout=30) as response:
-                    data = json.loads(response.read().decode('utf-8'))
+        headers = {}
+        if self.auth_token:
+            headers["Authorization"] = f"Bearer {self.auth_token}"
+        
+        def send(timeout):
+            data = self.transport.post_json(url, payload, headers=headers, timeout=timeout, label=method)
             
             if 'error' in data:
                 raise MCPCallError(f"MCP call failed: {data['error']}")
             
             return data.get('result')
-        except Exception as e:
-            if isinstance(e, MCPCallError):
-                raise
-            raise MCPCallError(f"Failed to call MCP: {str(e)}")
+        
+        return call_with_resilience(
+            send,
+            (self.server_instance_id, method),
+            self.timeout or self.transport.timeout,
+            not is_write_tool(method),
+            "Failed to call MCP",
+        )
 
 
 # Alias for backward compatibility
@@ -3,27 +3,19 @@ Generic MCP SDK for Project Nexus
 Provides a simple Python API for calling any MCP tool via the Nexus proxy
 """
 
-import json
 import os
 import sys
 
-# Try to import requests, fallback to urllib if not available
-try:
-    import requests
-    HAS_REQUESTS = True
-except ImportError:
-    HAS_REQUESTS = False
-    try:
-        import urllib.request
-        import urllib.parse
-        import urllib.error
-    except ImportError:
-        raise ImportError("Either 'requests' or urllib is required for nexus_sdk")
-
-
-class MCPCallError(Exception):
-    """Exception raised when MCP call fails"""
-    pass
+from . import codec
+from .cache import is_write_tool, make_key, resolve_cache
+from .catalog import ToolCatalog, validation_mode
+from .errors import CircuitOpenError, MCPAuthError, MCPCallError, MCPTimeoutError, MCPUpstreamError
+from .metrics import record_coalesced
+from .resilience import call_with_resilience
+from .result import MCPResult, MCPStream
+from .singleflight import copy_result, get_single_flight
+from .tracing import trace
+from .transport import HAS_REQUESTS, MAX_BATCH_SIZE, get_transport
 
 
 class MCP:
@@ -37,7 +29,8 @@ class MCP:
         result = mcp.call("brave_web_search", {"query": "Python tutorials"})
     """
     
-    def __init__(self, base_url=None, server_instance_id=None, auth_token=None):
+    def __init__(self, base_url=None, server_instance_id=None, auth_token=None, transport=None, cache=None,
+                 timeout=None):
         """
         Initialize MCP client
         
@@ -45,40 +38,346 @@ class MCP:
             base_url: Base URL for Nexus API (defaults to environment variable or localhost)
             server_instance_id: MCP server instance ID (defaults to environment variable)
             auth_token: Optional bearer token for authenticating Nexus requests
+            transport: Optional Transport (defaults to the shared pooled transport)
+            cache: Result cache for idempotent tools - True for the shared ResultCache,
+                a ResultCache instance, or None to follow the NEXUS_CACHE environment variable
+            timeout: Per-call timeout in seconds (defaults to the transport timeout);
+                always clamped to what is left of the sandbox execution budget
+        
+        Failed calls raise MCPCallError subclasses: MCPTimeoutError, MCPAuthError
+        and MCPUpstreamError (CircuitOpenError while a failing tool is short-circuited).
+        Once the tool catalog is cached (see `tools`), unknown tools and invalid
+        arguments raise MCPValidationError without a request (NEXUS_TOOL_VALIDATION:
+        "cached" by default, "fetch" to fetch a missing catalog first, "off").
+        Idempotent tools are retried with backoff on timeouts and upstream outages.
         """
         self.base_url = base_url or os.environ.get('NEXUS_API_URL', 'http://localhost:3000')
         env_instance_id = os.environ.get('NEXUS_SERVER_INSTANCE_ID') or os.environ.get('NEXUS_INSTANCE_ID')
         self.server_instance_id = server_instance_id or env_instance_id
         self.auth_token = auth_token or os.environ.get('NEXUS_AUTH_TOKEN')
+        # The shared transport (and the HTTP backend import) is created on first use
+        self._transport = transport
+        self.cache = resolve_cache(cache)
+        self.timeout = timeout
+        # Tool list and bound tool methods: mcp.tools(), mcp.tools.<name>(**arguments)
+        self.tools = ToolCatalog(self)
         
-        # #region agent log
-        try:
-            import json
-            log_data = json.dumps({"location":"mcp.py:52","message":"MCP init","data":{"serverInstanceId":self.server_instance_id,"fromParam":server_instance_id,"fromEnv":env_instance_id,"hasAuthToken":bool(self.auth_token)},"timestamp":int(__import__('time').time()*1000),"sessionId":"debug-session","runId":"run1","hypothesisId":"E"})
-            with open(r'c:\Users\senti\OneDrive\Desktop\project-nexus\project-nexus-main\.cursor\debug.log', 'a') as f:
-                f.write(log_data + '\n')
-        except:
-            pass
-        # #endregion
+        trace(
+            "mcp.init",
+            server_instance_id=self.server_instance_id,
+            server_instance_source="param" if server_instance_id else "env",
+            has_auth_token=bool(self.auth_token),
+        )
         
         if not self.server_instance_id:
             raise ValueError(
                 "server_instance_id must be provided or set in NEXUS_SERVER_INSTANCE_ID environment variable"
             )
     
-    def call(self, tool_name, params=None):
+    @property
+    def transport(self):
+        """Transport used for Nexus API requests (the shared pooled transport by default)"""
+        if self._transport is None:
+            self._transport = get_transport()
+        return self._transport
+    
+    def rebind(self, base_url=None, server_instance_id=None, auth_token=None):
+        """
+        Point this client at another tenant, keeping its transport and cache
+        
+        Arguments left as None are resolved from the environment exactly as
+        in __init__, so a long-lived client can be reused across jobs.
+        
+        Returns:
+            self
+        """
+        self.base_url = base_url or os.environ.get('NEXUS_API_URL', 'http://localhost:3000')
+        env_instance_id = os.environ.get('NEXUS_SERVER_INSTANCE_ID') or os.environ.get('NEXUS_INSTANCE_ID')
+        server_instance_id = server_instance_id or env_instance_id
+        if not server_instance_id:
+            raise ValueError(
+                "server_instance_id must be provided or set in NEXUS_SERVER_INSTANCE_ID environment variable"
+            )
+        self.server_instance_id = server_instance_id
+        self.auth_token = auth_token or os.environ.get('NEXUS_AUTH_TOKEN')
+        return self
+    
+    def call(self, tool_name, params=None, raw=False):
         """
         Call an MCP tool
         
         Args:
             tool_name: Name of the MCP tool to call
             params: Tool parameters (dict)
+            raw: If True, return an MCPResult over the undecoded response instead
+                of the flattened value (never served from the cache)
             
         Returns:
             Result from the tool call
+        
+        Identical idempotent calls made while one is already in flight (from
+        other threads or AsyncMCP) wait for it and share its result.
+        """
+        self._validate(tool_name, params)
+        if raw:
+            return self._call_raw(tool_name, params)
+        
+        cache_key = self._cache_lookup_key(tool_name, params)
+        if cache_key is not None:
+            hit, value = self.cache.get(cache_key)
+            if hit:
+                return value
+        
+        def fetch():
+            result = self._call_uncached(tool_name, params)
+            self._cache_store(cache_key, tool_name, result)
+            return result
+        
+        if is_write_tool(tool_name):
+            return fetch()
+        flight_key = cache_key or make_key(self.server_instance_id, tool_name, params, auth_token=self.auth_token)
+        return get_single_flight().do(flight_key, fetch)
+    
+    def _call_uncached(self, tool_name, params):
+        url = f"{self.base_url}/api/mcp/call"
+        payload = self._build_payload(tool_name, params)
+        
+        def send(timeout):
+            data = self.transport.post_json(url, payload, headers=self._headers(), timeout=timeout, label=tool_name)
+            
+            if 'error' in data:
+                raise MCPCallError(f"MCP call failed: {data['error']}")
+            
+            return _extract_result(data.get('result', {}))
+        
+        return self._send_with_policy(send, tool_name, not is_write_tool(tool_name))
+    
+    def _call_raw(self, tool_name, params):
+        url = f"{self.base_url}/api/mcp/call"
+        payload = self._build_payload(tool_name, params)
+        
+        def send(timeout):
+            return self.transport.post(url, payload, headers=self._headers(), timeout=timeout, label=tool_name)
+        
+        data = self._send_with_policy(send, tool_name, not is_write_tool(tool_name))
+        # A raw write still invalidates cached reads
+        self._cache_store(None, tool_name, None)
+        return MCPResult(data)
+    
+    def call_stream(self, tool_name, params=None):
+        """
+        Call an MCP tool and read its output as the proxy relays it
+        
+        Only progress is incremental: the proxy relays progress notifications
+        while the tool runs, but MCP delivers the content in one final
+        result, so the content items arrive together once the tool finishes.
+        They are still yielded one at a time, so a script can stop early and
+        hold one item at a time. Against a proxy without streaming the whole
+        response is read and replayed.
+        
+        Args:
+            tool_name: Name of the MCP tool to call
+            params: Tool parameters (dict)
+            
+        Returns:
+            MCPStream yielding ProgressUpdate and ContentItem objects
+        
+        Opening the stream is retried like call(); failures after that are
+        raised from the iterator. Streamed calls bypass the result cache.
+        
+        Usage:
+            for event in mcp.call_stream("brave_web_search", {"query": "nexus", "count": 50}):
+                print(event)
+        """
+        self._validate(tool_name, params)
+        url = f"{self.base_url}/api/mcp/call"
+        payload = self._build_payload(tool_name, params)
+        payload["stream"] = True
+        
+        def send(timeout):
+            return self.transport.post_stream(url, payload, headers=self._headers(), timeout=timeout, label=tool_name)
+        
+        response = self._send_with_policy(send, tool_name, not is_write_tool(tool_name))
+        self._cache_store(None, tool_name, None)
+        return MCPStream(response, tool_name)
+    
+    def _validate(self, tool_name, params):
+        mode = validation_mode()
+        if mode != "off":
+            self.tools.validate(tool_name, params, fetch=mode == "fetch")
+    
+    def _list_tools(self):
+        """Fetch the full tools/list of the server instance, following pagination cursors"""
+        url = f"{self.base_url}/api/mcp/call"
+        tools, cursor = [], None
+        while True:
+            payload = {
+                "server_instance_id": self.server_instance_id,
+                "method": "tools/list",
+                "params": {"cursor": cursor} if cursor else {},
+            }
+            
+            def send(timeout):
+                data = self.transport.post_json(url, payload, headers=self._headers(), timeout=timeout,
+                                                label="tools/list")
+                if 'error' in data:
+                    raise MCPCallError(f"MCP tools/list failed: {data['error']}")
+                return data.get('result') or {}
+            
+            result = self._send_with_policy(send, "tools/list", True, "Failed to list MCP tools")
+            tools.extend(result.get("tools") or [])
+            cursor = result.get("nextCursor")
+            if not cursor:
+                return tools
+    
+    def _send_with_policy(self, send, tool_name, idempotent, error_prefix="Failed to call MCP tool"):
+        """Run send(timeout) under the per-call deadline, retry policy and circuit breaker"""
+        return call_with_resilience(
+            send,
+            (self.server_instance_id, tool_name),
+            self.timeout or self.transport.timeout,
+            idempotent,
+            error_prefix,
+        )
+    
+    def call_many(self, calls, return_exceptions=False):
+        """
+        Call several MCP tools in one round trip
+        
+        The calls are sent as batch requests of up to MAX_BATCH_SIZE calls, so
+        the proxy authenticates and resolves the server instance once per batch.
+        
+        Args:
+            calls: Iterable of (tool_name, params) tuples
+            return_exceptions: If True, failed calls are returned in place as
+                MCPCallError instances instead of raising the first failure
+            
+        Returns:
+            List of results in the same order as `calls`
+        
+        Usage:
+            messages = mcp.call_many([("gmail_get_message", {"message_id": i}) for i in ids])
         """
+        calls = list(calls)
+        results = [None] * len(calls)
+        
+        # Serve what we can from the cache and only send the misses
+        cache_keys = [self._cache_lookup_key(tool_name, params) for tool_name, params in calls]
+        missing = []
+        for index, cache_key in enumerate(cache_keys):
+            try:
+                self._validate(*calls[index])
+            except MCPCallError as e:
+                # Rejected locally; never sent
+                results[index] = e
+                continue
+            if cache_key is not None:
+                hit, value = self.cache.get(cache_key)
+                if hit:
+                    results[index] = value
+                    continue
+            missing.append(index)
+        
+        if not return_exceptions:
+            # Fail fast: nothing is sent if any call was rejected locally
+            for result in results:
+                if isinstance(result, MCPCallError):
+                    raise result
+        
+        if missing:
+            # Identical idempotent calls in the batch are sent once
+            unique, duplicates = [], {}
+            first_by_key = {}
+            for index in missing:
+                tool_name, params = calls[index]
+                if is_write_tool(tool_name):
+                    unique.append(index)
+                    continue
+                key = cache_keys[index] or make_key(self.server_instance_id, tool_name, params, auth_token=self.auth_token)
+                if key in first_by_key:
+                    duplicates[index] = first_by_key[key]
+                    record_coalesced()
+                else:
+                    first_by_key[key] = index
+                    unique.append(index)
+            
+            fetched = self._call_many_uncached([calls[index] for index in unique])
+            for index, result in zip(unique, fetched):
+                results[index] = result
+                if not isinstance(result, MCPCallError):
+                    self._cache_store(cache_keys[index], calls[index][0], result)
+            for index, first in duplicates.items():
+                results[index] = copy_result(results[first])
+        
+        if not return_exceptions:
+            for result in results:
+                if isinstance(result, MCPCallError):
+                    raise result
+        return results
+    
+    def _call_many_uncached(self, calls):
+        results = []
+        for start in range(0, len(calls), MAX_BATCH_SIZE):
+            results.extend(self._call_batch(calls[start:start + MAX_BATCH_SIZE]))
+        return results
+    
+    def _call_batch(self, calls):
         url = f"{self.base_url}/api/mcp/call"
-        payload = {
+        batch = []
+        for index, (tool_name, params) in enumerate(calls):
+            item = self._build_payload(tool_name, params)
+            item["id"] = index
+            batch.append(item)
+        
+        def send(timeout):
+            return self.transport.post_json(
+                url, batch, headers=self._headers(), timeout=timeout, label=f"batch[{len(batch)}]"
+            )
+        
+        # The batch is retried as a whole, so only when every call in it is idempotent
+        idempotent = not any(is_write_tool(tool_name) for tool_name, _ in calls)
+        data = self._send_with_policy(send, "tools/call batch", idempotent, "Failed to call MCP tools")
+        
+        if isinstance(data, dict) and 'error' in data:
+            raise MCPCallError(f"MCP batch call failed: {data['error']}")
+        if not isinstance(data, list) or len(data) != len(calls):
+            raise MCPCallError("MCP batch call failed: malformed batch response")
+        
+        results = [None] * len(calls)
+        for position, item in enumerate(data):
+            index = item.get('id', position) if isinstance(item, dict) else position
+            if not isinstance(index, int) or not 0 <= index < len(calls):
+                index = position
+            tool_name = calls[index][0]
+            if not isinstance(item, dict):
+                results[index] = MCPCallError(f"MCP call to {tool_name} failed: malformed batch item")
+            elif 'error' in item:
+                results[index] = MCPCallError(f"MCP call to {tool_name} failed: {item['error']}", item.get('status'))
+            else:
+                results[index] = _extract_result(item.get('result', {}))
+        return results
+    
+    def _cache_lookup_key(self, tool_name, params):
+        """Return the cache key for a cacheable call, or None when the cache is not used"""
+        if self.cache is None:
+            return None
+        if not self.cache.is_cacheable(tool_name):
+            self.cache.record_bypass()
+            return None
+        return make_key(self.server_instance_id, tool_name, params, auth_token=self.auth_token)
+    
+    def _cache_store(self, cache_key, tool_name, result):
+        if self.cache is None:
+            return
+        if cache_key is not None:
+            self.cache.set(cache_key, tool_name, result, self.server_instance_id)
+        elif is_write_tool(tool_name):
+            # A write may change what cached reads would return
+            self.cache.invalidate(self.server_instance_id)
+    
+    def _build_payload(self, tool_name, params):
+        """Build the /api/mcp/call payload for a tools/call request"""
+        return {
             "server_instance_id": self.server_instance_id,
             "method": "tools/call",
             "params": {
@@ -86,107 +385,89 @@ class MCP:
                 "arguments": params or {}
             }
         }
-        
-        # #region agent log
-        try:
-            import json
-            log_data = json.dumps({"location":"mcp.py:77","message":"Making MCP call","data":{"serverInstanceId":self.server_instance_id,"method":"tools/call","toolName":tool_name,"baseUrl":self.base_url},"timestamp":int(__import__('time').time()*1000),"sessionId":"debug-session","runId":"run1","hypothesisId":"C"})
-            with open(r'c:\Users\senti\OneDrive\Desktop\project-nexus\project-nexus-main\.cursor\debug.log', 'a') as f:
-                f.write(log_data + '\n')
-        except:
-            pass
-        # #endregion
-        
-        headers = {
-            "Content-Type": "application/json",
-        }
+    
+    def _headers(self):
+        headers = {}
         if self.auth_token:
             headers["Authorization"] = f"Bearer {self.auth_token}"
+        return headers
 
-        try:
-            if HAS_REQUESTS:
-                response = requests.post(url, json=payload, headers=headers, timeout=30)
-                response.raise_for_status()
-                data = response.json()
-            else:
-                # Fallback to urllib
-                req_data = json.dumps(payload).encode('utf-8')
-                req = urllib.request.Request(url, data=req_data, headers=headers)
-                try:
-                    with urllib.request.urlopen(req, timeout=30) as response:
-                        data = json.loads(response.read().decode('utf-8'))
-                except urllib.error.HTTPError as e:
-                    # Try to read error response body
-                    error_body = ""
-                    try:
-                        error_body = e.read().decode('utf-8')
-                        error_data = json.loads(error_body)
-                        error_msg = error_data.get('error', str(e))
-                    except:
-                        error_msg = f"HTTP Error {e.code}: {e.reason}"
-                    raise MCPCallError(f"Failed to call MCP tool: {error_msg}")
-            
-            if 'error' in data:
-                raise MCPCallError(f"MCP call failed: {data['error']}")
-            
-            result = data.get('result', {})
-            # MCP tools/call returns result with content field
-            # Ensure we return a JSON-serializable value
-            if isinstance(result, dict):
-                # Extract content - could be text or array of content items
-                if 'content' in result:
-                    content = result['content']
-                    if isinstance(content, list) and len(content) > 0:
-                        # Extract text from all content items
-                        texts = []
-                        for item in content:
-                            if isinstance(item, dict):
-                                # MCP content items can have 'type' and 'text' fields
-                                if 'text' in item:
-                                    texts.append(item['text'])
-                                elif item.get('type') == 'text' and 'text' in item:
-                                    texts.append(item['text'])
-                                else:
-                                    # If no text field, include the whole item as JSON string
-                                    try:
-                                        texts.append(json.dumps(item))
-                                    except:
-                                        texts.append(str(item))
-                            elif isinstance(item, str):
-                                texts.append(item)
-                        
-                        # Return joined text if multiple items, or single item if one
-                        if len(texts) == 1:
-                            return texts[0]
-                        elif len(texts) > 1:
-                            return "\n\n".join(texts)
+
+def _extract_result(result):
+    """
+    Flatten a tools/call result into a JSON-serializable value
+    
+    Text content items are returned as a string (joined when there are several);
+    other results are returned as-is.
+    """
+    # MCP tools/call returns result with content field
+    # Ensure we return a JSON-serializable value
+    if isinstance(result, dict):
+        # Extract content - could be text or array of content items
+        if 'content' in result:
+            content = result['content']
+            if isinstance(content, list) and len(content) > 0:
+                # Extract text from all content items
+                texts = []
+                for item in content:
+                    if isinstance(item, dict):
+                        # MCP content items can have 'type' and 'text' fields
+                        if 'text' in item:
+                            texts.append(item['text'])
+                        elif item.get('type') == 'text' and 'text' in item:
+                            texts.append(item['text'])
                         else:
-                            # No text found, return the content list as-is (should be serializable)
-                            return content
-                    elif isinstance(content, str):
-                        return content
-                # If no content field, return the whole result (should be serializable)
-                return result
-            # For non-dict results, return as-is (should be serializable)
-            return result
-        except Exception as e:
-            if isinstance(e, MCPCallError):
-                raise
-            raise MCPCallError(f"Failed to call MCP tool: {str(e)}")
+                            # If no text field, include the whole item as JSON string
+                            try:
+                                texts.append(codec.dumps(item))
+                            except:
+                                texts.append(str(item))
+                    elif isinstance(item, str):
+                        texts.append(item)
+                
+                # Return joined text if multiple items, or single item if one
+                if len(texts) == 1:
+                    return texts[0]
+                elif len(texts) > 1:
+                    return "\n\n".join(texts)
+                else:
+                    # No text found, return the content list as-is (should be serializable)
+                    return content
+            elif isinstance(content, str):
+                return content
+        # If no content field, return the whole result (should be serializable)
+        return result
+    # For non-dict results, return as-is (should be serializable)
+    return result
 
 
 # Create a singleton instance for convenience
 _mcp_instance = None
 
-def get_mcp(base_url=None, server_instance_id=None):
-    """Get or create the MCP singleton instance"""
+def get_mcp(base_url=None, server_instance_id=None, auth_token=None):
+    """
+    Get or create the MCP singleton instance
+    
+    Explicit arguments that differ from the singleton's settings rebind it
+    (see MCP.rebind) instead of being ignored.
+    """
     global _mcp_instance
     if _mcp_instance is None:
-        _mcp_instance = MCP(base_url, server_instance_id)
+        _mcp_instance = MCP(base_url, server_instance_id, auth_token)
+    elif (
+        (base_url and base_url != _mcp_instance.base_url)
+        or (server_instance_id and server_instance_id != _mcp_instance.server_instance_id)
+        or (auth_token and auth_token != _mcp_instance.auth_token)
+    ):
+        _mcp_instance.rebind(
+            base_url or _mcp_instance.base_url,
+            server_instance_id or _mcp_instance.server_instance_id,
+            auth_token or _mcp_instance.auth_token,
+        )
     return _mcp_instance
 
 # Convenience function
-def call(tool_name, params=None):
+def call(tool_name, params=None, raw=False):
     """Convenience function to call an MCP tool"""
     mcp = get_mcp()
-    return mcp.call(tool_name, params)
+    return mcp.call(tool_name, params, raw=raw)
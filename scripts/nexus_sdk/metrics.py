@@ -0,0 +1,92 @@
+"""
+Per-execution call metrics for the Project Nexus sandbox
+The transport reports every Nexus API round trip here while a recorder is active
+"""
+
+import threading
+
+DEFAULT_MAX_CALLS = 1000
+
+
+class CallRecorder:
+    """
+    Collects one record per HTTP round trip
+
+    Records are (tool, latency, request/response bytes, status). At most
+    `max_calls` records are kept; the rest are only counted. Calls that were
+    coalesced into an identical in-flight request are counted separately.
+    """
+
+    def __init__(self, max_calls=DEFAULT_MAX_CALLS):
+        self.max_calls = max_calls
+        self.calls = []
+        self.dropped = 0
+        self.coalesced = 0
+        self._lock = threading.Lock()
+
+    def record(self, tool, latency, request_bytes, response_bytes, status):
+        """
+        Record a finished round trip
+
+        Args:
+            tool: Tool or method name the request was for
+            latency: Wall time in seconds
+            request_bytes: Size of the request body
+            response_bytes: Size of the response body (0 if none was received)
+            status: HTTP status code, or "error" when no response was received
+        """
+        with self._lock:
+            if len(self.calls) >= self.max_calls:
+                self.dropped += 1
+                return
+            self.calls.append({
+                "tool": tool,
+                "latency_ms": round(latency * 1000, 3),
+                "request_bytes": request_bytes,
+                "response_bytes": response_bytes,
+                "status": status,
+            })
+
+    def record_coalesced(self):
+        """Count a call that shared another call's in-flight request"""
+        with self._lock:
+            self.coalesced += 1
+
+    def summary(self):
+        """Return the recorded calls and aggregate totals"""
+        with self._lock:
+            return {
+                "tool_calls": list(self.calls),
+                "tool_calls_dropped": self.dropped,
+                "tool_call_count": len(self.calls) + self.dropped,
+                "tool_time_ms": round(sum((call["latency_ms"] for call in self.calls), 0.0), 3),
+                "coalesced_calls": self.coalesced,
+            }
+
+
+# One recorder per process; the sandbox runs one job at a time
+_active_recorder = None
+
+def start_recording(max_calls=DEFAULT_MAX_CALLS):
+    """Start recording calls for the current execution and return the recorder"""
+    global _active_recorder
+    _active_recorder = CallRecorder(max_calls)
+    return _active_recorder
+
+def stop_recording():
+    """Stop recording and return the recorder that was active (or None)"""
+    global _active_recorder
+    recorder, _active_recorder = _active_recorder, None
+    return recorder
+
+def record_call(tool, latency, request_bytes, response_bytes, status):
+    """Record a call on the active recorder, if any"""
+    recorder = _active_recorder
+    if recorder is not None:
+        recorder.record(tool, latency, request_bytes, response_bytes, status)
+
+def record_coalesced():
+    """Count a coalesced call on the active recorder, if any"""
+    recorder = _active_recorder
+    if recorder is not None:
+        recorder.record_coalesced()
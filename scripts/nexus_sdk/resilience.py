@@ -0,0 +1,287 @@
+"""
+Deadlines, retries and circuit breaking for MCP calls
+Keeps a flaky or restarting MCP server from eating the sandbox's execution
+time budget: calls are bounded by the time left, idempotent calls are
+retried with jittered backoff, and a tool that keeps failing is
+short-circuited for a while
+"""
+
+import os
+import random
+import threading
+import time
+
+from .errors import CircuitOpenError, MCPCancelledError, MCPTimeoutError, MCPUpstreamError, classify
+
+DEFAULT_RETRY_ATTEMPTS = 3
+DEFAULT_RETRY_BASE_DELAY = 0.2
+DEFAULT_RETRY_MAX_DELAY = 2.0
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_RESET_TIMEOUT = 30.0
+
+# Set when the sandbox stops an execution; pending calls and backoffs end at once
+_cancelled = threading.Event()
+
+
+def _env_float(name, default):
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def remaining_budget():
+    """
+    Seconds left in the execution time budget, or None if there is no budget
+
+    The sandbox sets NEXUS_DEADLINE (a Unix timestamp) when a job starts.
+    """
+    deadline = os.environ.get("NEXUS_DEADLINE")
+    if not deadline:
+        return None
+    try:
+        return float(deadline) - time.time()
+    except ValueError:
+        return None
+
+
+def call_timeout(timeout):
+    """
+    Clamp a per-call timeout to the remaining execution budget
+
+    Raises:
+        MCPTimeoutError: If the budget is already used up
+    """
+    remaining = remaining_budget()
+    if remaining is None:
+        return timeout
+    if remaining <= 0:
+        raise MCPTimeoutError("Execution time budget exhausted", retryable=False)
+    return min(timeout, remaining)
+
+
+def cancel_calls():
+    """
+    Cancel every MCP call in this process
+    
+    New calls and retries fail with MCPCancelledError, backoff sleeps end at
+    once and in-flight requests on the shared transport are aborted. Stays
+    in effect until reset_cancellation().
+    """
+    _cancelled.set()
+    from .transport import abort_in_flight
+    abort_in_flight()
+
+
+def reset_cancellation():
+    """Allow calls again after cancel_calls()"""
+    _cancelled.clear()
+
+
+def check_cancelled():
+    """
+    Raises:
+        MCPCancelledError: If calls have been cancelled
+    """
+    if _cancelled.is_set():
+        raise MCPCancelledError("MCP call cancelled: execution stopped")
+
+
+class RetryPolicy:
+    """
+    Exponential backoff with full jitter
+
+    Delays are drawn uniformly from [0, min(max_delay, base_delay * 2 ** (retry - 1))).
+    """
+
+    def __init__(self, max_attempts=None, base_delay=None, max_delay=None):
+        """
+        Initialize retry policy
+
+        Args:
+            max_attempts: Attempts per call, including the first
+                (defaults to NEXUS_RETRY_ATTEMPTS or 3; 1 disables retries)
+            base_delay: First backoff ceiling in seconds (defaults to NEXUS_RETRY_BASE_DELAY or 0.2)
+            max_delay: Backoff ceiling in seconds (defaults to NEXUS_RETRY_MAX_DELAY or 2.0)
+        """
+        self.max_attempts = max_attempts or int(_env_float("NEXUS_RETRY_ATTEMPTS", DEFAULT_RETRY_ATTEMPTS))
+        self.base_delay = base_delay if base_delay is not None else _env_float(
+            "NEXUS_RETRY_BASE_DELAY", DEFAULT_RETRY_BASE_DELAY
+        )
+        self.max_delay = max_delay if max_delay is not None else _env_float(
+            "NEXUS_RETRY_MAX_DELAY", DEFAULT_RETRY_MAX_DELAY
+        )
+
+    def delay(self, retry):
+        """Backoff before retry number `retry` (1 for the first retry)"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (retry - 1)))
+
+
+class CircuitBreaker:
+    """
+    Per-key circuit breaker (keys are (server_instance_id, tool_name))
+
+    After `failure_threshold` consecutive outages (no response, 502/503/504)
+    or timeouts the circuit opens and calls fail immediately with CircuitOpenError. After
+    `reset_timeout` seconds one trial call is let through; success closes
+    the circuit, failure opens it again.
+    """
+
+    def __init__(self, failure_threshold=None, reset_timeout=None):
+        """
+        Initialize circuit breaker
+
+        Args:
+            failure_threshold: Consecutive failures that open a circuit
+                (defaults to NEXUS_BREAKER_THRESHOLD or 5)
+            reset_timeout: Seconds a circuit stays open before a trial call
+                (defaults to NEXUS_BREAKER_RESET or 30)
+        """
+        self.failure_threshold = failure_threshold or int(
+            _env_float("NEXUS_BREAKER_THRESHOLD", DEFAULT_FAILURE_THRESHOLD)
+        )
+        self.reset_timeout = reset_timeout if reset_timeout is not None else _env_float(
+            "NEXUS_BREAKER_RESET", DEFAULT_RESET_TIMEOUT
+        )
+        # key -> [consecutive failures, opened at (or None), trial in flight]
+        self._circuits = {}
+        self._lock = threading.Lock()
+
+    def before_call(self, key):
+        """
+        Check that a call may go ahead
+
+        Raises:
+            CircuitOpenError: If the circuit is open
+        """
+        with self._lock:
+            circuit = self._circuits.get(key)
+            if circuit is None or circuit[1] is None:
+                return
+            waited = time.monotonic() - circuit[1]
+            if waited >= self.reset_timeout and not circuit[2]:
+                circuit[2] = True
+                return
+        retry_in = max(0.0, self.reset_timeout - waited)
+        raise CircuitOpenError(
+            f"Circuit open for {key[1]} after {circuit[0]} consecutive failures; "
+            f"next trial in {retry_in:.1f}s"
+        )
+
+    def record_success(self, key):
+        """Close the circuit for key"""
+        with self._lock:
+            self._circuits.pop(key, None)
+
+    def record_failure(self, key):
+        """Count a failure for key, opening the circuit at the threshold"""
+        with self._lock:
+            circuit = self._circuits.setdefault(key, [0, None, False])
+            circuit[0] += 1
+            circuit[2] = False
+            if circuit[0] >= self.failure_threshold:
+                circuit[1] = time.monotonic()
+
+    def state(self, key):
+        """Return "closed", "open" or "half-open" for key"""
+        with self._lock:
+            circuit = self._circuits.get(key)
+            if circuit is None or circuit[1] is None:
+                return "closed"
+            if circuit[2] or time.monotonic() - circuit[1] >= self.reset_timeout:
+                return "half-open"
+            return "open"
+
+    def reset(self):
+        """Close every circuit"""
+        with self._lock:
+            self._circuits.clear()
+
+
+# Statuses that mean the proxy or the MCP server is down; a 500 is the server
+# answering (often to bad arguments) and does not count toward opening a circuit
+OUTAGE_STATUSES = (502, 503, 504)
+
+
+def _counts_as_failure(error):
+    if isinstance(error, CircuitOpenError):
+        return False
+    if isinstance(error, MCPTimeoutError):
+        return True
+    # No status: the connection was refused or reset
+    return isinstance(error, MCPUpstreamError) and (error.status is None or error.status in OUTAGE_STATUSES)
+
+
+def call_with_resilience(send, key, timeout, idempotent, error_prefix, policy=None, breaker=None):
+    """
+    Run one logical call with deadline clamping, retries and circuit breaking
+
+    Args:
+        send: Callable taking the attempt timeout in seconds and returning the result
+        key: Circuit key, (server_instance_id, tool_name)
+        timeout: Per-attempt timeout before clamping to the execution budget
+        idempotent: Only idempotent calls are retried
+        error_prefix: Message prefix for typed errors
+        policy: RetryPolicy (defaults to the shared policy)
+        breaker: CircuitBreaker (defaults to the shared breaker)
+
+    Returns:
+        Result of send()
+
+    Raises:
+        MCPCallError: A typed subclass describing the final failure
+    """
+    policy = policy or get_retry_policy()
+    breaker = breaker or get_circuit_breaker()
+    attempt = 1
+    while True:
+        check_cancelled()
+        # An exhausted budget is not the server's fault, so check it before the breaker
+        attempt_timeout = call_timeout(timeout)
+        breaker.before_call(key)
+        try:
+            result = send(attempt_timeout)
+        except Exception as e:
+            if _cancelled.is_set():
+                # Aborted by cancel_calls(), which says nothing about the server
+                raise MCPCancelledError("MCP call cancelled: execution stopped") from e
+            error = classify(e, error_prefix)
+            if _counts_as_failure(error):
+                breaker.record_failure(key)
+            else:
+                # The server answered; whatever went wrong was not an outage
+                breaker.record_success(key)
+            if not (idempotent and error.retryable and attempt < policy.max_attempts):
+                raise error from (None if error is e else e)
+            delay = policy.delay(attempt)
+            remaining = remaining_budget()
+            if remaining is not None and delay >= remaining:
+                raise error from (None if error is e else e)
+            _cancelled.wait(delay)
+            attempt += 1
+            continue
+        breaker.record_success(key)
+        return result
+
+
+_retry_policy = None
+_circuit_breaker = None
+_shared_lock = threading.Lock()
+
+def get_retry_policy():
+    """Get or create the shared RetryPolicy"""
+    global _retry_policy
+    if _retry_policy is None:
+        with _shared_lock:
+            if _retry_policy is None:
+                _retry_policy = RetryPolicy()
+    return _retry_policy
+
+def get_circuit_breaker():
+    """Get or create the shared CircuitBreaker (circuits outlive single executions in a worker)"""
+    global _circuit_breaker
+    if _circuit_breaker is None:
+        with _shared_lock:
+            if _circuit_breaker is None:
+                _circuit_breaker = CircuitBreaker()
+    return _circuit_breaker
@@ -0,0 +1,392 @@
+"""
+Raw MCP tool results for Project Nexus SDK clients
+MCPResult keeps the response bytes as they arrived and only decodes what a
+script actually touches, so large attachments are never copied just to be
+flattened into a string; MCPStream hands out content items and progress
+updates one at a time as the proxy relays them
+"""
+
+import binascii
+import os
+from collections import namedtuple
+
+from . import codec
+
+# Attachments larger than this are decoded to a temp file and mapped, not held in memory
+DEFAULT_SPILL_BYTES = 8 * 1024 * 1024
+
+# Base64 text decoded per step when spilling (a multiple of 4 characters)
+_BASE64_STEP = 4 * 256 * 1024
+
+_save_dir = None
+
+
+def save_dir():
+    """
+    Return the directory ContentItem.save() writes into
+
+    NEXUS_SAVE_DIR when set (the sandbox gives every job its own), else a
+    private temp directory created for this process.
+    """
+    global _save_dir
+    path = os.environ.get("NEXUS_SAVE_DIR")
+    if path:
+        return os.path.realpath(path)
+    if _save_dir is None:
+        import tempfile
+        _save_dir = os.path.realpath(tempfile.mkdtemp(prefix="nexus_save_"))
+    return _save_dir
+
+
+class ContentItem:
+    """
+    One item of a tools/call result's content list
+
+    Text is exposed as-is. Base64 payloads (image/audio `data`, resource
+    `blob`) stay encoded until bytes(), open() or save() is called.
+    """
+
+    __slots__ = ("_item", "_spill_bytes", "_maps")
+
+    def __init__(self, item, spill_bytes=DEFAULT_SPILL_BYTES):
+        self._item = item if isinstance(item, dict) else {"type": "text", "text": str(item)}
+        self._spill_bytes = spill_bytes
+        self._maps = []
+
+    @property
+    def type(self):
+        """Content type, e.g. "text", "image", "audio" or "resource" """
+        return self._item.get("type")
+
+    @property
+    def text(self):
+        """Text of a text item (or text resource), else None"""
+        if "text" in self._item:
+            return self._item["text"]
+        resource = self._item.get("resource")
+        if isinstance(resource, dict):
+            return resource.get("text")
+        return None
+
+    @property
+    def mime_type(self):
+        """MIME type of a binary or resource item, if given"""
+        resource = self._item.get("resource")
+        if isinstance(resource, dict) and "mimeType" in resource:
+            return resource["mimeType"]
+        return self._item.get("mimeType")
+
+    @property
+    def uri(self):
+        """URI of a resource item, else None"""
+        resource = self._item.get("resource")
+        return resource.get("uri") if isinstance(resource, dict) else None
+
+    @property
+    def encoded(self):
+        """The undecoded base64 payload, or None for items without one"""
+        data = self._item.get("data")
+        if data is None:
+            resource = self._item.get("resource")
+            if isinstance(resource, dict):
+                data = resource.get("blob")
+        return data
+
+    @property
+    def size(self):
+        """Decoded size of the base64 payload in bytes, computed without decoding it"""
+        data = self.encoded
+        if not data:
+            return 0
+        return len(data) * 3 // 4 - data[-2:].count("=")
+
+    def bytes(self):
+        """Decode the base64 payload (b"" if there is none)"""
+        data = self.encoded
+        return binascii.a2b_base64(data) if data else b""
+
+    def open(self):
+        """
+        Return the decoded payload as a bytes-like object
+
+        Payloads over the spill threshold are decoded in steps to a temp file
+        and returned as a read-only mmap; smaller ones as a memoryview.
+        """
+        if self.size <= self._spill_bytes:
+            return memoryview(self.bytes())
+        import mmap
+        import tempfile
+
+        with tempfile.TemporaryFile() as f:
+            self._decode_to(f)
+            f.flush()
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._maps.append(mapped)
+        return mapped
+
+    def save(self, path):
+        """
+        Decode the payload straight to a file and return the number of bytes written
+
+        `path` is relative to save_dir(); paths resolving outside it (absolute
+        paths, "..", symlinks) raise ValueError.
+        """
+        base = save_dir()
+        target = os.path.realpath(os.path.join(base, path))
+        if os.path.commonpath([base, target]) != base or target == base:
+            raise ValueError(f"save path {path!r} is outside the save directory {base}")
+        flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_NOFOLLOW", 0) | getattr(os, "O_BINARY", 0)
+        with os.fdopen(os.open(target, flags, 0o600), "wb") as f:
+            return self._decode_to(f)
+
+    def close(self):
+        """Unmap any spilled payloads returned by open()"""
+        maps, self._maps = self._maps, []
+        for mapped in maps:
+            mapped.close()
+
+    def as_dict(self):
+        """The item as decoded from the response"""
+        return self._item
+
+    def _decode_to(self, f):
+        data = self.encoded or ""
+        written = 0
+        for start in range(0, len(data), _BASE64_STEP):
+            chunk = binascii.a2b_base64(data[start:start + _BASE64_STEP])
+            f.write(chunk)
+            written += len(chunk)
+        return written
+
+    def __repr__(self):
+        if self.encoded is not None:
+            return f"<ContentItem {self.type} {self.mime_type or ''} {self.size} bytes>"
+        text = self.text or ""
+        return f"<ContentItem {self.type} {len(text)} chars>"
+
+
+class MCPResult:
+    """
+    Undecoded tools/call response returned by MCP.call(..., raw=True)
+
+    The response body is held as a memoryview and decoded on first access to
+    anything inside it; content items are wrapped only when touched.
+
+    Usage:
+        result = mcp.call("gmail_get_attachment", {...}, raw=True)
+        print(result.nbytes)
+        for item in result:
+            if item.type == "image":
+                item.save("image.png")  # written under save_dir()
+    """
+
+    def __init__(self, data, spill_bytes=None):
+        """
+        Initialize MCPResult
+
+        Args:
+            data: Response body bytes
+            spill_bytes: Attachment size above which open() spills to a temp file
+                (defaults to NEXUS_SPILL_BYTES or 8 MiB)
+        """
+        self.buffer = memoryview(data)
+        self.spill_bytes = spill_bytes or int(os.environ.get("NEXUS_SPILL_BYTES", DEFAULT_SPILL_BYTES))
+        self._result = None
+        self._items = None
+
+    @property
+    def nbytes(self):
+        """Size of the undecoded response body"""
+        return self.buffer.nbytes
+
+    @property
+    def result(self):
+        """The decoded tools/call result (decoded on first access)"""
+        if self._result is None:
+            from .mcp import MCPCallError
+            try:
+                data = codec.loads(self.buffer)
+            except ValueError as e:
+                raise MCPCallError(f"Failed to call MCP tool: Invalid JSON response: {e}")
+            if isinstance(data, dict) and "error" in data:
+                raise MCPCallError(f"MCP call failed: {data['error']}")
+            result = data.get("result", {}) if isinstance(data, dict) else data
+            self._result = result if result is not None else {}
+        return self._result
+
+    @property
+    def is_error(self):
+        """True if the tool reported an error result"""
+        return isinstance(self.result, dict) and bool(self.result.get("isError"))
+
+    @property
+    def items(self):
+        """Content items, wrapped lazily"""
+        if self._items is None:
+            content = self.result.get("content") if isinstance(self.result, dict) else None
+            if isinstance(content, str):
+                content = [content]
+            self._items = [None] * len(content) if isinstance(content, list) else []
+        return self._items
+
+    def __len__(self):
+        return len(self.items)
+
+    def __getitem__(self, index):
+        items = self.items
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(items)))]
+        item = items[index]
+        if item is None:
+            content = self.result["content"]
+            raw_item = content if isinstance(content, str) else content[index]
+            item = items[index] = ContentItem(raw_item, self.spill_bytes)
+        return item
+
+    def __iter__(self):
+        for index in range(len(self.items)):
+            yield self[index]
+
+    @property
+    def text(self):
+        """Text items joined the way MCP.call() joins them"""
+        texts = [item.text for item in self if item.text is not None]
+        return texts[0] if len(texts) == 1 else "\n\n".join(texts)
+
+    def value(self):
+        """The flattened value MCP.call() would have returned without raw=True"""
+        from .mcp import _extract_result
+        return _extract_result(self.result)
+
+    def close(self):
+        """Release the response buffer and any spilled attachments"""
+        for item in self._items or ():
+            if item is not None:
+                item.close()
+        self.buffer.release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __repr__(self):
+        return f"<MCPResult {self.nbytes} bytes>"
+
+
+ProgressUpdate = namedtuple("ProgressUpdate", ["progress", "total", "message"])
+ProgressUpdate.__doc__ = """A notifications/progress update of a streamed call; total and message may be None"""
+
+
+class MCPStream:
+    """
+    Streamed tools/call output returned by MCP.call_stream()
+
+    Iterating yields ProgressUpdate objects while the tool runs, then its
+    ContentItem objects once it has finished; only the current one is held
+    in memory. Stopping early (break, close()
+    or leaving a with block) drops the connection. Once the stream is
+    exhausted, `result` holds the non-content fields of the tool result
+    (e.g. isError, structuredContent).
+
+    Usage:
+        with mcp.call_stream("export_document", {"id": doc_id}) as stream:
+            for event in stream:
+                if isinstance(event, ProgressUpdate):
+                    print(f"{event.progress}/{event.total}")
+                elif event.text and "TODO" in event.text:
+                    break
+    """
+
+    def __init__(self, response, tool_name, spill_bytes=None):
+        """
+        Initialize MCPStream
+
+        Args:
+            response: Open StreamingResponse of the call
+            tool_name: Tool name used in error messages
+            spill_bytes: Attachment size above which ContentItem.open() spills to a temp file
+        """
+        self.tool_name = tool_name
+        self.spill_bytes = spill_bytes or int(os.environ.get("NEXUS_SPILL_BYTES", DEFAULT_SPILL_BYTES))
+        self.result = None
+        self._response = response
+        self._events = self._read(response)
+
+    @property
+    def is_error(self):
+        """True if the tool reported an error result (known once the stream is exhausted)"""
+        return isinstance(self.result, dict) and bool(self.result.get("isError"))
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._events)
+
+    def _read(self, response):
+        from .errors import MCPCallError, MCPTimeoutError, classify
+        from .resilience import check_cancelled, remaining_budget
+        from .transport import iter_sse
+
+        try:
+            if response.content_type != "text/event-stream":
+                # The proxy answered with a plain JSON body
+                yield from self._read_json(response.read())
+                return
+            for event, data in iter_sse(response.lines()):
+                check_cancelled()
+                remaining = remaining_budget()
+                if remaining is not None and remaining <= 0:
+                    raise MCPTimeoutError("Execution time budget exhausted", retryable=False)
+                if event == "progress":
+                    update = codec.loads(data)
+                    yield ProgressUpdate(update.get("progress"), update.get("total"), update.get("message"))
+                elif event == "content":
+                    yield ContentItem(codec.loads(data), self.spill_bytes)
+                elif event == "result":
+                    self.result = codec.loads(data)
+                elif event == "error":
+                    error = codec.loads(data)
+                    message, status = (error.get("error"), error.get("status")) if isinstance(error, dict) else (error, None)
+                    raise MCPCallError(f"MCP call to {self.tool_name} failed: {message}", status)
+            if self.result is None:
+                raise MCPCallError(f"MCP call to {self.tool_name} failed: stream ended before the result")
+        except MCPCallError:
+            raise
+        except Exception as e:
+            check_cancelled()
+            raise classify(e, f"MCP stream from {self.tool_name} failed") from e
+        finally:
+            response.close()
+
+    def _read_json(self, data):
+        from .errors import MCPCallError
+
+        try:
+            data = codec.loads(data)
+        except ValueError as e:
+            raise MCPCallError(f"Failed to call MCP tool: Invalid JSON response: {e}")
+        if isinstance(data, dict) and "error" in data:
+            raise MCPCallError(f"MCP call failed: {data['error']}")
+        result = data.get("result") if isinstance(data, dict) else data
+        result = result if isinstance(result, dict) else {"content": result}
+        content = result.get("content")
+        self.result = {key: value for key, value in result.items() if key != "content"}
+        for item in content if isinstance(content, list) else [] if content is None else [content]:
+            yield ContentItem(item, self.spill_bytes)
+
+    def close(self):
+        """Stop reading and release the connection"""
+        self._events.close()
+        self._response.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __repr__(self):
+        return f"<MCPStream {self.tool_name}{' done' if self.result is not None else ''}>"
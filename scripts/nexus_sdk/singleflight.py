@@ -0,0 +1,108 @@
+"""
+Request coalescing for Project Nexus SDK clients
+Identical idempotent calls that are in flight at the same time share one
+HTTP request; every caller gets the result of that request
+"""
+
+import copy
+import threading
+
+from .metrics import record_coalesced
+
+_IMMUTABLE_TYPES = (str, bytes, int, float, bool, type(None))
+
+
+def copy_result(value):
+    """Give a waiter its own copy so callers can't mutate each other's results"""
+    if isinstance(value, _IMMUTABLE_TYPES):
+        return value
+    return copy.deepcopy(value)
+
+
+class _Flight:
+    __slots__ = ("done", "result", "error", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key
+
+    The first caller for a key (the leader) runs the call; callers arriving
+    while it is in flight block until it finishes and receive a copy of its
+    result, or the same exception. Nothing is remembered once the call
+    finishes, so this never serves stale data.
+
+    Usage:
+        flights = SingleFlight()
+        result = flights.do(key, lambda: transport.post_json(url, payload))
+    """
+
+    def __init__(self):
+        self.saved = 0
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        """
+        Run fn() unless an identical call is already in flight, then share its outcome
+
+        Args:
+            key: Hashable call identity (tool and canonical arguments)
+            fn: Zero-argument callable performing the call
+
+        Returns:
+            Result of fn() (each caller gets its own copy when a flight was shared)
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = self._flights[key] = _Flight()
+                leader = True
+            else:
+                flight.waiters += 1
+                self.saved += 1
+                leader = False
+
+        if not leader:
+            record_coalesced()
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return copy_result(flight.result)
+
+        try:
+            flight.result = fn()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+                shared = flight.waiters > 0
+            flight.done.set()
+        # Waiters copy flight.result, so the leader can't hand out that same object
+        return copy_result(flight.result) if shared else flight.result
+
+    def in_flight(self):
+        """Number of distinct calls currently in flight"""
+        with self._lock:
+            return len(self._flights)
+
+
+_single_flight = None
+_single_flight_lock = threading.Lock()
+
+def get_single_flight():
+    """Get or create the shared SingleFlight instance (shared by every client in the process)"""
+    global _single_flight
+    if _single_flight is None:
+        with _single_flight_lock:
+            if _single_flight is None:
+                _single_flight = SingleFlight()
+    return _single_flight
@@ -0,0 +1,200 @@
+"""
+Structured tracing hook for Project Nexus SDK clients
+Tracing is off by default. When NEXUS_TRACE is set, sampled trace events are
+buffered in memory and written as JSON lines by a background thread, so a
+tool call never waits on trace I/O
+"""
+
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+
+DEFAULT_TRACE_FILE = "nexus_sdk_trace.jsonl"
+DEFAULT_FLUSH_INTERVAL = 1.0
+DEFAULT_MAX_BUFFERED = 10000
+
+_DISABLED_VALUES = ("", "0", "false", "no", "off")
+_ENABLED_VALUES = ("1", "true", "yes", "on")
+
+
+class TraceWriter:
+    """
+    Buffers trace events and hands them to a sink from a daemon thread
+
+    The sink is a file path (events are appended as JSON lines), "stderr",
+    or a callable that receives each event dict. Events over `max_buffered`
+    are dropped and counted instead of blocking the caller.
+
+    Usage:
+        from nexus_sdk import tracing
+
+        tracing.configure(sink=lambda event: print(event), sample_rate=0.1)
+    """
+
+    def __init__(self, sink, sample_rate=1.0, flush_interval=DEFAULT_FLUSH_INTERVAL,
+                 max_buffered=DEFAULT_MAX_BUFFERED):
+        """
+        Initialize trace writer
+
+        Args:
+            sink: File path, "stderr", or a callable taking one event dict
+            sample_rate: Fraction of events to keep, from 0.0 to 1.0
+            flush_interval: Seconds between background flushes
+            max_buffered: Maximum number of events waiting to be written
+        """
+        import random
+
+        self.sink = sink
+        self.sample_rate = max(0.0, min(1.0, float(sample_rate)))
+        self.flush_interval = flush_interval
+        self.max_buffered = max_buffered
+        self.dropped = 0
+
+        self._random = random.random
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="nexus-sdk-trace", daemon=True)
+        self._thread.start()
+
+    def emit(self, event, fields):
+        """Queue an event if it is sampled; never blocks on I/O"""
+        if self.sample_rate < 1.0 and self._random() >= self.sample_rate:
+            return
+        record = {"ts": time.time(), "event": event, "pid": os.getpid()}
+        record.update(fields)
+        with self._lock:
+            if len(self._buffer) >= self.max_buffered:
+                self.dropped += 1
+                return
+            self._buffer.append(record)
+
+    def flush(self):
+        """Write every buffered event now"""
+        with self._lock:
+            records, self._buffer = self._buffer, []
+            dropped, self.dropped = self.dropped, 0
+        if dropped:
+            records.append({"ts": time.time(), "event": "trace.dropped", "pid": os.getpid(), "count": dropped})
+        if not records:
+            return
+        with self._write_lock:
+            try:
+                self._write(records)
+            except Exception:
+                # Tracing must never break the caller
+                pass
+
+    def close(self):
+        """Stop the background thread and write what is left"""
+        self._closed = True
+        self._wakeup.set()
+        if self._thread is not threading.current_thread():
+            self._thread.join(timeout=self.flush_interval + 1)
+        self.flush()
+
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self.flush()
+
+    def _write(self, records):
+        if callable(self.sink):
+            for record in records:
+                self.sink(record)
+            return
+        lines = "".join(json.dumps(record, default=str) + "\n" for record in records)
+        if self.sink == "stderr":
+            # The real stderr, not a sandbox capture buffer
+            stream = sys.__stderr__
+            stream.write(lines)
+            stream.flush()
+            return
+        with open(self.sink, "a", encoding="utf-8") as f:
+            f.write(lines)
+
+
+_writer = None
+_configured = False
+_config_lock = threading.Lock()
+
+def _sink_from_environment():
+    """Return the sink named by NEXUS_TRACE, or None when tracing is off"""
+    value = os.environ.get("NEXUS_TRACE", "").strip()
+    if value.lower() in _DISABLED_VALUES:
+        return None
+    if value.lower() in _ENABLED_VALUES:
+        import tempfile
+        return os.path.join(tempfile.gettempdir(), DEFAULT_TRACE_FILE)
+    return value
+
+def _sample_rate_from_environment():
+    try:
+        return float(os.environ.get("NEXUS_TRACE_SAMPLE", 1.0))
+    except ValueError:
+        return 1.0
+
+def configure(sink=None, sample_rate=None):
+    """
+    Configure tracing, replacing any active writer
+
+    Args:
+        sink: File path, "stderr", or a callable taking one event dict;
+            None follows NEXUS_TRACE and False turns tracing off
+        sample_rate: Fraction of events to keep (defaults to NEXUS_TRACE_SAMPLE or 1.0)
+
+    Returns:
+        The active TraceWriter, or None when tracing is off
+
+    NEXUS_TRACE accepts "1"/"true" (append to nexus_sdk_trace.jsonl in the temp
+    dir), "stderr", or a file path.
+    """
+    global _writer, _configured
+    with _config_lock:
+        if _writer is not None:
+            _writer.close()
+            _writer = None
+        if sink is None:
+            sink = _sink_from_environment()
+        if sample_rate is None:
+            sample_rate = _sample_rate_from_environment()
+        if sink and sample_rate > 0:
+            _writer = TraceWriter(sink, sample_rate)
+        _configured = True
+        return _writer
+
+def get_trace_writer():
+    """Return the active TraceWriter, configuring from the environment on first use"""
+    if not _configured:
+        configure()
+    return _writer
+
+def trace(event, **fields):
+    """
+    Record a trace event
+
+    A no-op unless tracing is enabled; sampled-out events cost one random draw.
+
+    Args:
+        event: Event name, e.g. "http.request"
+        **fields: JSON-serializable event fields
+    """
+    writer = _writer if _configured else get_trace_writer()
+    if writer is not None:
+        writer.emit(event, fields)
+
+def flush():
+    """Write buffered trace events now"""
+    if _writer is not None:
+        _writer.flush()
+
+def _shutdown():
+    if _writer is not None:
+        _writer.close()
+
+atexit.register(_shutdown)
@@ -0,0 +1,539 @@
+"""
+HTTP transport for Project Nexus SDK clients
+Keeps pooled keep-alive connections to the Nexus API so repeated MCP calls
+from one sandbox reuse TCP (and TLS) connections instead of reconnecting
+"""
+
+import importlib.util
+import os
+import threading
+import time
+
+from . import codec
+from .metrics import record_call
+from .tracing import trace
+
+# requests is preferred when installed, with http.client as the fallback.
+# The backend is only imported when the first Transport is created.
+HAS_REQUESTS = importlib.util.find_spec('requests') is not None
+requests = None
+HTTPAdapter = None
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_TIMEOUT = 30
+
+# Calls per batch request; the proxy (app/api/mcp/call) rejects larger batches
+MAX_BATCH_SIZE = 100
+
+
+def load_backend():
+    """Import the HTTP backend (requests, or http.client as fallback)"""
+    global HAS_REQUESTS, requests, HTTPAdapter
+    if HAS_REQUESTS and requests is None:
+        try:
+            import requests as requests_module
+            from requests.adapters import HTTPAdapter as adapter_class
+            requests, HTTPAdapter = requests_module, adapter_class
+        except ImportError:
+            HAS_REQUESTS = False
+    if not HAS_REQUESTS:
+        import http.client  # noqa: F401
+        import urllib.parse  # noqa: F401
+
+
+class TransportError(Exception):
+    """
+    Exception raised when an HTTP request to the Nexus API fails
+
+    `status` is None when no response was received; `timeout` is True when
+    the request timed out.
+    """
+
+    def __init__(self, message, status=None, timeout=False):
+        super().__init__(message)
+        self.status = status
+        self.timeout = timeout
+
+
+def _error_message(status, reason, body):
+    """Extract the Nexus error message from an error response body if there is one"""
+    try:
+        error_data = codec.loads(body)
+        if isinstance(error_data, dict) and error_data.get('error'):
+            return str(error_data['error'])
+    except (TypeError, ValueError):
+        pass
+    return f"HTTP Error {status}: {reason}"
+
+
+class _ConnectionPool:
+    """
+    Minimal keep-alive connection pool on top of http.client
+
+    Holds up to `maxsize` idle connections per (scheme, host, port).
+    Connections are checked out for exactly one request/response exchange.
+    """
+
+    def __init__(self, maxsize=DEFAULT_POOL_SIZE):
+        self.maxsize = maxsize
+        self._idle = {}
+        self._active = set()
+        # Bumped by abort() so an aborted request isn't retried on a fresh connection
+        self._aborts = 0
+        self._lock = threading.Lock()
+
+    def _new_connection(self, key, timeout):
+        import http.client
+        scheme, host, port = key
+        if scheme == 'https':
+            return http.client.HTTPSConnection(host, port, timeout=timeout)
+        return http.client.HTTPConnection(host, port, timeout=timeout)
+
+    def _checkout(self, key):
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                return idle.pop()
+        return None
+
+    def _checkin(self, key, conn):
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.maxsize:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def request(self, method, url, body, headers, timeout):
+        """
+        Perform a request and return (status, reason, body bytes)
+
+        A reused connection the server already closed is retried once
+        on a fresh connection.
+        """
+        key, conn, response = self.open(method, url, body, headers, timeout)
+        try:
+            data = response.read()
+        except BaseException:
+            # Including sandbox limit signals raised mid-read
+            self.release(key, conn, response, reusable=False)
+            raise
+        self.release(key, conn, response)
+        return response.status, response.reason, data
+
+    def open(self, method, url, body, headers, timeout):
+        """
+        Send a request and return (key, connection, response) once the response headers arrive
+
+        The connection stays checked out until release() is called, so the
+        body can be read incrementally.
+        """
+        import http.client
+        import urllib.parse
+        parts = urllib.parse.urlsplit(url)
+        scheme = parts.scheme or 'http'
+        port = parts.port or (443 if scheme == 'https' else 80)
+        key = (scheme, parts.hostname, port)
+        path = parts.path or '/'
+        if parts.query:
+            path = f"{path}?{parts.query}"
+
+        conn = self._checkout(key)
+        reused = conn is not None
+        aborts = self._aborts
+        while True:
+            if conn is None:
+                conn = self._new_connection(key, timeout)
+            else:
+                conn.timeout = timeout
+                if conn.sock is not None:
+                    conn.sock.settimeout(timeout)
+            with self._lock:
+                self._active.add(conn)
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                return key, conn, conn.getresponse()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                self._discard(conn)
+                if not reused or self._aborts != aborts:
+                    raise
+                conn, reused = None, False
+                continue
+            except BaseException:
+                self._discard(conn)
+                raise
+
+    def release(self, key, conn, response, reusable=True):
+        """Return a connection from open() to the pool, or close it if its response wasn't fully read"""
+        with self._lock:
+            self._active.discard(conn)
+        if reusable and response.isclosed() and not response.will_close:
+            self._checkin(key, conn)
+        else:
+            conn.close()
+
+    def _discard(self, conn):
+        conn.close()
+        with self._lock:
+            self._active.discard(conn)
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for conns in idle.values():
+            for conn in conns:
+                conn.close()
+
+    def abort(self):
+        """Close idle connections and shut down the sockets of requests in flight"""
+        import socket
+        self.close()
+        with self._lock:
+            self._aborts += 1
+            active = list(self._active)
+        for conn in active:
+            sock = conn.sock
+            if sock is not None:
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+
+
+def iter_sse(lines):
+    """
+    Parse Server-Sent Events into (event, data bytes) pairs
+
+    Args:
+        lines: Iterable of byte lines without line endings
+
+    Comment lines (keep-alives) are skipped; events without data are dropped.
+    """
+    event, data = None, []
+    for line in lines:
+        if not line:
+            if data:
+                yield event or "message", b"\n".join(data)
+            event, data = None, []
+            continue
+        if line.startswith(b":"):
+            continue
+        field, _, value = line.partition(b":")
+        if value.startswith(b" "):
+            value = value[1:]
+        if field == b"event":
+            event = value.decode("utf-8", "replace")
+        elif field == b"data":
+            data.append(value)
+    if data:
+        yield event or "message", b"\n".join(data)
+
+
+class StreamingResponse:
+    """
+    A 2xx response whose body is read incrementally
+
+    Returned by Transport.post_stream(). Read it with lines() or read(), then
+    close() it; closing before the body is fully read drops the connection.
+    Metrics are recorded when it is closed.
+    """
+
+    def __init__(self, status, headers, chunks, closer, on_close):
+        self.status = status
+        self.headers = headers
+        self.bytes_read = 0
+        self._chunks = chunks
+        self._closer = closer
+        self._on_close = on_close
+        self._closed = False
+
+    @property
+    def content_type(self):
+        """Media type of the response, without parameters"""
+        return (self.headers.get("Content-Type") or "").split(";")[0].strip().lower()
+
+    def lines(self):
+        """Yield body lines without line endings as they arrive"""
+        # Pieces of the unfinished line; joined once a newline arrives, so a
+        # long line (a large base64 content item) isn't copied per chunk
+        pending = []
+        for chunk in self._chunks:
+            self.bytes_read += len(chunk)
+            pending.append(chunk)
+            if b"\n" not in chunk:
+                continue
+            *complete, rest = b"".join(pending).split(b"\n")
+            pending = [rest] if rest else []
+            for line in complete:
+                yield line[:-1] if line.endswith(b"\r") else line
+        if pending:
+            yield b"".join(pending)
+
+    def read(self):
+        """Read the rest of the body"""
+        data = b"".join(self._chunks)
+        self.bytes_read += len(data)
+        return data
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._closer()
+            self._on_close(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class Transport:
+    """
+    Shared HTTP transport for MCP and GoogleSDK clients
+
+    Uses a pooled requests.Session when requests is installed, otherwise a
+    keep-alive http.client connection pool. Safe to share between threads.
+
+    Usage:
+        from nexus_sdk.transport import get_transport
+
+        data = get_transport().post_json(url, payload, headers={"Authorization": "Bearer ..."})
+    """
+
+    def __init__(self, pool_size=None, timeout=None):
+        """
+        Initialize transport
+
+        Args:
+            pool_size: Maximum pooled connections per host (defaults to NEXUS_HTTP_POOL_SIZE or 10)
+            timeout: Default request timeout in seconds (defaults to NEXUS_HTTP_TIMEOUT or 30)
+        """
+        self.pool_size = pool_size or int(os.environ.get('NEXUS_HTTP_POOL_SIZE', DEFAULT_POOL_SIZE))
+        self.timeout = timeout or float(os.environ.get('NEXUS_HTTP_TIMEOUT', DEFAULT_TIMEOUT))
+
+        load_backend()
+        if HAS_REQUESTS:
+            self._session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+            self._session.mount('http://', adapter)
+            self._session.mount('https://', adapter)
+            self._pool = None
+        else:
+            self._session = None
+            self._pool = _ConnectionPool(self.pool_size)
+
+    def post_json(self, url, payload, headers=None, timeout=None, label=None):
+        """
+        POST a JSON payload and return the decoded JSON response
+
+        Args:
+            url: Request URL
+            payload: JSON-serializable request body
+            headers: Extra request headers
+            timeout: Request timeout in seconds (defaults to the transport timeout)
+            label: Tool or method name reported to the execution metrics
+
+        Returns:
+            Decoded JSON response body
+
+        Raises:
+            TransportError: On connection failures and non-2xx responses
+        """
+        status, data = self._post(url, payload, headers, timeout, label)
+        try:
+            # Decoded straight from the response bytes, without a text copy
+            return codec.loads(data)
+        except ValueError as e:
+            raise TransportError(f"Invalid JSON response: {e}", status=status)
+
+    def post(self, url, payload, headers=None, timeout=None, label=None):
+        """
+        POST a JSON payload and return the undecoded response body
+
+        Takes the same arguments as post_json().
+
+        Returns:
+            Response body bytes
+
+        Raises:
+            TransportError: On connection failures and non-2xx responses
+        """
+        return self._post(url, payload, headers, timeout, label)[1]
+
+    def post_stream(self, url, payload, headers=None, timeout=None, label=None):
+        """
+        POST a JSON payload and return the response as soon as its headers arrive
+
+        Takes the same arguments as post_json(); `timeout` applies to each read,
+        so a stream stays open as long as data keeps arriving.
+
+        Returns:
+            StreamingResponse (close it when done)
+
+        Raises:
+            TransportError: On connection failures and non-2xx responses
+        """
+        timeout = timeout or self.timeout
+        request_headers = {
+            "Content-Type": "application/json",
+            "Accept": "text/event-stream, application/json",
+            "Connection": "keep-alive",
+        }
+        if headers:
+            request_headers.update(headers)
+        body = codec.dumpb(payload)
+        started = time.perf_counter()
+
+        def finished(status, response_bytes):
+            latency = time.perf_counter() - started
+            record_call(label, latency, len(body), response_bytes, status)
+            trace(
+                "http.stream",
+                tool=label,
+                url=url,
+                status=status,
+                latency_ms=round(latency * 1000, 3),
+                request_bytes=len(body),
+                response_bytes=response_bytes,
+            )
+
+        try:
+            status, reason, response_headers, chunks, closer = self._open_stream(url, body, request_headers, timeout)
+        except TransportError:
+            finished("error", 0)
+            raise
+        if status >= 400:
+            try:
+                data = b"".join(chunks)
+            except (OSError, TransportError):
+                data = b""
+            finally:
+                closer()
+            finished(status, len(data))
+            raise TransportError(_error_message(status, reason, data), status=status)
+        return StreamingResponse(status, response_headers, chunks, closer,
+                                 lambda response: finished(status, response.bytes_read))
+
+    def _open_stream(self, url, body, headers, timeout):
+        """Send a POST request and return (status, reason, headers, chunk iterator, closer)"""
+        if self._session is not None:
+            try:
+                response = self._session.post(url, data=body, headers=headers, timeout=timeout, stream=True)
+            except requests.RequestException as e:
+                raise TransportError(str(e), timeout=isinstance(e, requests.Timeout))
+
+            def chunks():
+                try:
+                    yield from response.raw.stream(8192, decode_content=True)
+                except Exception as e:
+                    raise TransportError(str(e) or type(e).__name__, timeout="timed out" in str(e).lower())
+            return response.status_code, response.reason, response.headers, chunks(), response.close
+
+        import http.client
+        import socket
+        try:
+            key, conn, response = self._pool.open('POST', url, body, headers, timeout)
+        except (OSError, http.client.HTTPException) as e:
+            raise TransportError(str(e) or type(e).__name__, timeout=isinstance(e, socket.timeout))
+
+        def chunks():
+            try:
+                while True:
+                    # read1 returns what has arrived (one chunk of a chunked body) without waiting for more
+                    chunk = response.read1(65536)
+                    if not chunk:
+                        return
+                    yield chunk
+            except (OSError, http.client.HTTPException) as e:
+                raise TransportError(str(e) or type(e).__name__, timeout=isinstance(e, socket.timeout))
+
+        def closer():
+            self._pool.release(key, conn, response)
+        return response.status, response.reason, response.headers, chunks(), closer
+
+    def _post(self, url, payload, headers, timeout, label):
+        """POST a JSON payload and return (status, body bytes) of a 2xx response"""
+        timeout = timeout or self.timeout
+        request_headers = {
+            "Content-Type": "application/json",
+            "Connection": "keep-alive",
+        }
+        if headers:
+            request_headers.update(headers)
+        body = codec.dumpb(payload)
+
+        started = time.perf_counter()
+        status, data = "error", b""
+        try:
+            status, reason, data = self._send(url, body, request_headers, timeout)
+        finally:
+            latency = time.perf_counter() - started
+            record_call(label, latency, len(body), len(data), status)
+            trace(
+                "http.request",
+                tool=label,
+                url=url,
+                status=status,
+                latency_ms=round(latency * 1000, 3),
+                request_bytes=len(body),
+                response_bytes=len(data),
+            )
+
+        if status >= 400:
+            raise TransportError(_error_message(status, reason, data), status=status)
+        return status, data
+
+    def _send(self, url, body, headers, timeout):
+        """Send a POST request and return (status, reason, body bytes)"""
+        if self._session is not None:
+            try:
+                response = self._session.post(url, data=body, headers=headers, timeout=timeout)
+            except requests.RequestException as e:
+                raise TransportError(str(e), timeout=isinstance(e, requests.Timeout))
+            return response.status_code, response.reason, response.content
+
+        import http.client
+        import socket
+        try:
+            return self._pool.request('POST', url, body, headers, timeout)
+        except (OSError, http.client.HTTPException) as e:
+            raise TransportError(str(e) or type(e).__name__, timeout=isinstance(e, socket.timeout))
+
+    def close(self):
+        """Close all pooled connections"""
+        if self._session is not None:
+            self._session.close()
+        if self._pool is not None:
+            self._pool.close()
+
+    def abort(self):
+        """
+        Abort requests in flight (their callers get a TransportError) and drop pooled connections
+
+        With requests installed only idle connections are dropped; requests
+        in flight end at their timeout, which is clamped to the execution budget.
+        """
+        if self._session is not None:
+            self._session.close()
+        if self._pool is not None:
+            self._pool.abort()
+
+
+# One transport per sandbox process, shared by every client
+_transport = None
+_transport_lock = threading.Lock()
+
+def get_transport():
+    """Get or create the shared Transport instance"""
+    global _transport
+    if _transport is None:
+        with _transport_lock:
+            if _transport is None:
+                _transport = Transport()
+    return _transport
+
+def abort_in_flight():
+    """Abort requests in flight on the shared transport, if it was created"""
+    if _transport is not None:
+        _transport.abort()
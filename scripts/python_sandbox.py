@@ -1,20 +1,1114 @@
 import sys
 import json
+import binascii
 import io
 import os
+import threading
+import time
 import traceback
-from contextlib import redirect_stdout, redirect_stderr
-from typing import Any, Dict
+from collections import OrderedDict, deque
+from contextlib import contextmanager, redirect_stdout, redirect_stderr
+from itertools import islice
+from types import BuiltinFunctionType, FunctionType, MappingProxyType, MethodType, ModuleType
+from typing import Any, Callable, Dict, Mapping, Optional, Union
 
-def execute_code(code: str, nexus_api_url: str = None, server_instance_id: str = None, nexus_auth_token: str = None) -> Dict[str, Any]:
+# nexus_sdk lives next to this script; its codec is used for all sandbox I/O
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+if SCRIPTS_DIR not in sys.path:
+    sys.path.insert(0, SCRIPTS_DIR)
+from nexus_sdk import codec
+
+# Worker recycling defaults (overridable via CLI flags or environment variables)
+DEFAULT_WORKER_MAX_JOBS = 100
+DEFAULT_WORKER_MAX_RSS_GROWTH_MB = 256
+
+def _seconds_since_process_start() -> Optional[float]:
+    """Return how long this process has existed, from /proc (None where unavailable)"""
+    try:
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        with open("/proc/self/stat") as f:
+            # Fields after the parenthesised command name start at field 3; starttime is field 22
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        return max(0.0, uptime - start_ticks / os.sysconf("SC_CLK_TCK"))
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+# Flag set on code objects of `async def` functions (inspect.CO_COROUTINE)
+_CO_COROUTINE = 0x80
+
+# Interpreter startup cost, measured once when this module is first loaded
+_INTERPRETER_STARTUP = _seconds_since_process_start()
+_jobs_run = 0
+
+# Number of functions listed in a profile summary
+PROFILE_TOP_N = 25
+
+# Maximum characters kept per output stream before truncating
+DEFAULT_MAX_OUTPUT_CHARS = 1_000_000
+
+# Streamed output is coalesced into chunks of roughly this many characters
+STREAM_CHUNK_CHARS = 8192
+
+# Environment variables a job may set; restored after each job so a
+# long-lived worker never leaks one tenant's settings into the next job
+_JOB_ENV_KEYS = ("NEXUS_API_URL", "NEXUS_SERVER_INSTANCE_ID", "NEXUS_AUTH_TOKEN", "NEXUS_DEADLINE")
+
+# Execution time budget (matches EXECUTION_TIMEOUT_MS in lib/sandbox.ts). SDK calls
+# are clamped to the deadline, less a reserve for reporting the result.
+DEFAULT_EXECUTION_BUDGET_S = 30
+DEADLINE_RESERVE_S = 1.0
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+@contextmanager
+def _job_environment(overrides: Optional[Dict[str, str]] = None):
+    """Apply per-job environment variables and restore the previous values afterwards"""
+    keys = set(_JOB_ENV_KEYS) | set(overrides or {})
+    saved = {key: os.environ.get(key) for key in keys}
+    try:
+        for key, value in (overrides or {}).items():
+            if value is not None:
+                os.environ[key] = str(value)
+        yield
+    finally:
+        for key, value in saved.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+
+def _reset_sdk_state():
+    """Unbind nexus_sdk singletons so a reused interpreter starts each job clean"""
+    sdk = sys.modules.get("nexus_sdk")
+    if sdk is not None:
+        sdk.bind_google_instance(None)
+        sdk.mcp = None
+    sdk_mcp = sys.modules.get("nexus_sdk.mcp")
+    if sdk_mcp is not None:
+        sdk_mcp._mcp_instance = None
+
+
+# Builtins available to user code. Each job gets a shallow copy of this
+# template, so code that rebinds a builtin can't affect later jobs.
+_SAFE_BUILTINS = MappingProxyType({
+    "print": print,
+    "len": len,
+    "range": range,
+    "str": str,
+    "int": int,
+    "float": float,
+    "bool": bool,
+    "list": list,
+    "dict": dict,
+    "tuple": tuple,
+    "set": set,
+    "sorted": sorted,
+    "reversed": reversed,
+    "min": min,
+    "max": max,
+    "sum": sum,
+    "abs": abs,
+    "round": round,
+    "any": any,
+    "all": all,
+    "enumerate": enumerate,
+    "zip": zip,
+    "isinstance": isinstance,
+    "True": True,
+    "False": False,
+    "None": None,
+    "Exception": Exception,
+})
+
+_base_namespace = None
+
+
+def _get_base_namespace() -> Mapping[str, Any]:
+    """Return the read-only globals template shared by every job (built once per interpreter)"""
+    global _base_namespace
+    if _base_namespace is None:
+        import collections
+
+        base = {"json": json, "collections": collections}
+        try:
+            import nexus_sdk
+            base.update({
+                "nexus_sdk": nexus_sdk,
+                "parallel_map": nexus_sdk.parallel_map,
+                "Frame": nexus_sdk.Frame,
+                "to_frame": nexus_sdk.to_frame,
+            })
+        except ImportError:
+            pass
+        _base_namespace = MappingProxyType(base)
+    return _base_namespace
+
+
+class _ClientPool:
+    """
+    MCP and GoogleSDK clients reused across jobs in one interpreter
+
+    Each job rebinds them to its server instance and base URL, which is
+    much cheaper than building new clients. Clients are never handed from
+    one auth token to another, and a client whose attributes the previous
+    job changed is thrown away and rebuilt.
+    """
+
+    def __init__(self):
+        self.mcp = None
+        self.google = None
+        self.auth_token = None
+        self._snapshots = {}
+
+    def bind(self, sdk, base_url: str, server_instance_id: str, auth_token: Optional[str]):
+        """Return (mcp, google) bound to the given tenant"""
+        if auth_token != self.auth_token:
+            self.mcp = self.google = None
+            self._snapshots = {}
+            self.auth_token = auth_token
+        self.mcp = self._rebind(sdk, self.mcp, sdk.MCP, base_url, server_instance_id, auth_token)
+        self.google = self._rebind(sdk, self.google, sdk.GoogleSDK, base_url, server_instance_id, auth_token)
+        self._snapshots = {
+            id(obj): (obj, dict(vars(obj)))
+            for obj in (self.mcp, self.google, self.google.gmail, self.google.calendar)
+        }
+        return self.mcp, self.google
+
+    def _rebind(self, sdk, client, factory, base_url, server_instance_id, auth_token):
+        # NEXUS_CACHE may differ between jobs; a client whose cache no longer matches is rebuilt
+        if client is not None and self._untouched(client) and client.cache is sdk.cache.resolve_cache(None):
+            return client.rebind(base_url, server_instance_id, auth_token)
+        client = factory(base_url=base_url, server_instance_id=server_instance_id, auth_token=auth_token)
+        # Resolve the shared transport now so later lazy resolution doesn't look like tampering
+        client.transport
+        return client
+
+    def _untouched(self, client) -> bool:
+        objects = [client]
+        if hasattr(client, "gmail"):
+            objects += [client.gmail, client.calendar]
+        for obj in objects:
+            entry = self._snapshots.get(id(obj))
+            if entry is None or entry[0] is not obj:
+                return False
+            current, snapshot = vars(obj), entry[1]
+            if current.keys() != snapshot.keys():
+                return False
+            if any(current[key] is not value for key, value in snapshot.items()):
+                return False
+        return True
+
+
+_client_pool = _ClientPool()
+
+
+# Compiled code cache defaults (overridable via environment variables)
+DEFAULT_CODE_CACHE_ENTRIES = 256
+
+
+class _CodeCache:
+    """
+    Content-addressed in-memory LRU of compiled user code.
+
+    Long-lived workers skip parsing and compiling scripts they have seen
+    before. Entries never leave the process: a shared on-disk tier would let
+    one job plant code objects that another tenant's job then executes.
+    Syntax errors are cached too.
+    """
+
+    def __init__(self, max_entries: Optional[int] = None):
+        from collections import OrderedDict
+
+        self.enabled = os.environ.get("NEXUS_CODE_CACHE", "1").lower() not in ("0", "false", "no", "off")
+        self.max_entries = max_entries or _env_int("NEXUS_CODE_CACHE_ENTRIES", DEFAULT_CODE_CACHE_ENTRIES)
+        self._entries = OrderedDict()
+
+    def compile(self, source: str):
+        """
+        Return (code object, where it came from: "memory" or "compiled")
+
+        Raises:
+            SyntaxError: (or ValueError for null bytes) if the source doesn't compile
+        """
+        if not self.enabled:
+            return compile(source, "<string>", "exec", dont_inherit=True), "compiled"
+        import hashlib
+
+        key = hashlib.sha256(source.encode("utf-8", "surrogatepass")).hexdigest()
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            if isinstance(entry, BaseException):
+                raise entry.with_traceback(None)
+            return entry, "memory"
+
+        try:
+            code = compile(source, "<string>", "exec", dont_inherit=True)
+        except (SyntaxError, ValueError) as e:
+            self._remember(key, e)
+            raise
+        self._remember(key, code)
+        return code, "compiled"
+
+    def _remember(self, key: str, entry):
+        self._entries[key] = entry
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+_code_cache = None
+
+
+def _get_code_cache() -> _CodeCache:
+    global _code_cache
+    if _code_cache is None:
+        _code_cache = _CodeCache()
+    return _code_cache
+
+
+# Session kernel defaults (overridable via environment variables)
+DEFAULT_SESSION_IDLE_TIMEOUT_S = 900
+DEFAULT_SESSION_MEMORY_MB = 512
+DEFAULT_MAX_SESSIONS = 32
+# Containers longer than this are measured from an evenly spaced sample of their items
+SESSION_SIZE_SAMPLE = 256
+# Objects visited when measuring a session; past this the estimate is a lower bound
+SESSION_SIZE_SCAN_LIMIT = 200_000
+# Names the sandbox (re)binds for every job; they are not session data
+_SESSION_JOB_NAMES = frozenset(("__builtins__", "mcp", "google", "amcp"))
+# Code and module objects are shared with the interpreter, not owned by a session
+_UNSIZED_TYPES = (ModuleType, type, FunctionType, BuiltinFunctionType, MethodType)
+
+
+def _deep_sizeof(roots, skip_ids, limit: int = SESSION_SIZE_SCAN_LIMIT) -> int:
+    """
+    Estimate the memory reachable from `roots` (sys.getsizeof of every object).
+    
+    Large containers are sampled and their items' sizes scaled up, so the cost
+    stays roughly constant however much data a session holds.
+    """
+    seen = set(skip_ids)
+    stack = [(root, 1.0) for root in roots]
+    total = 0.0
+    while stack and len(seen) <= limit:
+        obj, weight = stack.pop()
+        if id(obj) in seen or isinstance(obj, _UNSIZED_TYPES):
+            continue
+        seen.add(id(obj))
+        total += sys.getsizeof(obj, 0) * weight
+        if isinstance(obj, dict):
+            items = obj.items()
+        elif isinstance(obj, (list, tuple, set, frozenset, deque)):
+            items = obj
+        else:
+            attributes = getattr(obj, "__dict__", None)
+            if isinstance(attributes, dict):
+                stack.append((attributes, weight))
+            slots = getattr(type(obj), "__slots__", ())
+            for name in (slots,) if isinstance(slots, str) else slots:
+                stack.append((getattr(obj, name, None), weight))
+            continue
+        count = len(items)
+        step = max(1, count // SESSION_SIZE_SAMPLE)
+        sample = list(islice(items, 0, None, step))
+        item_weight = weight * count / len(sample) if sample else weight
+        if isinstance(obj, dict):
+            for key, value in sample:
+                stack.append((key, item_weight))
+                stack.append((value, item_weight))
+        else:
+            stack.extend((item, item_weight) for item in sample)
+    return int(total)
+
+
+def _make_save_dir() -> str:
+    """Create a private directory for one job's (or session's) saved files"""
+    import tempfile
+    return tempfile.mkdtemp(prefix="nexus_job_")
+
+
+def _remove_save_dir(path: str):
+    import shutil
+    shutil.rmtree(path, ignore_errors=True)
+
+
+class _Session:
+    """
+    A kernel whose globals and SDK clients survive between jobs.
+    
+    Everything user code binds at module level (fetched data, helper
+    functions, imports) is still there for the next job of the session;
+    mcp, google and amcp are rebound to the job's tenant each time.
+    """
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.namespace = dict(_get_base_namespace())
+        self.namespace["__builtins__"] = dict(_SAFE_BUILTINS)
+        self.clients = _ClientPool()
+        self.last_used = time.monotonic()
+        self.jobs = 0
+        self.size_bytes = 0
+        self.discarded = False
+        # Files saved by ContentItem.save() stay available to later jobs of the session
+        self.save_dir = _make_save_dir()
+
+    def measure(self) -> int:
+        """Estimate the bytes held by user data in the namespace"""
+        base = _get_base_namespace()
+        skip_ids = {id(value) for value in base.values()}
+        skip_ids.update(id(self.namespace.get(name)) for name in _SESSION_JOB_NAMES)
+        google = self.clients.google
+        if google is not None:
+            skip_ids.update((id(google), id(google.gmail), id(google.calendar)))
+        skip_ids.add(id(self.clients.mcp))
+        roots = [
+            value for name, value in self.namespace.items()
+            if name not in _SESSION_JOB_NAMES and not (name in base and base[name] is value)
+        ]
+        self.size_bytes = _deep_sizeof(roots, skip_ids)
+        return self.size_bytes
+
+    def discard(self):
+        # Breaks the cycles between the namespace and the functions defined in it
+        self.namespace.clear()
+        self.clients = None
+        self.discarded = True
+        _remove_save_dir(self.save_dir)
+
+
+class _SessionStore:
+    """
+    Session kernels of this interpreter, least recently used first.
+    
+    Sessions are keyed by server instance and session id, so a job can only
+    reach kernels of its own tenant. Sessions idle for longer than the idle
+    timeout are dropped when the next job arrives; after each job the least
+    recently used sessions are evicted until the measured total fits the
+    memory cap and the session count fits max_sessions.
+    """
+
+    def __init__(self, idle_timeout_s: float = 0, max_bytes: int = 0, max_sessions: int = 0):
+        self.idle_timeout_s = idle_timeout_s
+        self.max_bytes = max_bytes
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+
+    @classmethod
+    def from_env(cls) -> "_SessionStore":
+        return cls(
+            _env_float("NEXUS_SANDBOX_SESSION_IDLE_TIMEOUT", DEFAULT_SESSION_IDLE_TIMEOUT_S),
+            _env_int("NEXUS_SANDBOX_SESSION_MEMORY_MB", DEFAULT_SESSION_MEMORY_MB) * 1024 * 1024,
+            _env_int("NEXUS_SANDBOX_MAX_SESSIONS", DEFAULT_MAX_SESSIONS),
+        )
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(session.size_bytes for session in self._sessions.values())
+
+    def session_ids(self):
+        return [session_id for _, session_id in self._sessions]
+
+    def open(self, server_instance_id: Optional[str], session_id: str, reset: bool = False):
+        """Return (session, new) for a job, creating or resetting the kernel as needed"""
+        self.expire()
+        key = (server_instance_id or "", session_id)
+        session = self._sessions.pop(key, None)
+        if session is not None and reset:
+            session.discard()
+            session = None
+        new = session is None
+        if new:
+            session = _Session(session_id)
+        self._sessions[key] = session
+        return session, new
+
+    def finish(self, session: _Session, new: bool, close: bool = False) -> Dict[str, Any]:
+        """Account for a finished job and return the result's "session" section"""
+        session.jobs += 1
+        session.last_used = time.monotonic()
+        if close:
+            self._drop(session)
+        else:
+            session.measure()
+            self._evict()
+        return {
+            "id": session.session_id,
+            "new": new,
+            "jobs": session.jobs,
+            "size_bytes": session.size_bytes,
+            "closed": close,
+            "evicted": not close and session.discarded,
+        }
+
+    def expire(self):
+        """Drop sessions that have been idle for longer than the idle timeout"""
+        if self.idle_timeout_s <= 0:
+            return
+        cutoff = time.monotonic() - self.idle_timeout_s
+        expired = [session for session in self._sessions.values() if session.last_used < cutoff]
+        for session in expired:
+            self._drop(session)
+
+    def _evict(self):
+        while self._sessions and (
+            (self.max_sessions > 0 and len(self._sessions) > self.max_sessions)
+            or (self.max_bytes > 0 and self.total_bytes > self.max_bytes)
+        ):
+            self._drop(next(iter(self._sessions.values())))
+
+    def _drop(self, session: _Session):
+        for key, candidate in self._sessions.items():
+            if candidate is session:
+                del self._sessions[key]
+                break
+        session.discard()
+        # Reference cycles in user data would otherwise outlive the session until the next collection
+        import gc
+        gc.collect()
+
+
+_session_store = None
+
+
+def _get_session_store() -> _SessionStore:
+    global _session_store
+    if _session_store is None:
+        _session_store = _SessionStore.from_env()
+    return _session_store
+
+
+# Resource limit defaults (overridable via environment variables, also per job).
+# The wall-time limit defaults to the time left until NEXUS_DEADLINE.
+DEFAULT_OUTPUT_LIMIT_CHARS = 10_000_000
+# Past the CPU limit plus this grace the kernel kills the process (RLIMIT_CPU),
+# for code stuck in a C call that never returns to the interpreter
+CPU_KILL_GRACE_S = 5
+# Timer signals repeat at this interval until the code stops, in case it catches one
+LIMIT_SIGNAL_INTERVAL_S = 1.0
+
+
+class LimitExceeded(BaseException):
+    """
+    Raised in user code when a resource limit trips.
+    
+    Derives from BaseException so `except Exception` in user code can't
+    swallow it.
+    """
+
+    def __init__(self, kind: str, limit: float, message: str):
+        super().__init__(message)
+        self.kind = kind
+        self.limit = limit
+
+
+class _ResourceLimits:
+    """
+    CPU-time, wall-time and memory limits for one job's user code.
+    
+    Wall and CPU time use interval timers (SIGALRM / SIGPROF) that raise
+    LimitExceeded in the main thread; they are only armed when the job runs
+    on the main thread of a POSIX interpreter. Memory is capped with
+    RLIMIT_AS relative to the current address space size, so allocations
+    past the cap raise MemoryError. Limits are lifted again by disarm().
+    """
+
+    def __init__(self, wall_s: float = 0, cpu_s: float = 0, memory_mb: int = 0):
+        self.wall_s = wall_s
+        self.cpu_s = cpu_s
+        self.memory_mb = memory_mb
+        self.armed_at = None
+        self.cpu_at = None
+        self._handlers = {}
+        self._rlimits = {}
+
+    @classmethod
+    def from_env(cls) -> "_ResourceLimits":
+        wall_s = _env_float("NEXUS_SANDBOX_WALL_LIMIT", 0)
+        deadline = _env_float("NEXUS_DEADLINE", 0)
+        if deadline:
+            remaining = max(0.001, deadline - time.time())
+            wall_s = min(wall_s, remaining) if wall_s > 0 else remaining
+        cpu_s = _env_float("NEXUS_SANDBOX_CPU_LIMIT", 0) or wall_s
+        return cls(wall_s, cpu_s, _env_int("NEXUS_SANDBOX_MEMORY_LIMIT_MB", 0))
+
+    def arm(self):
+        self.armed_at = time.monotonic()
+        self.cpu_at = time.process_time()
+        import signal
+        if hasattr(signal, "setitimer") and threading.current_thread() is threading.main_thread():
+            if self.wall_s > 0:
+                self._handlers[signal.SIGALRM] = signal.signal(signal.SIGALRM, self._on_wall_time)
+                signal.setitimer(signal.ITIMER_REAL, self.wall_s, LIMIT_SIGNAL_INTERVAL_S)
+            if self.cpu_s > 0:
+                # ITIMER_PROF counts CPU time of the whole process, all threads included
+                self._handlers[signal.SIGPROF] = signal.signal(signal.SIGPROF, self._on_cpu_time)
+                signal.setitimer(signal.ITIMER_PROF, self.cpu_s, LIMIT_SIGNAL_INTERVAL_S)
+        try:
+            import resource
+        except ImportError:
+            return
+        if self.cpu_s > 0:
+            usage = resource.getrusage(resource.RUSAGE_SELF)
+            self._set_soft_limit(resource, resource.RLIMIT_CPU,
+                                 int(usage.ru_utime + usage.ru_stime + self.cpu_s + CPU_KILL_GRACE_S) + 1)
+        address_space = _address_space_bytes()
+        if self.memory_mb > 0 and address_space:
+            self._set_soft_limit(resource, resource.RLIMIT_AS, address_space + self.memory_mb * 1024 * 1024)
+
+    def disarm(self):
+        import signal
+        for signum, handler in self._handlers.items():
+            signal.setitimer(signal.ITIMER_REAL if signum == signal.SIGALRM else signal.ITIMER_PROF, 0)
+            signal.signal(signum, handler)
+        self._handlers = {}
+        if self._rlimits:
+            import resource
+            for which, previous in self._rlimits.items():
+                resource.setrlimit(which, previous)
+            self._rlimits = {}
+
+    def usage(self) -> Dict[str, Any]:
+        """Wall and CPU seconds since arm() and the peak RSS"""
+        return {
+            "wall_s": round(time.monotonic() - self.armed_at, 3) if self.armed_at is not None else 0.0,
+            "cpu_s": round(time.process_time() - self.cpu_at, 3) if self.cpu_at is not None else 0.0,
+            "peak_rss_bytes": _peak_rss_bytes(),
+        }
+
+    def _set_soft_limit(self, resource, which: int, soft: int):
+        previous = resource.getrlimit(which)
+        hard = previous[1]
+        if hard != resource.RLIM_INFINITY:
+            soft = min(soft, hard)
+        try:
+            resource.setrlimit(which, (soft, hard))
+        except (ValueError, OSError):
+            return
+        self._rlimits[which] = previous
+
+    def _on_wall_time(self, signum, frame):
+        raise LimitExceeded("wall_time", self.wall_s, f"wall time limit of {self.wall_s:.3g}s exceeded")
+
+    def _on_cpu_time(self, signum, frame):
+        raise LimitExceeded("cpu_time", self.cpu_s, f"CPU time limit of {self.cpu_s:.3g}s exceeded")
+
+
+def _address_space_bytes() -> int:
+    """Current virtual address space size (Linux only; 0 where unavailable)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return 0
+
+
+def _cancel_sdk_calls():
+    """Abort the job's in-flight MCP calls, if the SDK made any"""
+    resilience = sys.modules.get("nexus_sdk.resilience")
+    if resilience is not None:
+        resilience.cancel_calls()
+
+
+class _OutputStream(io.TextIOBase):
+    """
+    Capped stdout/stderr capture.
+    
+    Keeps at most `limit` characters and appends a truncation marker once the
+    cap is hit. Writing more than `hard_limit` characters in total (kept or
+    not) raises LimitExceeded, which stops a runaway print loop. With an `emit` callback, output is forwarded in chunks as it is
+    written (flushed on newlines or when a chunk fills up) instead of being
+    buffered until the job finishes.
+    """
+
+    def __init__(self, name: str, limit: int = DEFAULT_MAX_OUTPUT_CHARS, emit: Optional[Callable[[str, str], None]] = None, hard_limit: int = 0):
+        self.name = name
+        self.limit = limit
+        self.emit = emit
+        self.hard_limit = hard_limit
+        self.written = 0
+        self.size = 0
+        self.truncated = False
+        self._chunks = []
+        self._pending = []
+        self._pending_size = 0
+        self._lock = threading.Lock()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, text: str) -> int:
+        if not isinstance(text, str):
+            raise TypeError(f"write() argument must be str, not {type(text).__name__}")
+        with self._lock:
+            self.written += len(text)
+            if 0 < self.hard_limit < self.written:
+                self._flush_pending()
+                raise LimitExceeded("output", self.hard_limit, f"{self.name} exceeded {self.hard_limit} characters")
+            if self.truncated:
+                return len(text)
+            kept = text
+            if self.limit > 0 and self.size + len(text) > self.limit:
+                kept = text[:self.limit - self.size]
+                self.truncated = True
+            self.size += len(kept)
+            if kept:
+                self._append(kept)
+            if self.truncated:
+                self._append(f"\n[{self.name} truncated after {self.limit} characters]\n")
+            if self.emit is not None and (self.truncated or "\n" in kept or self._pending_size >= STREAM_CHUNK_CHARS):
+                self._flush_pending()
+        return len(text)
+
+    def flush(self):
+        with self._lock:
+            self._flush_pending()
+
+    def getvalue(self) -> str:
+        """Return buffered output (empty when streaming, since output was already emitted)"""
+        with self._lock:
+            self._flush_pending()
+            return "".join(self._chunks)
+
+    def _append(self, text: str):
+        if self.emit is None:
+            self._chunks.append(text)
+        else:
+            self._pending.append(text)
+            self._pending_size += len(text)
+
+    def _flush_pending(self):
+        if self.emit is not None and self._pending:
+            chunk = "".join(self._pending)
+            self._pending = []
+            self._pending_size = 0
+            self.emit(self.name, chunk)
+
+
+# Return value budget (overridable via environment variables, also per job);
+# 0 disables a limit
+DEFAULT_RETURN_MAX_BYTES = 1_000_000
+DEFAULT_RETURN_MAX_ITEMS = 1000
+# How over-long lists are cut: "head", "sample" (evenly spaced) or "topk:<field>"
+DEFAULT_RETURN_LIST_STRATEGY = "head"
+# Strings at least this long that are valid base64 or a base64 data URI become
+# size placeholders when over budget
+RETURN_BLOB_MIN_CHARS = 1024
+# Strings are never cut below this many characters
+RETURN_MIN_STRING_CHARS = 64
+# Reduction passes (each tighter than the last) before the whole value is replaced
+RETURN_REDUCTION_PASSES = 8
+# Containers nested deeper than this are replaced with a placeholder
+RETURN_MAX_DEPTH = 100
+# Elisions listed one by one in the report; the totals always cover all of them
+RETURN_REPORT_ENTRIES = 50
+
+_BLOB_CHARS = frozenset("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/=-_")
+_HEX_CHARS = frozenset("0123456789abcdefABCDEF")
+_URLSAFE_TO_STANDARD = str.maketrans("-_", "+/")
+
+
+def _is_blob(value: str) -> bool:
+    """True for a base64 data URI or a string that decodes as base64 (hex digests and IDs don't)"""
+    if value.startswith("data:"):
+        header, comma, _ = value[:256].partition(",")
+        return bool(comma) and header.endswith(";base64")
+    data = value.replace("\r", "").replace("\n", "")
+    if len(data) % 4 or not _BLOB_CHARS.issuperset(data) or _HEX_CHARS.issuperset(data):
+        return False
+    body = data.rstrip("=")
+    if len(data) - len(body) > 2 or "=" in body:
+        return False
+    if "-" in body or "_" in body:
+        if "+" in body or "/" in body:
+            return False
+        data = data.translate(_URLSAFE_TO_STANDARD)
+    try:
+        binascii.a2b_base64(data)
+    except binascii.Error:
+        return False
+    return True
+
+
+class _ReturnValueReducer:
+    """
+    Fits main()'s return value into a byte and per-container item budget.
+    
+    A value within budget is encoded as-is. Otherwise it is re-encoded in
+    passes of increasing strictness: lists and dicts are cut to the item
+    budget (by the list strategy), then base64 blobs are replaced with
+    size placeholders and long strings truncated, then both caps shrink
+    until the encoding fits. Every pass starts from the original value, so
+    the report describes exactly what the returned value is missing.
+    """
+
+    def __init__(self, max_bytes: int, max_items: int, list_strategy: str = DEFAULT_RETURN_LIST_STRATEGY):
+        self.max_bytes = max(0, max_bytes)
+        self.max_items = max(0, max_items)
+        strategy = list_strategy or DEFAULT_RETURN_LIST_STRATEGY
+        if strategy not in ("head", "sample") and not strategy.startswith("topk:"):
+            strategy = DEFAULT_RETURN_LIST_STRATEGY
+        self.list_strategy = strategy
+        self._entries = []
+        self._totals = {}
+
+    @classmethod
+    def from_env(cls, max_bytes: Optional[int] = None, max_items: Optional[int] = None,
+                 list_strategy: Optional[str] = None) -> "_ReturnValueReducer":
+        """Build a reducer from job settings, falling back to NEXUS_SANDBOX_RETURN_* variables"""
+        return cls(
+            max_bytes if max_bytes is not None else _env_int("NEXUS_SANDBOX_RETURN_MAX_BYTES", DEFAULT_RETURN_MAX_BYTES),
+            max_items if max_items is not None else _env_int("NEXUS_SANDBOX_RETURN_MAX_ITEMS", DEFAULT_RETURN_MAX_ITEMS),
+            list_strategy or os.environ.get("NEXUS_SANDBOX_RETURN_LIST_STRATEGY", DEFAULT_RETURN_LIST_STRATEGY),
+        )
+
+    def encode(self, value: Any):
+        """
+        Encode a return value within the budget.
+        
+        Returns:
+            (JSON bytes, reduction report or None if nothing was elided)
+        """
+        encoded = codec.try_dumpb(value)
+        fits = encoded is not None and (not self.max_bytes or len(encoded) <= self.max_bytes)
+        if fits and not self._exceeds_items(value):
+            return encoded, None
+        original_bytes = len(encoded) if encoded is not None else None
+
+        items_cap = self.max_items or None
+        string_cap = None
+        blobs = False
+        for _ in range(RETURN_REDUCTION_PASSES):
+            self._entries, self._totals = [], {}
+            reduced = self._reduce(value, "$", items_cap, string_cap, blobs, 0)
+            encoded = codec.dumpb(reduced)
+            if not self.max_bytes or len(encoded) <= self.max_bytes:
+                return encoded, self._report(original_bytes, encoded)
+            if not blobs:
+                blobs = True
+                string_cap = max(RETURN_MIN_STRING_CHARS, self.max_bytes // 8)
+            else:
+                string_cap = max(RETURN_MIN_STRING_CHARS, string_cap // 4)
+                items_cap = max(1, (items_cap or DEFAULT_RETURN_MAX_ITEMS) // 4)
+
+        # Still too big (e.g. deeply nested): replace the whole value with a summary
+        self._entries, self._totals = [], {}
+        size = original_bytes if original_bytes is not None else len(encoded)
+        self._elide("$", "value", size, original_bytes=original_bytes, reduced_bytes=len(encoded))
+        encoded = codec.dumpb(f"<return value elided: {type(value).__name__} of at least {size} bytes>")
+        return encoded, self._report(original_bytes, encoded)
+
+    def _exceeds_items(self, value: Any) -> bool:
+        if not self.max_items:
+            return False
+        stack = [value]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, dict):
+                if len(item) > self.max_items:
+                    return True
+                stack.extend(item.values())
+            elif isinstance(item, (list, tuple)):
+                if len(item) > self.max_items:
+                    return True
+                stack.extend(item)
+        return False
+
+    def _reduce(self, value: Any, path: str, items_cap: Optional[int], string_cap: Optional[int], blobs: bool,
+                depth: int) -> Any:
+        """Return a JSON-compatible copy of value within the caps, recording what was elided"""
+        if value is None or isinstance(value, (bool, int, float)):
+            return value
+        if depth >= RETURN_MAX_DEPTH and isinstance(value, (dict, list, tuple, set, frozenset)):
+            self._elide(path, "nested", 1, depth=depth)
+            return f"<nested {type(value).__name__} elided at depth {depth}>"
+        depth += 1
+        if isinstance(value, str):
+            if blobs and len(value) >= RETURN_BLOB_MIN_CHARS and _is_blob(value):
+                self._elide(path, "blob", len(value), chars=len(value))
+                return f"<blob elided: {len(value)} chars>"
+            if string_cap is not None and len(value) > string_cap:
+                self._elide(path, "string", len(value) - string_cap, original_chars=len(value), kept_chars=string_cap)
+                return f"{value[:string_cap]}... <{len(value) - string_cap} chars elided>"
+            return value
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            size = value.nbytes if isinstance(value, memoryview) else len(value)
+            self._elide(path, "blob", size, bytes=size)
+            return f"<binary elided: {size} bytes>"
+        if isinstance(value, dict):
+            keys = list(value)
+            if items_cap is not None and len(keys) > items_cap:
+                self._elide(path, "dict", len(keys) - items_cap, original_keys=len(keys), kept_keys=items_cap)
+                kept = {str(key): self._reduce(value[key], _child_path(path, key), items_cap, string_cap, blobs, depth)
+                        for key in keys[:items_cap]}
+                kept["<elided>"] = f"{len(keys) - items_cap} more keys"
+                return kept
+            return {str(key): self._reduce(item, _child_path(path, key), items_cap, string_cap, blobs, depth)
+                    for key, item in value.items()}
+        if isinstance(value, (list, tuple, set, frozenset)):
+            values = list(value) if not isinstance(value, list) else value
+            if items_cap is not None and len(values) > items_cap:
+                positions = self._select(values, items_cap)
+                self._elide(path, "list", len(values) - len(positions), original_items=len(values),
+                            kept_items=len(positions), strategy=self.list_strategy)
+                kept = [self._reduce(values[index], f"{path}[{index}]", items_cap, string_cap, blobs, depth)
+                        for index in positions]
+                kept.append(f"<{len(values) - len(positions)} more items elided>")
+                return kept
+            return [self._reduce(item, f"{path}[{index}]", items_cap, string_cap, blobs, depth)
+                    for index, item in enumerate(values)]
+        # Frames, namedtuples and SDK records become plain data; anything else its str()
+        for converter in ("to_records", "as_dict", "_asdict"):
+            method = getattr(value, converter, None)
+            if callable(method):
+                return self._reduce(method(), path, items_cap, string_cap, blobs, depth)
+        return self._reduce(str(value), path, items_cap, string_cap, blobs, depth)
+
+    def _select(self, values: list, count: int) -> list:
+        """Positions of the list items to keep under the list strategy"""
+        size = len(values)
+        if self.list_strategy == "sample":
+            if count == 1:
+                return [0]
+            # Evenly spaced, always including the first and last item
+            return sorted({round(i * (size - 1) / (count - 1)) for i in range(count)})
+        if self.list_strategy.startswith("topk:"):
+            field = self.list_strategy[5:]
+
+            def rank(index):
+                item = values[index]
+                key = item.get(field) if isinstance(item, dict) else None
+                # Items without a numeric value for the field rank last
+                if isinstance(key, bool) or not isinstance(key, (int, float)):
+                    return (0, 0)
+                return (1, key)
+            return sorted(range(size), key=rank, reverse=True)[:count]
+        return list(range(count))
+
+    def _elide(self, path: str, kind: str, amount: int, **details):
+        """Record one elision; amount is the items, keys, characters or bytes removed"""
+        self._entries.append({"path": path, "kind": kind, **details})
+        total = self._totals.setdefault(kind, {"count": 0, "elided": 0})
+        total["count"] += 1
+        total["elided"] += amount
+
+    def _report(self, original_bytes: Optional[int], encoded: bytes) -> Optional[Dict[str, Any]]:
+        if not self._entries:
+            return None
+        return {
+            "original_bytes": original_bytes,
+            "returned_bytes": len(encoded),
+            "max_bytes": self.max_bytes,
+            "max_items": self.max_items,
+            "list_strategy": self.list_strategy,
+            "totals": {kind: dict(total) for kind, total in self._totals.items()},
+            "elided": self._entries[:RETURN_REPORT_ENTRIES],
+            "elided_count": len(self._entries),
+        }
+
+
+def _child_path(path: str, key: Any) -> str:
+    """JSONPath-style path of a dict member ($.name or $["odd key"])"""
+    key = str(key)
+    if key.isidentifier():
+        return f"{path}.{key}"
+    return f"{path}[{json.dumps(key)}]"
+
+
+def _peak_rss_bytes() -> int:
+    """Return the peak resident set size of this process (0 if unknown)"""
+    try:
+        import resource
+    except ImportError:
+        return 0
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return usage if sys.platform == "darwin" else usage * 1024
+
+
+def _profile_summary(profiler, top_n: int = PROFILE_TOP_N):
+    """Summarize a cProfile run as the top functions by cumulative time"""
+    import pstats
+    stats = pstats.Stats(profiler).stats
+    rows = []
+    for (filename, lineno, name), (_, calls, total, cumulative, _) in stats.items():
+        rows.append({
+            "function": f"{name} ({os.path.basename(filename)}:{lineno})" if lineno else name,
+            "calls": calls,
+            "total_ms": round(total * 1000, 3),
+            "cumulative_ms": round(cumulative * 1000, 3),
+        })
+    rows.sort(key=lambda row: row["cumulative_ms"], reverse=True)
+    return rows[:top_n]
+
+
+def _current_rss_bytes() -> int:
+    """Return the current resident set size of this process (0 if unknown)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import resource
+        # Peak RSS is the best we can do without /proc (bytes on macOS, KB elsewhere)
+        usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return usage if sys.platform == "darwin" else usage * 1024
+    except ImportError:
+        return 0
+
+
+def execute_code(code: str, nexus_api_url: str = None, server_instance_id: str = None, nexus_auth_token: str = None, env: Dict[str, str] = None, max_output_chars: int = None, emit: Callable[[str, str], None] = None, metrics: bool = False, profile: bool = False, max_return_bytes: int = None, max_return_items: int = None, return_list_strategy: str = None, session_id: str = None, reset_session: bool = False, close_session: bool = False) -> Dict[str, Any]:
     """
     Execute Python code in a controlled sandbox environment.
     
+    Environment changes made for the job are undone before returning, so the
+    same interpreter can safely run jobs for different server instances.
+    
+    Args:
+        max_output_chars: Cap per output stream (defaults to NEXUS_SANDBOX_MAX_OUTPUT or 1,000,000)
+        emit: Optional callback(stream_name, chunk) receiving stdout/stderr as it is
+            written; streamed output is not repeated in the returned dict
+        metrics: Add a "metrics" section with phase timings, per-tool-call
+            records and peak RSS
+        profile: Also add a cProfile summary of the user code (implies metrics;
+            only the main thread is profiled)
+        max_return_bytes: Byte budget for the encoded return value (defaults to
+            NEXUS_SANDBOX_RETURN_MAX_BYTES or 1,000,000; 0 for no limit)
+        max_return_items: Items kept per list or dict in the return value (defaults
+            to NEXUS_SANDBOX_RETURN_MAX_ITEMS or 1000; 0 for no limit)
+        return_list_strategy: How over-long lists are cut: "head", "sample" or
+            "topk:<field>" (defaults to NEXUS_SANDBOX_RETURN_LIST_STRATEGY or "head")
+        session_id: Run in the session kernel with this id, whose globals and SDK
+            clients are kept for the next job of the same server instance and session
+            (useful in worker mode; see _SessionStore for idle timeout and memory cap)
+        reset_session: Start the session from an empty namespace
+        close_session: Discard the session once the job is done
+    
+    Each job (or session) gets a private directory, exported as NEXUS_SAVE_DIR,
+    that ContentItem.save() writes into; it is removed when the job (or
+    session) ends.
+    
     Returns:
-        Dict with stdout, stderr, return_value, and error (if any)
+        Dict with stdout, stderr, return_value, error (if any) and, when
+        requested, metrics. return_value is a codec.Encoded fragment that
+        codec.dumpb_object() splices into the result line as-is.
+        A job stopped by a resource limit (NEXUS_SANDBOX_WALL_LIMIT,
+        NEXUS_SANDBOX_CPU_LIMIT, NEXUS_SANDBOX_MEMORY_LIMIT_MB,
+        NEXUS_SANDBOX_OUTPUT_LIMIT) keeps its partial output and adds
+        "limit_exceeded": {"limit", "value", "wall_s", "cpu_s", "peak_rss_bytes"}.
+        A return value over budget is reduced and "return_value_reduced"
+        reports what was elided (paths, kinds, sizes and totals).
+        Session jobs add "session": {"id", "new", "jobs", "size_bytes", "closed",
+        "evicted"}; "new" means earlier state was reset, expired or evicted.
     """
-    stdout_buffer = io.StringIO()
-    stderr_buffer = io.StringIO()
+    global _jobs_run
+    if max_output_chars is None:
+        max_output_chars = _env_int("NEXUS_SANDBOX_MAX_OUTPUT", DEFAULT_MAX_OUTPUT_CHARS)
+    collector = _MetricsCollector(profile) if (metrics or profile) else None
+    resilience = sys.modules.get("nexus_sdk.resilience")
+    if resilience is not None:
+        # A previous job stopped by a limit cancelled all calls
+        resilience.reset_cancellation()
+    session = None
+    if session_id is not None:
+        session, new_session = _get_session_store().open(server_instance_id, str(session_id), reset_session)
+    # ContentItem.save() can only write below the job's own directory
+    save_dir = session.save_dir if session is not None else _make_save_dir()
+    with _job_environment(dict(env or {}, NEXUS_SAVE_DIR=save_dir)):
+        if not (env or {}).get("NEXUS_DEADLINE"):
+            budget = _env_int("NEXUS_SANDBOX_TIMEOUT", DEFAULT_EXECUTION_BUDGET_S)
+            os.environ["NEXUS_DEADLINE"] = repr(time.time() + budget - DEADLINE_RESERVE_S)
+        reducer = _ReturnValueReducer.from_env(max_return_bytes, max_return_items, return_list_strategy)
+        try:
+            result = _execute_code(code, nexus_api_url, server_instance_id, nexus_auth_token, max_output_chars, emit, collector, reducer, session)
+        finally:
+            _reset_sdk_state()
+            if session is None:
+                _remove_save_dir(save_dir)
+    if session is not None:
+        result["session"] = _get_session_store().finish(session, new_session, close_session)
+    if collector is not None:
+        result["metrics"] = collector.finish(warm=_jobs_run > 0)
+    _jobs_run += 1
+    return result
+
+
+class _MetricsCollector:
+    """Phase timer and tool-call recorder for one execution"""
+
+    def __init__(self, profile: bool = False):
+        self.started = time.perf_counter()
+        self.last = self.started
+        self.phases = {}
+        self.recorder = None
+        self.profiler = None
+        self.code_cache = None
+        if profile:
+            import cProfile
+            self.profiler = cProfile.Profile()
+
+    def mark(self, phase: str):
+        """Attribute the time since the previous mark to `phase`"""
+        now = time.perf_counter()
+        self.phases[phase] = self.phases.get(phase, 0.0) + (now - self.last)
+        self.last = now
+
+    def start_recording(self):
+        try:
+            from nexus_sdk import metrics as sdk_metrics
+        except ImportError:
+            return
+        self.recorder = sdk_metrics.start_recording()
+
+    def finish(self, warm: bool) -> Dict[str, Any]:
+        if self.recorder is not None:
+            from nexus_sdk import metrics as sdk_metrics
+            sdk_metrics.stop_recording()
+        phases_ms = {phase: round(seconds * 1000, 3) for phase, seconds in self.phases.items()}
+        phases_ms["total"] = round((time.perf_counter() - self.started) * 1000, 3)
+        if not warm and _INTERPRETER_STARTUP is not None:
+            phases_ms["interpreter_startup"] = round(_INTERPRETER_STARTUP * 1000, 3)
+        report = {
+            "phases_ms": phases_ms,
+            "warm": warm,
+            "peak_rss_bytes": _peak_rss_bytes(),
+        }
+        if self.code_cache is not None:
+            report["code_cache"] = self.code_cache
+        if self.recorder is not None:
+            report.update(self.recorder.summary())
+        else:
+            report.update({"tool_calls": [], "tool_calls_dropped": 0, "tool_call_count": 0, "tool_time_ms": 0.0,
+                           "coalesced_calls": 0})
+        if self.profiler is not None:
+            report["profile"] = _profile_summary(self.profiler)
+        return report
+
+
+def _execute_code(code: str, nexus_api_url: str = None, server_instance_id: str = None, nexus_auth_token: str = None, max_output_chars: int = DEFAULT_MAX_OUTPUT_CHARS, emit: Callable[[str, str], None] = None, collector: Optional[_MetricsCollector] = None, reducer: Optional[_ReturnValueReducer] = None, session: Optional[_Session] = None) -> Dict[str, Any]:
+    output_limit = _env_int("NEXUS_SANDBOX_OUTPUT_LIMIT", DEFAULT_OUTPUT_LIMIT_CHARS)
+    stdout_buffer = _OutputStream("stdout", max_output_chars, emit, output_limit)
+    stderr_buffer = _OutputStream("stderr", max_output_chars, emit, output_limit)
+    limits = _ResourceLimits.from_env()
     result = {
         "stdout": "",
         "stderr": "",
@@ -22,6 +1116,17 @@ def execute_code(code: str, nexus_api_url: str = None, server_instance_id: str =
         "error": None
     }
     
+    try:
+        compiled, origin = _get_code_cache().compile(code)
+    except (SyntaxError, ValueError) as e:
+        # Code that doesn't compile never reaches namespace setup or exec
+        result["error"] = f"{type(e).__name__}: {str(e)}"
+        result["stderr"] = "".join(traceback.format_exception_only(type(e), e))
+        return result
+    if collector is not None:
+        collector.code_cache = origin
+        collector.mark("compile")
+    
     try:
         # Set up environment variables for Nexus SDK
         if nexus_api_url:
@@ -31,126 +1136,357 @@ def execute_code(code: str, nexus_api_url: str = None, server_instance_id: str =
         if nexus_auth_token:
             os.environ["NEXUS_AUTH_TOKEN"] = nexus_auth_token
         
-        # Add nexus_sdk to Python path
-        scripts_dir = os.path.dirname(os.path.abspath(__file__))
-        if scripts_dir not in sys.path:
-            sys.path.insert(0, scripts_dir)
-        
+        async_client = None
+
         # Redirect stdout and stderr
         with redirect_stdout(stdout_buffer), redirect_stderr(stderr_buffer):
-            # Import nexus_sdk if available
-            try:
-                import nexus_sdk
-                # Initialize MCP if server_instance_id is available
-                mcp_instance = None
+            if session is not None:
+                namespace = session.namespace
+                # Clients of the previous job are rebound below; its main() must not run again
+                for name in ("main", "mcp", "amcp"):
+                    namespace.pop(name, None)
+                clients = session.clients
+            else:
+                namespace = dict(_get_base_namespace())
+                namespace["__builtins__"] = dict(_SAFE_BUILTINS)
+                clients = _client_pool
+            # nexus_sdk is part of the base namespace whenever it can be imported
+            nexus_sdk = _get_base_namespace().get("nexus_sdk")
+            if nexus_sdk is not None:
+                if collector is not None:
+                    collector.mark("sdk_import")
+                    collector.start_recording()
+                namespace["google"] = nexus_sdk.google
+                # Bind the pooled clients to this job's server instance
                 if server_instance_id:
                     try:
                         # Get the base URL from environment or use default
                         base_url = nexus_api_url or os.environ.get('NEXUS_API_URL', 'http://localhost:3000')
-                        # Create MCP instance with explicit parameters using the class directly
-                        from nexus_sdk.mcp import MCP as MCPClass
-                        mcp_instance = MCPClass(
-                            base_url=base_url,
-                            server_instance_id=server_instance_id,
-                            auth_token=nexus_auth_token
+                        mcp_instance, google_instance = clients.bind(
+                            nexus_sdk, base_url, server_instance_id, nexus_auth_token
                         )
                     except Exception as e:
                         # Log the error but don't fail - mcp just won't be available
                         print(f"Warning: Could not initialize MCP: {e}", file=sys.stderr)
-                
-                namespace = {
-                    "__builtins__": {
-                        "print": print,
-                        "len": len,
-                        "range": range,
-                        "str": str,
-                        "int": int,
-                        "float": float,
-                        "bool": bool,
-                        "list": list,
-                        "dict": dict,
-                        "tuple": tuple,
-                        "set": set,
-                        "True": True,
-                        "False": False,
-                        "None": None,
-                        "Exception": Exception,
-                    },
-                    "json": json,
-                    "nexus_sdk": nexus_sdk,
-                    "google": nexus_sdk.google,
-                }
-                if mcp_instance:
-                    namespace["mcp"] = mcp_instance
-            except ImportError:
-                # Fallback if nexus_sdk not available
-                namespace = {
-                    "__builtins__": {
-                        "print": print,
-                        "len": len,
-                        "range": range,
-                        "str": str,
-                        "int": int,
-                        "float": float,
-                        "bool": bool,
-                        "list": list,
-                        "dict": dict,
-                        "tuple": tuple,
-                        "set": set,
-                        "True": True,
-                        "False": False,
-                        "None": None,
-                        "Exception": Exception,
-                    },
-                    "json": json,
-                }
+                    else:
+                        # SDK singletons (get_mcp(), nexus_sdk.google) resolve to the bound clients
+                        sys.modules["nexus_sdk.mcp"]._mcp_instance = mcp_instance
+                        nexus_sdk.bind_google_instance(google_instance)
+                        namespace["google"] = google_instance
+                        namespace["mcp"] = mcp_instance
+                        async_client = nexus_sdk.AsyncMCP(mcp_instance)
+                        namespace["amcp"] = async_client
             
-            # Execute the code
-            exec(code, namespace)
+            if collector is not None:
+                collector.mark("setup")
+            if collector is not None and collector.profiler is not None:
+                collector.profiler.enable()
+            try:
+                limits.arm()
+                # Execute the code
+                exec(compiled, namespace)
+                if collector is not None:
+                    collector.mark("exec")
+                
+                # Capture return value if there's a main() function
+                return_val = None
+                has_main = "main" in namespace and callable(namespace["main"])
+                if has_main:
+                    main_code = getattr(namespace["main"], "__code__", None)
+                    if main_code is not None and main_code.co_flags & _CO_COROUTINE:
+                        # async def main() runs on a fresh event loop
+                        import asyncio
+                        return_val = asyncio.run(namespace["main"]())
+                    else:
+                        return_val = namespace["main"]()
+                    if collector is not None:
+                        collector.mark("main")
+            finally:
+                limits.disarm()
+                if collector is not None and collector.profiler is not None:
+                    collector.profiler.disable()
             
-            # Capture return value if there's a main() function
-            if "main" in namespace and callable(namespace["main"]):
-                return_val = namespace["main"]()
-                # Ensure return value is JSON-serializable
-                try:
-                    json.dumps(return_val)
-                    result["return_value"] = return_val
-                except (TypeError, ValueError):
-                    # If not serializable, convert to string
-                    result["return_value"] = str(return_val)
+            if has_main:
+                if isinstance(return_val, _get_base_namespace().get("Frame", ())):
+                    return_val = return_val.to_records()
+                # The encoding is spliced into the final result line as-is; values
+                # over budget (or not serializable) go through the reducer
+                encoded, reduction = (reducer or _ReturnValueReducer.from_env()).encode(return_val)
+                result["return_value"] = codec.Encoded(encoded)
+                if reduction is not None:
+                    result["return_value_reduced"] = reduction
+                if collector is not None:
+                    collector.mark("serialize")
         
         result["stdout"] = stdout_buffer.getvalue()
         result["stderr"] = stderr_buffer.getvalue()
         
+    except LimitExceeded as e:
+        _limit_exceeded(result, e.kind, e.limit, str(e), limits, stdout_buffer, stderr_buffer)
+    except MemoryError as e:
+        if limits.memory_mb <= 0:
+            result["error"] = f"{type(e).__name__}: {str(e)}"
+            result["stdout"] = stdout_buffer.getvalue()
+            result["stderr"] = traceback.format_exc()
+        else:
+            _limit_exceeded(result, "memory", limits.memory_mb,
+                            f"memory limit of {limits.memory_mb} MB exceeded", limits, stdout_buffer, stderr_buffer)
     except Exception as e:
         result["error"] = f"{type(e).__name__}: {str(e)}"
+        result["stdout"] = stdout_buffer.getvalue()
         result["stderr"] = traceback.format_exc()
+    finally:
+        if async_client is not None:
+            async_client.close()
     
     return result
 
-if __name__ == "__main__":
-    # Read code from stdin
-    code_input = sys.stdin.read()
+
+def _limit_exceeded(result: Dict[str, Any], kind: str, limit: float, message: str, limits: _ResourceLimits,
+                    stdout_buffer: _OutputStream, stderr_buffer: _OutputStream):
+    """Fill in the structured result of a job stopped by a resource limit"""
+    # Calls still running in worker threads would otherwise outlive the job
+    _cancel_sdk_calls()
+    result["error"] = f"LimitExceeded: {message}"
+    result["limit_exceeded"] = {"limit": kind, "value": limit, **limits.usage()}
+    # Output written before the limit tripped is kept
+    result["stdout"] = stdout_buffer.getvalue()
+    result["stderr"] = stderr_buffer.getvalue() + traceback.format_exc()
+
+_NOT_DECODED = object()
+
+
+def _decode_job(raw: Union[str, bytes]) -> Any:
+    """Decode a raw job, returning None if it is not JSON (plain code)"""
+    try:
+        return codec.loads(raw)
+    except ValueError:
+        return None
+
+
+def _job_int(data: Dict[str, Any], key: str) -> Optional[int]:
+    value = data.get(key)
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{key} must be an integer, got {value!r}") from None
+
+
+def _job_field(data: Dict[str, Any], key: str, kind: type):
+    value = data.get(key)
+    if value is not None and not isinstance(value, kind):
+        raise ValueError(f"{key} must be a {kind.__name__}, got {type(value).__name__}")
+    return value
+
+
+def parse_job(raw: Union[str, bytes], data: Any = _NOT_DECODED) -> Dict[str, Any]:
+    """
+    Parse a sandbox job into execute_code keyword arguments.
+    
+    Format: {"code": "...", "nexus_api_url": "...", "server_instance_id": "...",
+             "nexus_auth_token": "...", "env": {...}, "max_output_chars": N,
+             "metrics": bool, "profile": bool, "max_return_bytes": N,
+             "max_return_items": N, "return_list_strategy": "...",
+             "session_id": "...", "reset_session": bool, "close_session": bool}
+    Anything that is not a JSON object is treated as plain code (old format).
+    The "stream" flag is protocol-level and is read by the caller.
+    Pass the already-decoded job as `data` to avoid decoding it twice.
+    
+    Raises:
+        ValueError: if a field has the wrong type
+    """
+    if isinstance(raw, bytes):
+        raw = raw.decode("utf-8")
+    if data is _NOT_DECODED:
+        data = _decode_job(raw)
+    if not isinstance(data, dict):
+        return {"code": raw}
+    return {
+        "code": _job_field(data, "code", str) if "code" in data else raw,
+        "nexus_api_url": _job_field(data, "nexus_api_url", str),
+        "server_instance_id": _job_field(data, "server_instance_id", str),
+        "nexus_auth_token": _job_field(data, "nexus_auth_token", str),
+        "env": _job_field(data, "env", dict),
+        "max_output_chars": _job_int(data, "max_output_chars"),
+        "metrics": bool(data.get("metrics")),
+        "profile": bool(data.get("profile")),
+        "max_return_bytes": _job_int(data, "max_return_bytes"),
+        "max_return_items": _job_int(data, "max_return_items"),
+        "return_list_strategy": _job_field(data, "return_list_strategy", str),
+        "session_id": data.get("session_id"),
+        "reset_session": bool(data.get("reset_session")),
+        "close_session": bool(data.get("close_session")),
+    }
+
+
+def _make_emitter(out, job_id=None):
+    """
+    Build an emit callback writing framed NDJSON output events to the binary stream `out`.
     
-    # Read environment variables from stdin if provided as JSON
-    # Format: {"code": "...", "nexus_api_url": "...", "server_instance_id": "..."}
-    nexus_api_url = None
-    server_instance_id = None
-    nexus_auth_token = None
+    Events look like {"event": "stdout", "data": "..."}; the final result is
+    written by the caller as {"event": "result", ...}.
+    """
+    lock = threading.Lock()
+
+    def emit(stream_name: str, chunk: str):
+        event = {"event": stream_name, "data": chunk}
+        if job_id is not None:
+            event["id"] = job_id
+        with lock:
+            out.write(codec.dumpb(event) + b"\n")
+            out.flush()
+
+    return emit
+
+
+def _job_tenant(data: Dict[str, Any]) -> str:
+    """
+    Identity a warm worker is bound to.
     
+    The host's "tenant" key when given (lib/sandbox.ts sends the user id),
+    else a hash of the auth token, else the server instance.
+    """
+    if data.get("tenant"):
+        return str(data["tenant"])
+    token = data.get("nexus_auth_token") or (data.get("env") or {}).get("NEXUS_AUTH_TOKEN")
+    if token:
+        import hashlib
+        return "token:" + hashlib.sha256(str(token).encode()).hexdigest()
+    return "instance:" + str(data.get("server_instance_id") or "")
+
+
+def _write_result(out, execution_result: Dict[str, Any]):
+    """Write one result line; an encoded return value is spliced in, not re-encoded"""
+    out.write(codec.dumpb_object(execution_result) + b"\n")
+    out.flush()
+
+
+def run_worker(max_jobs: int = DEFAULT_WORKER_MAX_JOBS, max_rss_growth_mb: int = DEFAULT_WORKER_MAX_RSS_GROWTH_MB):
+    """
+    Run as a long-lived worker.
+    
+    Reads newline-delimited JSON jobs from stdin and writes exactly one JSON
+    result line per job. A worker is bound to the tenant of its first job
+    (see _job_tenant): modules and SDK classes live as long as the
+    interpreter, so a job from another tenant is refused and the worker
+    retires instead of running it. Jobs with "stream": true first emit stdout/stderr
+    events and then a final {"event": "result", ...} line. Each job runs in a
+    fresh namespace unless it names a session_id, whose kernel stays in this
+    worker; "worker": {"sessions": [...]} lists the live ones so the host can
+    route a session's jobs back here. The worker retires
+    (marks its last result with "retiring": true and exits) after max_jobs jobs
+    or once its RSS has grown by more than max_rss_growth_mb, so the host can
+    replace it with a fresh interpreter. Memory held by sessions has its own
+    cap (NEXUS_SANDBOX_SESSION_MEMORY_MB) and does not count as growth.
+    """
+    protocol_out = sys.stdout.buffer
+
+    # Pay the import cost once, before the first job arrives
+    scripts_dir = os.path.dirname(os.path.abspath(__file__))
+    if scripts_dir not in sys.path:
+        sys.path.insert(0, scripts_dir)
     try:
-        # Try to parse as JSON first (new format)
-        data = json.loads(code_input)
-        code_input = data.get("code", code_input)
-        nexus_api_url = data.get("nexus_api_url")
-        server_instance_id = data.get("server_instance_id")
-        nexus_auth_token = data.get("nexus_auth_token")
-    except (json.JSONDecodeError, ValueError):
-        # Fallback to plain code (old format)
+        import nexus_sdk
+        nexus_sdk.preload()
+    except ImportError:
         pass
+
+    baseline_rss = _current_rss_bytes()
+    max_rss_growth = max_rss_growth_mb * 1024 * 1024
+    jobs = 0
+    tenant = None
+
+    for line in sys.stdin.buffer:
+        line = line.strip()
+        if not line:
+            continue
+
+        job_id = None
+        stream = False
+        foreign = False
+        try:
+            data = codec.loads(line)
+            if not isinstance(data, dict):
+                raise ValueError("job must be a JSON object")
+            job_id = data.get("id")
+            stream = bool(data.get("stream"))
+            job_kwargs = parse_job(line, data)
+            job_tenant = _job_tenant(data)
+            if tenant is None:
+                tenant = job_tenant
+            elif job_tenant != tenant:
+                foreign = True
+                raise ValueError("worker is bound to another tenant")
+            emit = _make_emitter(protocol_out, job_id) if stream else None
+            execution_result = execute_code(emit=emit, **job_kwargs)
+        except ValueError as e:
+            execution_result = {
+                "stdout": "",
+                "stderr": "",
+                "return_value": None,
+                "error": f"Invalid job: {e}",
+            }
+
+        jobs += 1
+        rss_growth = _current_rss_bytes() - baseline_rss
+        if _session_store is not None:
+            rss_growth -= _session_store.total_bytes
+        retiring = foreign or jobs >= max_jobs > 0 or (max_rss_growth > 0 and rss_growth > max_rss_growth)
+
+        if stream:
+            execution_result = {"event": "result", **execution_result}
+        if job_id is not None:
+            execution_result["id"] = job_id
+        execution_result["worker"] = {
+            "pid": os.getpid(),
+            "jobs": jobs,
+            "retiring": retiring,
+        }
+        if _session_store is not None:
+            execution_result["worker"]["sessions"] = [] if retiring else _session_store.session_ids()
+        _write_result(protocol_out, execution_result)
+
+        if retiring:
+            break
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Project Nexus Python sandbox")
+    parser.add_argument("--worker", action="store_true",
+                        help="run as a long-lived worker reading NDJSON jobs from stdin")
+    parser.add_argument("--max-jobs", type=int,
+                        default=_env_int("NEXUS_SANDBOX_MAX_JOBS", DEFAULT_WORKER_MAX_JOBS),
+                        help="recycle the worker after this many jobs (0 = unlimited)")
+    parser.add_argument("--max-rss-mb", type=int,
+                        default=_env_int("NEXUS_SANDBOX_MAX_RSS_MB", DEFAULT_WORKER_MAX_RSS_GROWTH_MB),
+                        help="recycle the worker after this much RSS growth in MB (0 = unlimited)")
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.max_jobs, args.max_rss_mb)
+        sys.exit(0)
+
+    # Read code from stdin
+    code_input = sys.stdin.buffer.read()
+    job = _decode_job(code_input)
+    protocol_out = sys.stdout.buffer
+    try:
+        job_kwargs = parse_job(code_input, job)
+    except ValueError as e:
+        _write_result(protocol_out, {"stdout": "", "stderr": "", "return_value": None, "error": f"Invalid job: {e}"})
+        sys.exit(0)
+    
+    if isinstance(job, dict) and job.get("stream"):
+        # Streaming protocol: output events as they happen, then the result event
+        execution_result = execute_code(emit=_make_emitter(protocol_out), **job_kwargs)
+        _write_result(protocol_out, {"event": "result", **execution_result})
+        sys.exit(0)
     
     # Execute and return result
-    execution_result = execute_code(code_input, nexus_api_url, server_instance_id, nexus_auth_token)
+    execution_result = execute_code(**job_kwargs)
     
     # Print result as JSON
-    print(json.dumps(execution_result))
+    _write_result(protocol_out, execution_result)